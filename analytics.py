@@ -0,0 +1,253 @@
+from datetime import date, timedelta
+
+import rollups
+import schemas
+from money import to_major
+
+RANGES = ("week", "month", "quarter", "year", "all")
+GROUP_BYS = ("category", "month", "week", "type")
+
+ALL_START = date(1970, 1, 1)
+ALL_END = date(2100, 12, 31)
+
+
+class AnalyticsError(ValueError):
+    """Parametros de consulta invalidos (se responde 400)."""
+
+
+def _parse_date(value, field):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise AnalyticsError(f"Fecha inválida en '{field}', use YYYY-MM-DD")
+
+
+def resolve_range(range_="month", start=None, end=None, today=None):
+    """Devuelve (nombre_rango, inicio, fin) con fechas inclusive.
+
+    start/end explicitos tienen prioridad sobre el preset y el rango queda
+    como 'custom'; si falta uno de los dos se usa el extremo de 'all'.
+    """
+    today = today or date.today()
+
+    if start or end:
+        start_date = _parse_date(start, "start") if start else ALL_START
+        end_date = _parse_date(end, "end") if end else ALL_END
+        if start_date > end_date:
+            raise AnalyticsError("'start' debe ser anterior o igual a 'end'")
+        return "custom", start_date, end_date
+
+    if range_ == "week":
+        return range_, today - timedelta(days=today.weekday()), today
+    if range_ == "month":
+        return range_, today.replace(day=1), today
+    if range_ == "quarter":
+        first_month = 3 * ((today.month - 1) // 3) + 1
+        return range_, date(today.year, first_month, 1), today
+    if range_ == "year":
+        return range_, date(today.year, 1, 1), today
+    if range_ == "all":
+        return range_, ALL_START, ALL_END
+
+    raise AnalyticsError(f"Rango inválido, use uno de: {', '.join(RANGES)}")
+
+
+def _source(user_id, start, end, group_by, category_id=None):
+    """Fuente (period, category_id, type, total, count) para el group_by pedido.
+
+    Todo menos 'week' sale de monthly_rollups + bordes; semanas necesitan
+    la fecha de cada transaccion, asi que van directo al indice (user_id, date).
+    """
+    if group_by == "week":
+        sql = """
+            SELECT date(date, 'weekday 0', '-6 days') AS period,
+                   category_id, type, amount_minor AS total, 1 AS count
+            FROM transactions
+            WHERE user_id = ? AND date BETWEEN ? AND ?
+        """
+        params = [user_id, start.isoformat(), end.isoformat()]
+        if category_id is not None:
+            sql += " AND category_id = ?"
+            params.append(category_id)
+        return sql, params
+
+    sql, params = rollups.range_source(user_id, start, end, category_id)
+    return (
+        f"SELECT year_month AS period, category_id, type, total, count FROM ({sql})",
+        params,
+    )
+
+
+_GROUP_KEYS = {
+    "category": ("s.category_id", "c.name"),
+    "month": ("s.period", "s.period"),
+    "week": ("s.period", "s.period"),
+    "type": ("s.type", "s.type"),
+}
+
+
+def aggregate_query(user_id, start, end, group_by="category", category_id=None):
+    """SQL + params de la agregacion condicional de un rango (ver aggregate)."""
+    if group_by not in GROUP_BYS:
+        raise AnalyticsError(f"group_by inválido, use uno de: {', '.join(GROUP_BYS)}")
+
+    source, params = _source(user_id, start, end, group_by, category_id)
+    key, label = _GROUP_KEYS[group_by]
+    join = "LEFT JOIN categories c ON c.id = s.category_id" if group_by == "category" else ""
+
+    sql = f"""
+        SELECT {key} AS key,
+               {label} AS label,
+               SUM(CASE WHEN s.type = 'income' THEN s.total ELSE 0 END) AS income,
+               SUM(CASE WHEN s.type = 'expense' THEN s.total ELSE 0 END) AS expense,
+               SUM(s.count) AS count
+        FROM ({source}) s
+        {join}
+        GROUP BY {key}
+        ORDER BY {key}
+    """
+    return sql, params
+
+
+def aggregate(db, user_id, start, end, group_by="category", category_id=None):
+    """Un solo recorrido con agregacion condicional por grupo.
+
+    Cada fila trae key, label, income, expense y count; los totales generales
+    se obtienen sumando los grupos, sin otra consulta.
+    """
+    sql, params = aggregate_query(user_id, start, end, group_by, category_id)
+    return db.execute(sql, params).fetchall()
+
+
+def partition_range(db, user_id, start, end, parts):
+    """Parte [start, end] en hasta `parts` subrangos contiguos que no se pisan.
+
+    Primero acota el rango a la primera/ultima fecha con datos (dos busquedas
+    en el indice), asi 'all' no se reparte sobre 130 años vacios.
+    """
+    row = db.execute(
+        """
+        SELECT
+            (SELECT MIN(date) FROM transactions WHERE user_id = ? AND date BETWEEN ? AND ?),
+            (SELECT MAX(date) FROM transactions WHERE user_id = ? AND date BETWEEN ? AND ?)
+        """,
+        (user_id, start.isoformat(), end.isoformat()) * 2,
+    ).fetchone()
+    if row[0] is None:
+        return [(start, end)]
+
+    first = max(start, date.fromisoformat(row[0][:10]))
+    last = min(end, date.fromisoformat(row[1][:10]))
+    days = (last - first).days + 1
+    parts = max(1, min(parts, days))
+    step = days // parts
+
+    ranges = []
+    current = first
+    for i in range(parts):
+        part_end = last if i == parts - 1 else current + timedelta(days=step - 1)
+        ranges.append((current, part_end))
+        current = part_end + timedelta(days=1)
+    return ranges
+
+
+def partition_queries(db, user_id, start, end, group_by="category", parts=4):
+    """[(nombre, sql, params)] de aggregate() por subrango, mas {nombre: 'inicio..fin'}."""
+    queries = []
+    descriptions = {}
+    for i, (part_start, part_end) in enumerate(partition_range(db, user_id, start, end, parts)):
+        name = f"q{i}"
+        sql, params = aggregate_query(user_id, part_start, part_end, group_by)
+        queries.append((name, sql, params))
+        descriptions[name] = f"{part_start.isoformat()}..{part_end.isoformat()}"
+    return queries, descriptions
+
+
+def merge_rows(row_lists):
+    """Suma filas de aggregate() de subrangos disjuntos, agrupando por key."""
+    merged = {}
+    for rows in row_lists:
+        for r in rows:
+            acc = merged.get(r["key"])
+            if acc is None:
+                merged[r["key"]] = {
+                    "key": r["key"],
+                    "label": r["label"],
+                    "income": r["income"],
+                    "expense": r["expense"],
+                    "count": r["count"],
+                }
+            else:
+                acc["income"] += r["income"]
+                acc["expense"] += r["expense"]
+                acc["count"] += r["count"]
+    return [merged[k] for k in sorted(merged, key=lambda k: (k is not None, k))]
+
+
+def _totals(rows):
+    income = sum(r["income"] for r in rows)
+    expense = sum(r["expense"] for r in rows)
+    return income, expense
+
+
+def compat_payload(rows, range_, start, end, exponent):
+    """Respuesta historica de /api/analytics a partir de aggregate(group_by='category').
+
+    Se suma en unidades minimas y se convierte una sola vez al armar la respuesta.
+    """
+    income_total, expense_total = _totals(rows)
+
+    # categorias borradas cuentan en los totales pero no en los desgloses
+    named = [r for r in rows if r["label"] is not None]
+    expenses_by_category = [
+        schemas.CategoryTotal(r["label"], to_major(r["expense"], exponent))
+        for r in sorted(named, key=lambda r: r["expense"], reverse=True)
+        if r["expense"]
+    ]
+    incomes_by_category = [
+        schemas.CategoryTotal(r["label"], to_major(r["income"], exponent))
+        for r in sorted(named, key=lambda r: r["income"], reverse=True)
+        if r["income"]
+    ]
+
+    return schemas.AnalyticsResponse(
+        range=range_,
+        start_date=start.isoformat(),
+        end_date=end.isoformat(),
+        income_total=to_major(income_total, exponent),
+        expense_total=to_major(expense_total, exponent),
+        balance=to_major(income_total - expense_total, exponent),
+        expenses_by_category=expenses_by_category,
+        incomes_by_category=incomes_by_category,
+    )
+
+
+def grouped_payload(rows, range_, start, end, group_by, exponent):
+    income_total, expense_total = _totals(rows)
+
+    groups = [
+        schemas.AnalyticsGroup(
+            key=r["label"],
+            income=to_major(r["income"], exponent),
+            expense=to_major(r["expense"], exponent),
+            balance=to_major(r["income"] - r["expense"], exponent),
+            count=r["count"],
+            category_id=r["key"] if group_by == "category" else None,
+        )
+        for r in rows
+    ]
+
+    if group_by == "category":
+        groups.sort(key=lambda g: g.income + g.expense, reverse=True)
+
+    return schemas.GroupedAnalyticsResponse(
+        range=range_,
+        start_date=start.isoformat(),
+        end_date=end.isoformat(),
+        group_by=group_by,
+        income_total=to_major(income_total, exponent),
+        expense_total=to_major(expense_total, exponent),
+        balance=to_major(income_total - expense_total, exponent),
+        count=sum(r["count"] for r in rows),
+        groups=groups,
+    )
@@ -1,38 +1,113 @@
 from time import time
-from flask import Blueprint, request, jsonify, current_app
+import csv
+import hashlib
+import heapq
+import io
+import itertools
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from datetime import date, datetime, timedelta
-from db import get_db
+from db import close_db, get_db, get_read_db, pool_stats
+import analytics
+import balances
+import budgets
+import category_cache
+import columnar
+from cache import LRUCache
+import bulk_import
+import schemas
+import rollups
+import search
+import sessions
+import shards
+import transactions
+import write_queue
 from functools import wraps
+from operator import attrgetter
 import jwt
-from werkzeug.security import check_password_hash
+import msgspec
+import hashing
+import http_cache
+import metrics
+import money
+import parallel
+import recurring
 
 api_bp = Blueprint("api", __name__, url_prefix="/api")
 
+# Tokens ya verificados (sha256 del token -> payload), vencen con su 'exp'
+_token_cache = LRUCache(4096)
+# huella del SECRET_KEY con el que se verificaron los tokens del cache
+_token_cache_secret = None
+# username -> user_id para el fallback sin token
+_user_cache = LRUCache(4096)
+USER_CACHE_TTL = 300
+
+
+@api_bp.record_once
+def _configure_caches(state):
+    config = state.app.config
+    _token_cache.maxsize = config.get("TOKEN_CACHE_SIZE", _token_cache.maxsize)
+    _user_cache.maxsize = config.get("USER_CACHE_SIZE", _user_cache.maxsize)
+
+
 # ------------------------------------------------------------------
 # Auth utilities
 # ------------------------------------------------------------------
 def get_user_id_by_username(username: str):
     if not username:
         return None
+
+    user_id = _user_cache.get(username)
+    if user_id is not None:
+        return user_id
+
     db = get_db()
     row = db.execute(
         "SELECT id FROM users WHERE username = ?",
         (username,),
     ).fetchone()
-    return row["id"] if row else None
+    if not row:
+        return None
+
+    ttl = current_app.config.get("USER_CACHE_TTL", USER_CACHE_TTL)
+    _user_cache.set(username, row["id"], expires_at=time() + ttl)
+    return row["id"]
 
 
 def _decode_token(token: str, verify_exp=True):
-    
+    global _token_cache_secret
+
     secret = current_app.config.get("SECRET_KEY", None)
     if not secret:
         raise RuntimeError("SECRET_KEY no está configurada en app.config")
-    
-    options = {"verify_exp": verify_exp}
-    payload = jwt.decode(token, secret, algorithms=["HS256"], options=options)
+
+    if not verify_exp:
+        return jwt.decode(token, secret, algorithms=["HS256"], options={"verify_exp": False})
+
+    # si rotó el secret, nada de lo verificado antes sigue valiendo
+    secret_fp = hashlib.sha256(secret.encode("utf-8")).digest()
+    if secret_fp != _token_cache_secret:
+        _token_cache.clear()
+        _token_cache_secret = secret_fp
+
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return payload
+
+    payload = jwt.decode(token, secret, algorithms=["HS256"], options={"verify_exp": True})
+    exp = payload.get("exp")
+    _token_cache.set(key, payload, expires_at=exp if isinstance(exp, (int, float)) else None)
     return payload
 
 
+def auth_cache_stats():
+    return {
+        "token_cache": _token_cache.stats(),
+        "user_cache": _user_cache.stats(),
+    }
+
+
 def _generate_token(user_id: int, username: str, expires_in_hours=24):
    
     now_ts = int(time())
@@ -53,7 +128,16 @@ def _generate_token(user_id: int, username: str, expires_in_hours=24):
     return token, exp_ts
 
 
-def get_user_id_from_request():
+def _token_response(token, exp_ts, user_id, username):
+    return schemas.TokenResponse(
+        token=token,
+        expires_at=datetime.fromtimestamp(exp_ts).isoformat(),
+        expires_in=exp_ts - int(time()),
+        user=schemas.UserOut(id=user_id, username=username),
+    )
+
+
+def get_user_id_from_request(allow_body=True):
     
     auth = request.headers.get("Authorization", "")
     if auth:
@@ -73,7 +157,10 @@ def get_user_id_from_request():
                 return None
    
     
-    username = request.args.get("username") or (request.json and request.json.get("username"))
+    username = request.args.get("username")
+    if not username and allow_body:
+        data = request.get_json(silent=True)
+        username = data.get("username") if isinstance(data, dict) else None
     return get_user_id_by_username(username)
 
 
@@ -107,21 +194,37 @@ def token_required(f):
     return decorated
 
 
+def conditional_get(f):
+    """ETag por version de datos del usuario; If-None-Match vigente -> 304."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        user_id = get_user_id_from_request()
+        if not user_id:
+            return f(*args, **kwargs)
+        return http_cache.conditional(
+            get_read_db(user_id), user_id, lambda: f(*args, **kwargs)
+        )
+
+    return decorated
+
+
 # ------------------------------------------------------------------
 # Auth endpoints
 # ------------------------------------------------------------------
 @api_bp.route("/auth/login", methods=["POST"])
 def api_login():
     
-    data = request.get_json(silent=True) or {}
-    username = (data.get("username") or "").strip()
-    password = data.get("password") or ""
+    try:
+        data = schemas.decode_body(schemas.LoginRequest)
+    except (msgspec.ValidationError, msgspec.DecodeError):
+        data = schemas.LoginRequest()
+    username = data.username.strip()
+    password = data.password
 
     if not username or not password:
         return jsonify({"error": "username y password son requeridos"}), 400
 
-    db = get_db()
-    row = db.execute(
+    row = get_read_db().execute(
         "SELECT id, hash FROM users WHERE username = ?",
         (username,),
     ).fetchone()
@@ -129,7 +232,9 @@ def api_login():
     if not row:
         return jsonify({"error": "Credenciales inválidas"}), 401
 
-    if not check_password_hash(row["hash"], password):
+    # el pool de escritura no espera al KDF (ver hashing.verify_and_upgrade)
+    close_db()
+    if not hashing.verify_and_upgrade(row["id"], row["hash"], password):
         return jsonify({"error": "Credenciales inválidas"}), 401
 
     user_id = row["id"]
@@ -137,16 +242,8 @@ def api_login():
     try:
         # Valid for 24 hours
         token, exp_ts = _generate_token(user_id, username, expires_in_hours=24)
-        
-        return jsonify({
-            "token": token,
-            "expires_at": datetime.fromtimestamp(exp_ts).isoformat(),
-            "expires_in": exp_ts - int(time()),  
-            "user": {
-                "id": user_id,
-                "username": username
-            }
-        }), 200
+
+        return schemas.json_response(_token_response(token, exp_ts, user_id, username))
     except Exception as e:
         return jsonify({"error": f"Error al generar token: {str(e)}"}), 500
 
@@ -162,16 +259,8 @@ def api_refresh_token():
         
         
         token, exp_ts = _generate_token(user_id, username, expires_in_hours=24)
-        
-        return jsonify({
-            "token": token,
-            "expires_at": datetime.fromtimestamp(exp_ts).isoformat(),
-            "expires_in": exp_ts - int(time()),
-            "user": {
-                "id": user_id,
-                "username": username
-            }
-        }), 200
+
+        return schemas.json_response(_token_response(token, exp_ts, user_id, username))
     except Exception as e:
         return jsonify({"error": f"Error al refrescar token: {str(e)}"}), 500
 
@@ -179,9 +268,11 @@ def api_refresh_token():
 @api_bp.route("/auth/validate", methods=["POST"])
 def api_validate_token():
    
-    data = request.get_json(silent=True) or {}
-    
-   
+    try:
+        data = schemas.decode_body(schemas.TokenRequest)
+    except (msgspec.ValidationError, msgspec.DecodeError):
+        data = schemas.TokenRequest()
+
     token = None
     auth = request.headers.get("Authorization", "")
     if auth:
@@ -190,7 +281,7 @@ def api_validate_token():
             token = parts[1]
     
     if not token:
-        token = data.get("token") or request.args.get("token")
+        token = data.token or request.args.get("token")
 
     if not token:
         return jsonify({
@@ -255,38 +346,65 @@ def api_logout():
     }), 200
 
 
+# ------------------------------------------------------------------
+# Stats internas (solo con STATS_ENABLED)
+# ------------------------------------------------------------------
+@api_bp.route("/stats")
+def api_stats():
+    if not current_app.config.get("STATS_ENABLED"):
+        return jsonify({"error": "No encontrado"}), 404
+
+    return jsonify({
+        "db_pools": pool_stats(),
+        **auth_cache_stats(),
+        "category_cache": category_cache.stats(),
+        "currency_cache": money.stats(),
+        "shard_map_cache": shards.stats(),
+        "write_queue": write_queue.stats(),
+        "response_cache": http_cache.stats(),
+        "hash_pool": hashing.pool_stats(),
+        "analytics_pool": parallel.runner_stats(),
+        "sql": metrics.stats(),
+        "sessions": sessions.stats(),
+        "columnar_cache": columnar.stats(),
+    })
+
+
 # ------------------------------------------------------------------
 # Protected API endpoints
 # ------------------------------------------------------------------
 @api_bp.route("/categories")
+@conditional_get
 def api_categories():
     
     user_id = get_user_id_from_request()
     if not user_id:
         return jsonify({"error": "Autenticación requerida"}), 401
 
-    db = get_db()
-    rows = db.execute(
-        "SELECT id, name FROM categories WHERE user_id = ? ORDER BY name",
-        (user_id,),
-    ).fetchall()
+    db = get_read_db(user_id)
+    categories = category_cache.get_categories(db, user_id).sorted
 
-    categories = [{"id": r["id"], "name": r["name"]} for r in rows]
-    return jsonify({"categories": categories})
+    return schemas.json_response(
+        schemas.CategoriesResponse(
+            [schemas.CategoryOut(c["id"], c["name"]) for c in categories]
+        )
+    )
 
 
 @api_bp.route("/summary")
+@conditional_get
 def api_summary():
     
     user_id = get_user_id_from_request()
     if not user_id:
         return jsonify({"error": "Autenticación requerida"}), 401
 
-    db = get_db()
+    db = get_read_db(user_id)
+    exponent = money.get_exponent(user_id)
     rows = db.execute(
         """
         SELECT t.id,
-               t.amount,
+               t.amount_minor / ? AS amount,
                t.type,
                t.description,
                t.date,
@@ -297,193 +415,681 @@ def api_summary():
         ORDER BY t.date DESC, t.id DESC
         LIMIT 100
         """,
-        (user_id,),
+        (money.divisor(exponent), user_id),
     ).fetchall()
 
-    income = sum(r["amount"] for r in rows if r["type"] == "income")
-    expense = sum(r["amount"] for r in rows if r["type"] == "expense")
-    balance = income - expense
-
-    transactions = [
-        {
-            "id": r["id"],
-            "amount": r["amount"],
-            "type": r["type"],
-            "description": r["description"],
-            "category": r["category"],
-            "date": r["date"],
-        }
-        for r in rows
-    ]
+    # totales de todo el historial, no solo de las 100 filas devueltas;
+    # de las reglas recurrentes cuentan las ocurrencias hasta hoy
+    today = date.today()
+    schedule = recurring.load(db, user_id, analytics.ALL_START, today)
+    income, expense = rollups.type_totals(db, user_id)
+    rule_income, rule_expense, _ = schedule.totals(analytics.ALL_START, today)
+    income += rule_income
+    expense += rule_expense
 
-    return jsonify({
-        "total_income": income,
-        "total_expense": expense,
-        "balance": balance,
-        "transactions": transactions,
-    })
+    items = [schemas.TransactionOut(*r) for r in rows]
+    if schedule:
+        # de la mas nueva hacia atras: solo se generan las que entran en las 100
+        projected = (
+            _occurrence_out(o, exponent)
+            for o in schedule.expand(analytics.ALL_START, today, reverse=True)
+        )
+        items = list(itertools.islice(
+            heapq.merge(items, projected, key=attrgetter("date"), reverse=True), 100
+        ))
+
+    return schemas.json_response(schemas.SummaryResponse(
+        total_income=money.to_major(income, exponent),
+        total_expense=money.to_major(expense, exponent),
+        balance=money.to_major(income - expense, exponent),
+        transactions=items,
+    ))
+
+
+def _occurrence_out(row, exponent):
+    return schemas.TransactionOut(
+        None,
+        money.to_major(row["amount_minor"], exponent),
+        row["type"],
+        row["description"],
+        row["date"],
+        row["category"],
+        rule_id=row["rule_id"],
+    )
 
 
 @api_bp.route("/analytics")
+@conditional_get
 def api_analytics():
-    
+    """
+    range=week|month|quarter|year|all, o start/end (YYYY-MM-DD).
+    Sin group_by devuelve el formato historico (totales + desglose por
+    categoria); con group_by=category|month|week|type devuelve 'groups'.
+    """
     user_id = get_user_id_from_request()
     if not user_id:
         return jsonify({"error": "Autenticación requerida"}), 401
 
-    range_ = request.args.get("range", "month")  # month | year | all
-    today = date.today()
+    group_by = request.args.get("group_by")
+
+    try:
+        range_, start_date, end_date = analytics.resolve_range(
+            request.args.get("range", "month"),
+            request.args.get("start"),
+            request.args.get("end"),
+        )
+        db = get_read_db(user_id)
+        exponent = money.get_exponent(user_id)
+        if columnar.enabled():
+            rows = columnar.aggregate(
+                db, user_id, start_date, end_date, group_by or "category"
+            )
+            timing = None
+        elif parallel.enabled():
+            rows, timing = _parallel_aggregate(
+                db, user_id, start_date, end_date, group_by or "category"
+            )
+        else:
+            rows = analytics.aggregate(
+                db, user_id, start_date, end_date, group_by or "category"
+            )
+            timing = None
+    except analytics.AnalyticsError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 'all' llega hasta 2100: las reglas sin fin se cuentan solo hasta hoy
+    rules_end = min(end_date, date.today()) if range_ == "all" else end_date
+    schedule = recurring.load(db, user_id, start_date, rules_end)
+    if schedule:
+        rows = analytics.merge_rows([
+            rows, schedule.aggregate(start_date, rules_end, group_by or "category")
+        ])
 
-    if range_ == "month":
-        start_date = today.replace(day=1)
-        end_date = today
-    elif range_ == "year":
-        start_date = date(today.year, 1, 1)
-        end_date = today
+    if not group_by:
+        response = schemas.json_response(
+            analytics.compat_payload(rows, range_, start_date, end_date, exponent)
+        )
     else:
-        start_date = date(1970, 1, 1)
-        end_date = date(2100, 12, 31)
+        response = schemas.json_response(
+            analytics.grouped_payload(
+                rows, range_, start_date, end_date, group_by, exponent
+            )
+        )
+    if timing:
+        response.headers["Server-Timing"] = timing
+    return response
 
-    start_str = start_date.isoformat()
-    end_str = end_date.isoformat()
 
-    db = get_db()
+def _parallel_aggregate(db, user_id, start_date, end_date, group_by):
+    """aggregate() repartido en subrangos que corren en paralelo (ANALYTICS_PARALLEL)."""
+    queries, descriptions = analytics.partition_queries(
+        db, user_id, start_date, end_date, group_by, parallel.partitions()
+    )
+    results = parallel.run_queries(queries, user_id)
+    rows = analytics.merge_rows(r.rows for r in results)
+    return rows, parallel.server_timing(results, descriptions)
 
-    # Totales generales
-    income_row = db.execute(
-        """
-        SELECT SUM(amount) AS total
-        FROM transactions
-        WHERE user_id = ?
-          AND type = 'income'
-          AND date BETWEEN ? AND ?
-        """,
-        (user_id, start_str, end_str),
-    ).fetchone()
 
-    expense_row = db.execute(
-        """
-        SELECT SUM(amount) AS total
-        FROM transactions
-        WHERE user_id = ?
-          AND type = 'expense'
-          AND date BETWEEN ? AND ?
-        """,
-        (user_id, start_str, end_str),
-    ).fetchone()
+@api_bp.route("/timeseries")
+@conditional_get
+def api_timeseries():
+    """
+    bucket=day|week|month; range=week|month|quarter|year|all o start/end.
+    Por bucket con movimientos: income, expense, net y saldo acumulado.
+    """
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    try:
+        range_, start_date, end_date = analytics.resolve_range(
+            request.args.get("range", "month"),
+            request.args.get("start"),
+            request.args.get("end"),
+        )
+        _refresh_checkpoints(user_id)
+        opening, rows = balances.timeseries(
+            get_read_db(user_id), user_id, start_date, end_date,
+            request.args.get("bucket", "month"),
+        )
+    except (analytics.AnalyticsError, balances.TimeseriesError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    exponent = money.get_exponent(user_id)
+    points = [
+        schemas.TimeseriesPoint(
+            period=r["period"],
+            income=money.to_major(r["income"], exponent),
+            expense=money.to_major(r["expense"], exponent),
+            net=money.to_major(r["income"] - r["expense"], exponent),
+            balance=money.to_major(r["balance"], exponent),
+            count=r["count"],
+        )
+        for r in rows
+    ]
+    return schemas.json_response(schemas.TimeseriesResponse(
+        range=range_,
+        bucket=request.args.get("bucket", "month"),
+        start_date=start_date.isoformat(),
+        end_date=end_date.isoformat(),
+        opening_balance=money.to_major(opening, exponent),
+        closing_balance=money.to_major(rows[-1]["balance"] if rows else opening, exponent),
+        points=points,
+    ))
+
+
+@api_bp.route("/balance")
+@conditional_get
+def api_balance():
+    """Saldo al cierre de date=YYYY-MM-DD (por defecto hoy), con las ocurrencias recurrentes."""
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    raw = request.args.get("date")
+    try:
+        day = date.fromisoformat(raw) if raw else date.today()
+    except ValueError:
+        return jsonify({"error": "Fecha inválida en 'date', use YYYY-MM-DD"}), 400
+
+    _refresh_checkpoints(user_id)
+    balance = balances.balance_as_of(get_read_db(user_id), user_id, day)
+    return schemas.json_response(schemas.BalanceResponse(
+        date=day.isoformat(),
+        balance=money.to_major(balance, money.get_exponent(user_id)),
+    ))
 
-    income_total = income_row["total"] or 0
-    expense_total = expense_row["total"] or 0
-    balance = income_total - expense_total
 
-    # Egresos por categoría
-    expense_cat_rows = db.execute(
+def _refresh_checkpoints(user_id):
+    """Completa los checkpoints invalidados desde la ultima lectura (solo si faltan)."""
+    if balances.is_stale(get_read_db(user_id), user_id):
+        balances.refresh(get_db(user_id), user_id)
+
+
+# ------------------------------------------------------------------
+# Reglas recurrentes
+# ------------------------------------------------------------------
+@api_bp.route("/recurring", methods=["GET"])
+@conditional_get
+def api_list_recurring():
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    exponent = money.get_exponent(user_id)
+    rules = recurring.list_rules(get_read_db(user_id), user_id)
+    return schemas.json_response(
+        schemas.RecurringRulesResponse([_rule_out(r, exponent) for r in rules])
+    )
+
+
+@api_bp.route("/recurring", methods=["POST"])
+def api_create_recurring():
+    """Crea una regla: frequency=daily|weekly|monthly|yearly cada `interval`, desde start_date."""
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    try:
+        values = _rule_values(user_id)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return jsonify({"error": f"Datos inválidos: {str(e)}"}), 400
+    except recurring.RecurringError as e:
+        return jsonify({"error": str(e)}), 400
+
+    db = get_db(user_id)
+    cursor = db.execute(
         """
-        SELECT c.name AS category, SUM(t.amount) AS total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = ?
-          AND t.type = 'expense'
-          AND t.date BETWEEN ? AND ?
-        GROUP BY c.id
-        ORDER BY total DESC
+        INSERT INTO recurring_rules
+            (user_id, category_id, amount_minor, type, description,
+             frequency, interval, start_date, end_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (user_id, start_str, end_str),
-    ).fetchall()
-    expenses_by_category = [
-        {"category": r["category"], "total": r["total"] or 0} 
-        for r in expense_cat_rows
-    ]
+        (user_id, *values),
+    )
+    db.commit()
+
+    return jsonify({"status": "ok", "rule_id": cursor.lastrowid}), 201
+
+
+@api_bp.route("/recurring/<int:rule_id>", methods=["PUT"])
+def api_update_recurring(rule_id):
+    """Reemplaza la regla; las ocurrencias pasadas y futuras se recalculan con los datos nuevos."""
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    try:
+        values = _rule_values(user_id)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return jsonify({"error": f"Datos inválidos: {str(e)}"}), 400
+    except recurring.RecurringError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Ingresos por categoría
-    income_cat_rows = db.execute(
+    db = get_db(user_id)
+    cursor = db.execute(
         """
-        SELECT c.name AS category, SUM(t.amount) AS total
-        FROM transactions t
-        JOIN categories c ON t.category_id = c.id
-        WHERE t.user_id = ?
-          AND t.type = 'income'
-          AND t.date BETWEEN ? AND ?
-        GROUP BY c.id
-        ORDER BY total DESC
+        UPDATE recurring_rules
+        SET category_id = ?, amount_minor = ?, type = ?, description = ?,
+            frequency = ?, interval = ?, start_date = ?, end_date = ?
+        WHERE id = ? AND user_id = ?
         """,
-        (user_id, start_str, end_str),
-    ).fetchall()
-    incomes_by_category = [
-        {"category": r["category"], "total": r["total"] or 0} 
-        for r in income_cat_rows
-    ]
+        (*values, rule_id, user_id),
+    )
+    db.commit()
+    if cursor.rowcount == 0:
+        return jsonify({"error": "Regla no encontrada"}), 404
 
-    return jsonify({
-        "range": range_,
-        "start_date": start_str,
-        "end_date": end_str,
-        "income_total": income_total,
-        "expense_total": expense_total,
-        "balance": balance,
-        "expenses_by_category": expenses_by_category,
-        "incomes_by_category": incomes_by_category,
-    })
+    return jsonify({"status": "ok"})
 
 
-@api_bp.route("/transactions", methods=["POST"])
-def api_create_transaction():
-    
-    data = request.get_json(silent=True) or {}
+@api_bp.route("/recurring/<int:rule_id>", methods=["DELETE"])
+def api_delete_recurring(rule_id):
+    """Borra la regla; las ocurrencias ya materializadas quedan como transacciones."""
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    db = get_db(user_id)
+    cursor = db.execute(
+        "DELETE FROM recurring_rules WHERE id = ? AND user_id = ?",
+        (rule_id, user_id),
+    )
+    db.commit()
+    if cursor.rowcount == 0:
+        return jsonify({"error": "Regla no encontrada"}), 404
+
+    return jsonify({"status": "ok"})
+
 
+@api_bp.route("/recurring/<int:rule_id>/occurrences/<day>", methods=["PUT"])
+def api_materialize_occurrence(rule_id, day):
+    """
+    Edita una ocurrencia: se guarda como transaccion real (mismo cuerpo que
+    POST /api/transactions) y la regla deja de generarla.
+    """
     user_id = get_user_id_from_request()
     if not user_id:
         return jsonify({"error": "Autenticación requerida"}), 401
 
-    amount = data.get("amount")
-    type_ = data.get("type")
-    description = data.get("description") or ""
-    category_name = (data.get("category") or "").strip()
-    date_str = data.get("date") or date.today().isoformat()
+    db = get_db(user_id)
+    rule = recurring.get_rule(db, user_id, rule_id)
+    if rule is None:
+        return jsonify({"error": "Regla no encontrada"}), 404
 
-    # Validaciones
     try:
-        amount = float(amount)
-        if amount <= 0:
-            raise ValueError("El monto debe ser mayor a 0")
-    except (TypeError, ValueError) as e:
-        return jsonify({"error": f"Monto inválido: {str(e)}"}), 400
+        occurrence = recurring.parse_occurrence(rule, day)
+        body = schemas.decode_body(schemas.TransactionIn)
+        # sin fecha en el cuerpo queda la de la ocurrencia, no la de hoy
+        if body.date is None:
+            body.date = occurrence
+        amount_minor, type_, description, category_name, date_str = (
+            transactions.validate_input(body, money.get_exponent(user_id))
+        )
+        transaction_id = recurring.materialize(
+            db, user_id, rule_id, occurrence,
+            _category_for_name(user_id, category_name),
+            amount_minor, type_, description, date_str,
+        )
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return jsonify({"error": f"Datos inválidos: {str(e)}"}), 400
+    except (recurring.RecurringError, transactions.InvalidTransaction) as e:
+        return jsonify({"error": str(e)}), 400
 
-    if type_ not in ("income", "expense"):
-        return jsonify({"error": "Tipo debe ser 'income' o 'expense'"}), 400
+    return jsonify({"status": "ok", "transaction_id": transaction_id}), 201
 
-    if not category_name:
-        return jsonify({"error": "Categoría requerida"}), 400
 
-    db = get_db()
+@api_bp.route("/recurring/<int:rule_id>/occurrences/<day>", methods=["DELETE"])
+def api_skip_occurrence(rule_id, day):
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
 
-    # Buscar o crear categoría
-    cat = db.execute(
-        "SELECT id FROM categories WHERE user_id = ? AND name = ?",
-        (user_id, category_name),
-    ).fetchone()
+    db = get_db(user_id)
+    rule = recurring.get_rule(db, user_id, rule_id)
+    if rule is None:
+        return jsonify({"error": "Regla no encontrada"}), 404
 
-    if cat:
-        category_id = cat["id"]
-    else:
+    try:
+        recurring.skip(db, user_id, rule_id, recurring.parse_occurrence(rule, day))
+    except recurring.RecurringError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"status": "ok"})
+
+
+def _rule_values(user_id):
+    """Columnas de recurring_rules (sin user_id) a partir del cuerpo del request."""
+    (amount_minor, type_, description, category_name,
+     frequency, interval, start_str, end_str) = recurring.validate_rule(
+        schemas.decode_body(schemas.RecurringRuleIn), money.get_exponent(user_id)
+    )
+    category_id = _category_for_name(user_id, category_name)
+    return (category_id, amount_minor, type_, description,
+            frequency, interval, start_str, end_str)
+
+
+def _rule_out(rule, exponent):
+    return schemas.RecurringRuleOut(
+        id=rule["id"],
+        amount=money.to_major(rule["amount_minor"], exponent),
+        type=rule["type"],
+        category=rule["category"],
+        description=rule["description"],
+        frequency=rule["frequency"],
+        interval=rule["interval"],
+        start_date=rule["start_date"],
+        end_date=rule["end_date"],
+    )
+
+
+def _category_for_name(user_id, name):
+    """id de la categoria `name` del usuario; la crea si no existe."""
+    category_id = category_cache.id_for_name(get_read_db(user_id), user_id, name)
+    if category_id is None:
+        db = get_db(user_id)
         cursor = db.execute(
             "INSERT INTO categories (user_id, name) VALUES (?, ?)",
-            (user_id, category_name)
+            (user_id, name)
         )
         db.commit()
         category_id = cursor.lastrowid
+        category_cache.invalidate(user_id)
+    return category_id
 
-    # Crear transacción
-    cursor = db.execute(
+
+# ------------------------------------------------------------------
+# Presupuestos
+# ------------------------------------------------------------------
+@api_bp.route("/budgets", methods=["GET"])
+@conditional_get
+def api_budgets():
+    """Presupuestos de month=YYYY-MM (por defecto el actual) con lo gastado y over_budget."""
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    try:
+        year_month = budgets.parse_month(request.args.get("month"))
+    except budgets.BudgetError as e:
+        return jsonify({"error": str(e)}), 400
+
+    exponent = money.get_exponent(user_id)
+    rows = [_budget_out(r, exponent) for r in budgets.status(get_read_db(user_id), user_id, year_month)]
+    return schemas.json_response(schemas.BudgetsResponse(
+        month=year_month,
+        over_budget=sum(1 for r in rows if r.over_budget),
+        budgets=rows,
+    ))
+
+
+@api_bp.route("/budgets", methods=["PUT"])
+def api_set_budget():
+    """Fija el presupuesto de una categoria existente, para un mes o (sin month) para todos."""
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    try:
+        body = schemas.decode_body(schemas.BudgetIn)
+        year_month = budgets.parse_month(body.month) if body.month else ""
+        amount_minor = money.parse_amount(body.amount, money.get_exponent(user_id))
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return jsonify({"error": f"Datos inválidos: {str(e)}"}), 400
+    except (budgets.BudgetError, money.InvalidAmount) as e:
+        return jsonify({"error": str(e)}), 400
+
+    category_id = category_cache.id_for_name(get_read_db(user_id), user_id, body.category.strip())
+    if category_id is None:
+        return jsonify({"error": "Categoría inexistente"}), 400
+
+    budgets.set_budget(get_db(user_id), user_id, category_id, amount_minor, year_month)
+    return jsonify({"status": "ok", "category_id": category_id, "month": year_month or None})
+
+
+@api_bp.route("/budgets/<int:category_id>", methods=["DELETE"])
+def api_delete_budget(category_id):
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    month = request.args.get("month")
+    try:
+        year_month = budgets.parse_month(month) if month else ""
+    except budgets.BudgetError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not budgets.delete_budget(get_db(user_id), user_id, category_id, year_month):
+        return jsonify({"error": "Presupuesto no encontrado"}), 404
+    return jsonify({"status": "ok"})
+
+
+def _budget_out(row, exponent):
+    return schemas.BudgetOut(
+        category_id=row["category_id"],
+        category=row["category"],
+        limit=money.to_major(row["limit"], exponent),
+        spent=money.to_major(row["spent"], exponent),
+        remaining=money.to_major(row["remaining"], exponent),
+        over_budget=row["over_budget"],
+    )
+
+
+@api_bp.route("/transactions", methods=["GET"])
+@conditional_get
+def api_list_transactions():
+    """
+    Listado paginado por cursor (date, id).
+    Filtros: type, category | category_id, start, end. Paginacion: limit, cursor.
+    Los totales (de todo el filtro) se devuelven solo en la primera pagina.
+    """
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    db = get_read_db(user_id)
+    cursor = request.args.get("cursor")
+    try:
+        filters = transactions.parse_filters(request.args, db, user_id)
+        limit = transactions.parse_limit(
+            request.args.get("limit"),
+            current_app.config.get("API_MAX_PAGE_SIZE", transactions.MAX_PAGE_SIZE),
+        )
+        exponent = money.get_exponent(user_id)
+        rows, next_cursor = transactions.fetch_page(
+            db, user_id, filters, cursor, limit, exponent
+        )
+    except transactions.ListingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    page = schemas.TransactionPage(
+        transactions=[schemas.TransactionOut(*r) for r in rows],
+        limit=limit,
+        has_more=next_cursor is not None,
+        next_cursor=next_cursor,
+    )
+    if not cursor:
+        page.totals = schemas.Totals(
+            **transactions.totals(db, user_id, filters, exponent)
+        )
+
+    return schemas.json_response(page)
+
+
+@api_bp.route("/transactions/search")
+@conditional_get
+def api_search_transactions():
+    """
+    Busqueda de texto en descripcion y categoria (FTS5), por relevancia.
+    q: palabras (la ultima como prefijo). Filtros y paginacion como en el listado.
+    """
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    db = get_read_db(user_id)
+    query = request.args.get("q", "")
+    try:
+        filters = transactions.parse_filters(request.args, db, user_id)
+        limit = transactions.parse_limit(
+            request.args.get("limit"),
+            current_app.config.get("API_MAX_PAGE_SIZE", transactions.MAX_PAGE_SIZE),
+        )
+        rows, next_cursor = search.search(
+            db, user_id, query, filters, request.args.get("cursor"), limit,
+            current_app.config.get("SEARCH_RANK_WINDOW", search.RANK_WINDOW),
+        )
+    except transactions.ListingError as e:
+        return jsonify({"error": str(e)}), 400
+
+    exponent = money.get_exponent(user_id)
+    return schemas.json_response(schemas.SearchPage(
+        query=query,
+        transactions=[
+            schemas.SearchHit(
+                id=r["id"],
+                amount=money.to_major(r["amount_minor"], exponent),
+                type=r["type"],
+                description=r["description"],
+                date=r["date"],
+                category=r["category"],
+                score=-r["rank"] if r["rank"] is not None else None,
+            )
+            for r in rows
+        ],
+        limit=limit,
+        has_more=next_cursor is not None,
+        next_cursor=next_cursor,
+    ))
+
+
+@api_bp.route("/transactions/export")
+def api_export_transactions():
+    """
+    Exporta las transacciones del rango (start/end) como CSV o NDJSON.
+    La respuesta se genera en streaming a partir de lotes de fetchmany.
+    """
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    format_ = request.args.get("format", "csv")
+    if format_ not in ("csv", "ndjson"):
+        return jsonify({"error": "Formato debe ser 'csv' o 'ndjson'"}), 400
+
+    try:
+        _, start_date, end_date = analytics.resolve_range(
+            "all", request.args.get("start"), request.args.get("end")
+        )
+    except analytics.AnalyticsError as e:
+        return jsonify({"error": str(e)}), 400
+
+    batch_size = current_app.config.get("EXPORT_BATCH_SIZE", 1000)
+
+    def generate():
+        db = get_read_db(user_id)
+        batches = transactions.iter_export(
+            db, user_id, start_date, end_date, batch_size, money.get_exponent(user_id)
+        )
+
+        if format_ == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(transactions.EXPORT_FIELDS)
+            yield buf.getvalue()
+            for rows in batches:
+                buf.seek(0)
+                buf.truncate()
+                writer.writerows(rows)
+                yield buf.getvalue()
+        else:
+            for rows in batches:
+                yield schemas.encode_lines([schemas.ExportRow(*r) for r in rows])
+
+    filename = f"transactions_{start_date.isoformat()}_{end_date.isoformat()}.{format_}"
+    mimetype = "text/csv" if format_ == "csv" else "application/x-ndjson"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@api_bp.route("/transactions", methods=["POST"])
+def api_create_transaction():
+    
+    user_id = get_user_id_from_request()
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    try:
+        amount_minor, type_, description, category_name, date_str = (
+            transactions.validate_input(
+                schemas.decode_body(schemas.TransactionIn),
+                money.get_exponent(user_id),
+            )
+        )
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return jsonify({"error": f"Datos inválidos: {str(e)}"}), 400
+    except transactions.InvalidTransaction as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Buscar o crear categoría
+    category_id = _category_for_name(user_id, category_name)
+
+    # Crear transacción (con WRITE_QUEUE, en el commit agrupado del writer)
+    transaction_id = write_queue.insert(
+        user_id,
         """
-        INSERT INTO transactions (user_id, category_id, amount, type, description, date)
+        INSERT INTO transactions (user_id, category_id, amount_minor, type, description, date)
         VALUES (?, ?, ?, ?, ?, ?)
         """,
-        (user_id, category_id, amount, type_, description, date_str),
+        (user_id, category_id, amount_minor, type_, description, date_str),
     )
-    db.commit()
+    columnar.record(user_id, transaction_id, category_id, amount_minor, type_, date_str)
 
-    return jsonify({
+    body = {
         "status": "ok",
-        "transaction_id": cursor.lastrowid
-    }), 201
\ No newline at end of file
+        "transaction_id": transaction_id
+    }
+    # estado del presupuesto de la categoria: busquedas por PK, sin SUM
+    status = budgets.status(get_read_db(user_id), user_id, date_str[:7], category_id)
+    if status:
+        body["budget"] = msgspec.to_builtins(_budget_out(status[0], money.get_exponent(user_id)))
+    return jsonify(body), 201
+
+
+@api_bp.route("/transactions/bulk", methods=["POST"])
+def api_bulk_create_transactions():
+    """
+    Carga masiva: array JSON, NDJSON (application/x-ndjson) o CSV (text/csv)
+    con columnas amount,type,category,description,date. El cuerpo se lee
+    en streaming y todo se escribe en una sola transaccion.
+    Con ?atomic=1 cualquier fila invalida cancela la carga completa.
+    """
+    # el cuerpo es el stream de filas, el username no puede venir ahi
+    user_id = get_user_id_from_request(allow_body=False)
+    if not user_id:
+        return jsonify({"error": "Autenticación requerida"}), 401
+
+    atomic = request.args.get("atomic") in ("1", "true")
+    db = get_db(user_id)
+    try:
+        items = bulk_import.iter_payload(request.stream, request.mimetype)
+        result = bulk_import.import_rows(
+            db,
+            user_id,
+            items,
+            batch_size=current_app.config.get("BULK_BATCH_SIZE", bulk_import.BATCH_SIZE),
+            max_rows=current_app.config.get("BULK_MAX_ROWS", bulk_import.MAX_ROWS),
+            atomic=atomic,
+        )
+    except bulk_import.TooManyRows as e:
+        return jsonify({"error": str(e)}), 413
+    except bulk_import.BulkError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if result["error_count"] and (atomic or not result["inserted"]):
+        return jsonify({"status": "error", **result}), 400
+
+    return jsonify({"status": "ok", **result}), 201
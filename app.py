@@ -1,18 +1,53 @@
 from flask import Flask
-from flask_session import Session
-from db import close_db
+from db import PoolTimeout, close_db, pool_timeout_handler
+from hashing import HashPoolBusy, busy_handler
+from parallel import ParallelTimeout, timeout_handler
+from write_queue import WriteQueueBusy
 from api import api_bp
 from views import views_bp
+import category_cache
+import columnar
+import http_cache
+import metrics
+import money
+import sessions
 from auth import auth_bp
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "4647586b6f63536f6e65526f596e614a"
 app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
+app.config["SESSION_BACKEND"] = "sqlite"
+app.config["SESSION_SWEEP_SECONDS"] = 300
 app.config["JWT_EXP_MINUTES"] = 60
+app.config["DB_POOL_SIZE"] = 4
+app.config["DB_READ_POOL_SIZE"] = 8
+app.config["DB_SHARDS"] = 1
+app.config["STATS_ENABLED"] = False
+app.config["RESPONSE_CACHE_SIZE"] = 0
+app.config["PASSWORD_HASH_METHOD"] = "scrypt:32768:8:1"
+app.config["HASH_WORKERS"] = 2
+app.config["HASH_QUEUE_SIZE"] = 16
+app.config["ANALYTICS_PARALLEL"] = False
+app.config["ANALYTICS_WORKERS"] = 4
+app.config["ANALYTICS_PARTITIONS"] = 4
+app.config["ANALYTICS_COLUMNAR"] = False
+app.config["ANALYTICS_COLUMNAR_MB"] = 64
+app.config["WRITE_QUEUE"] = False
+app.config["INDEX_PAGE_SIZE"] = 0
+app.config["METRICS_ENABLED"] = False
+app.config["SLOW_QUERY_MS"] = 100
 
-Session(app)
+sessions.init_app(app)
+metrics.init_app(app)
+category_cache.init_app(app)
+http_cache.init_app(app)
+money.init_app(app)
+columnar.init_app(app)
 app.teardown_appcontext(close_db)
+app.register_error_handler(PoolTimeout, pool_timeout_handler)
+app.register_error_handler(HashPoolBusy, busy_handler)
+app.register_error_handler(WriteQueueBusy, busy_handler)
+app.register_error_handler(ParallelTimeout, timeout_handler)
 
 app.register_blueprint(api_bp)
 app.register_blueprint(views_bp)
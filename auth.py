@@ -1,7 +1,10 @@
-from werkzeug.security import check_password_hash, generate_password_hash
+import sqlite3
+
 from flask import render_template, request, redirect, session, Blueprint, request,url_for
 
-from db import get_db
+from db import close_db, get_db, get_read_db, shard_count
+import shards
+from hashing import hash_password, verify_and_upgrade
 
 auth_bp = Blueprint("auth", __name__,)
 
@@ -17,22 +20,28 @@ def register():
         if not username or not password or password != confirmation:
             return "Error en datos", 400
 
-        hash_ = generate_password_hash(password)
-
-        db = get_db()
-
-        
-        row = db.execute(
+        row = get_read_db().execute(
             "SELECT id FROM users WHERE username = ?",
             (username,),
         ).fetchone()
         if row is not None:
             return "Usuario ya existe", 400
 
-        db.execute(
-            "INSERT INTO users (username, hash) VALUES (?, ?)",
-            (username, hash_),
-        )
+        # el KDF corre en el pool de hashing, no en este thread; mientras
+        # tanto las conexiones de la request vuelven al pool
+        close_db()
+        hash_ = hash_password(password)
+
+        db = get_db()
+        try:
+            cursor = db.execute(
+                "INSERT INTO users (username, hash) VALUES (?, ?)",
+                (username, hash_),
+            )
+        except sqlite3.IntegrityError:
+            # otro registro con el mismo nombre entro durante el KDF
+            return "Usuario ya existe", 400
+        shards.assign(db, cursor.lastrowid, shard_count())
         db.commit()
 
         return redirect("/login")
@@ -51,13 +60,13 @@ def login():
         if not username or not password:
             return "Faltan datos", 400
 
-        db = get_db()
-        row = db.execute(
+        row = get_read_db().execute(
             "SELECT id, hash FROM users WHERE username = ?",
             (username,),
         ).fetchone()
+        close_db()
 
-        if row is None or not check_password_hash(row["hash"], password):
+        if row is None or not verify_and_upgrade(row["id"], row["hash"], password):
             return "Usuario o contraseña incorrectos", 400
 
         session["user_id"] = row["id"]
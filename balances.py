@@ -0,0 +1,194 @@
+from datetime import date, timedelta
+
+import recurring
+import rollups
+
+BUCKETS = ("day", "week", "month")
+
+_NET = "CASE WHEN type = 'income' THEN total ELSE -total END"
+
+
+class TimeseriesError(ValueError):
+    """Parametros de la serie invalidos (se responde 400)."""
+
+
+def _last_checkpoint(db, user_id, before_month=None):
+    """(year_month, saldo) del ultimo checkpoint (anterior a `before_month`), o (None, 0)."""
+    sql = "SELECT year_month, balance FROM balance_checkpoints WHERE user_id = ?"
+    params = [user_id]
+    if before_month is not None:
+        sql += " AND year_month < ?"
+        params.append(before_month)
+    row = db.execute(sql + " ORDER BY year_month DESC LIMIT 1", params).fetchone()
+    return (row[0], row[1]) if row else (None, 0)
+
+
+def is_stale(db, user_id):
+    """True si hay meses con rollups despues del ultimo checkpoint (dos busquedas por PK)."""
+    row = db.execute(
+        """
+        SELECT (SELECT MAX(year_month) FROM monthly_rollups WHERE user_id = ?)
+             > COALESCE((SELECT MAX(year_month) FROM balance_checkpoints WHERE user_id = ?), '')
+        """,
+        (user_id, user_id),
+    ).fetchone()
+    return bool(row[0])
+
+
+def refresh(db, user_id):
+    """Completa los checkpoints que faltan a partir del ultimo vigente.
+
+    Los triggers borran siempre un sufijo (del mes cambiado en adelante),
+    asi que alcanza con seguir la suma acumulada desde el ultimo que quedo.
+    La lectura de ese checkpoint y el INSERT van en una sola transaccion
+    IMMEDIATE: una escritura con fecha anterior no puede entrar en el medio
+    y dejar checkpoints calculados sobre un saldo viejo.
+    Devuelve la cantidad de meses recalculados.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        last_month, last_balance = _last_checkpoint(db, user_id)
+        cursor = db.execute(
+            f"""
+            INSERT OR REPLACE INTO balance_checkpoints (user_id, year_month, balance)
+            SELECT ?, year_month, ? + SUM(net) OVER (ORDER BY year_month)
+            FROM (
+                SELECT year_month, SUM({_NET}) AS net
+                FROM monthly_rollups
+                WHERE user_id = ? AND year_month > ?
+                GROUP BY year_month
+            )
+            """,
+            (user_id, last_balance, user_id, last_month or ""),
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return cursor.rowcount
+
+
+def balance_as_of(db, user_id, day):
+    """Saldo al cierre de `day` (inclusive), en unidades minimas.
+
+    Checkpoint del mes anterior (busqueda por PK) + meses sin checkpoint
+    todavia (los invalidados desde el ultimo refresh, normalmente ninguno)
+    + las transacciones del mes de `day` hasta esa fecha, que salen del
+    indice (user_id, type, date, amount_minor) sin leer la tabla
+    + las ocurrencias de reglas recurrentes hasta `day`, que no pasan por
+    transactions ni por los checkpoints (se cuentan, como en el resumen).
+    """
+    month = day.strftime("%Y-%m")
+    checkpoint_month, balance = _last_checkpoint(db, user_id, month)
+
+    row = db.execute(
+        f"""
+        SELECT
+            (SELECT COALESCE(SUM({_NET}), 0)
+             FROM monthly_rollups
+             WHERE user_id = ? AND year_month > ? AND year_month < ?),
+            (SELECT COALESCE(SUM(amount_minor), 0)
+             FROM transactions
+             WHERE user_id = ? AND type = 'income' AND date >= ? AND date < ?),
+            (SELECT COALESCE(SUM(amount_minor), 0)
+             FROM transactions
+             WHERE user_id = ? AND type = 'expense' AND date >= ? AND date < ?)
+        """,
+        (
+            user_id, checkpoint_month or "", month,
+            user_id, day.replace(day=1).isoformat(), (day + timedelta(days=1)).isoformat(),
+            user_id, day.replace(day=1).isoformat(), (day + timedelta(days=1)).isoformat(),
+        ),
+    ).fetchone()
+    return balance + row[0] + row[1] - row[2] + _recurring_net(db, user_id, date.min, day)
+
+
+def _recurring_net(db, user_id, start, end):
+    """Ingresos menos egresos de las ocurrencias de [start, end]."""
+    schedule = recurring.load(db, user_id, start, end)
+    if not schedule:
+        return 0
+    income, expense, _ = schedule.totals(start, end)
+    return income - expense
+
+
+def _source(user_id, start, end, bucket):
+    """Fuente (period, type, total, count) del rango para el bucket pedido."""
+    if bucket == "month":
+        sql, params = rollups.range_source(user_id, start, end)
+        return f"SELECT year_month AS period, type, total, count FROM ({sql})", params
+
+    period = "substr(date, 1, 10)" if bucket == "day" else "date(date, 'weekday 0', '-6 days')"
+    sql = f"""
+        SELECT {period} AS period, type, amount_minor AS total, 1 AS count
+        FROM transactions
+        WHERE user_id = ? AND date >= ? AND date < ?
+    """
+    return sql, [user_id, start.isoformat(), (end + timedelta(days=1)).isoformat()]
+
+
+def timeseries(db, user_id, start, end, bucket="month"):
+    """Ingresos, egresos y saldo acumulado por bucket (solo buckets con movimientos).
+
+    El saldo inicial es balance_as_of(start - 1 dia) y la suma acumulada la
+    hace SQLite con una window function sobre los buckets del rango. Si hay
+    reglas recurrentes en el rango, sus ocurrencias se suman a cada bucket
+    y el acumulado se rehace en Python.
+    Devuelve (saldo_inicial, filas).
+    """
+    if bucket not in BUCKETS:
+        raise TimeseriesError(f"bucket inválido, use uno de: {', '.join(BUCKETS)}")
+
+    opening = balance_as_of(db, user_id, start - timedelta(days=1))
+    source, params = _source(user_id, start, end, bucket)
+    rows = db.execute(
+        f"""
+        SELECT period,
+               income,
+               expense,
+               count,
+               ? + SUM(income - expense) OVER (
+                   ORDER BY period ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+               ) AS balance
+        FROM (
+            SELECT period,
+                   SUM(CASE WHEN type = 'income' THEN total ELSE 0 END) AS income,
+                   SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END) AS expense,
+                   SUM(count) AS count
+            FROM ({source})
+            GROUP BY period
+        )
+        ORDER BY period
+        """,
+        [opening] + params,
+    ).fetchall()
+
+    schedule = recurring.load(db, user_id, start, end)
+    if schedule:
+        rows = _with_occurrences(rows, schedule.aggregate(start, end, bucket), opening)
+    return opening, rows
+
+
+def _with_occurrences(rows, projected, opening):
+    """Suma las ocurrencias (filas de Schedule.aggregate) a los buckets y rehace el saldo."""
+    buckets = {
+        r["period"]: {"period": r["period"], "income": r["income"],
+                      "expense": r["expense"], "count": r["count"]}
+        for r in rows
+    }
+    for p in projected:
+        acc = buckets.setdefault(
+            p["key"], {"period": p["key"], "income": 0, "expense": 0, "count": 0}
+        )
+        acc["income"] += p["income"]
+        acc["expense"] += p["expense"]
+        acc["count"] += p["count"]
+
+    balance = opening
+    result = []
+    for period in sorted(buckets):
+        acc = buckets[period]
+        balance += acc["income"] - acc["expense"]
+        acc["balance"] = balance
+        result.append(acc)
+    return result
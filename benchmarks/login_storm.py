@@ -0,0 +1,134 @@
+"""Tormenta de logins: throughput de /api/auth/login contra la latencia de
+un endpoint liviano (/api/categories) servido al mismo tiempo.
+
+Corre una vez por cada valor de --workers (0 = hash en el thread de la
+request) sobre un servidor threaded real y una base temporal:
+
+    python benchmarks/login_storm.py --logins 200 --concurrency 16 --workers 0 2 4
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+def _request(url, body=None, headers=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_once(app, workers, logins, concurrency):
+    import hashing
+    from init_db import init_db
+    from werkzeug.serving import make_server
+
+    tmp = tempfile.mkdtemp(prefix="cashflow-bench-")
+    database = os.path.join(tmp, "bench.db")
+    init_db(database)
+
+    app.config["DATABASE"] = database
+    app.config["HASH_WORKERS"] = workers
+    hashing.reset_pool()
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with app.app_context():
+        from db import get_db
+
+        db = get_db()
+        db.execute(
+            "INSERT INTO users (username, hash) VALUES (?, ?)",
+            (USERNAME, hashing.hash_password(PASSWORD)),
+        )
+        db.commit()
+
+    status, body = _request(f"{base}/api/auth/login", {"username": USERNAME, "password": PASSWORD})
+    token = json.loads(body)["token"]
+    auth = {"Authorization": f"Bearer {token}"}
+
+    probe_latencies = []
+    stop = threading.Event()
+
+    def probe():
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            _request(f"{base}/api/categories", headers=auth)
+            probe_latencies.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.01)
+
+    def login(_):
+        return _request(f"{base}/api/auth/login", {"username": USERNAME, "password": PASSWORD})[0]
+
+    probe_thread = threading.Thread(target=probe)
+    probe_thread.start()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    probe_thread.join()
+    server.shutdown()
+    hashing.reset_pool()
+
+    ok = statuses.count(200)
+    return {
+        "hash_workers": workers,
+        "logins": logins,
+        "ok": ok,
+        "rejected_503": statuses.count(503),
+        "logins_per_s": round(ok / elapsed, 1),
+        "probe_p50_ms": round(statistics.median(probe_latencies), 2) if probe_latencies else 0.0,
+        "probe_p95_ms": round(_percentile(probe_latencies, 95), 2),
+        "probe_max_ms": round(max(probe_latencies, default=0.0), 2),
+        "probe_requests": len(probe_latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--queue-size", type=int, default=16)
+    args = parser.parse_args()
+
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app.config["HASH_QUEUE_SIZE"] = args.queue_size
+
+    results = [run_once(app, w, args.logins, args.concurrency) for w in args.workers]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
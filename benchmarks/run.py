@@ -0,0 +1,246 @@
+"""Benchmark de las rutas principales con el test client de Flask.
+
+Mide cada ruta por separado (p50/p95/p99 y requests por segundo) sobre
+una copia de la base, asi los POST no modifican la original. Sin
+--database genera una base chica con seed.py.
+
+    python benchmarks/run.py --database /tmp/bench.db --output results.json
+    python benchmarks/run.py --database /tmp/bench.db --baseline results.json --max-regression 20
+    python benchmarks/run.py --thresholds thresholds.json
+
+thresholds.json: {"api_summary": {"p95_ms": 20}, "api_auth_login": {"min_rps": 5}}
+Sale con codigo 1 si alguna ruta supera un umbral o empeora su p95 mas
+de --max-regression % contra el baseline.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed  # noqa: E402
+
+METRICS_LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "mean_ms", "max_ms")
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _copy_database(source, shard_count):
+    """Copia la base (y sus shards) con la API de backup; devuelve la ruta de la copia."""
+    import shards
+
+    tmp = tempfile.mkdtemp(prefix="cashflow-bench-")
+    target = os.path.join(tmp, os.path.basename(source))
+    for src, dst in zip(shards.shard_paths(source, shard_count), shards.shard_paths(target, shard_count)):
+        with sqlite3.connect(src) as a, sqlite3.connect(dst) as b:
+            a.backup(b)
+        a.close()
+        b.close()
+    return target
+
+
+def _routes(analytics_ranges):
+    """[(nombre, metodo, url, body, estado_esperado)]; body None = GET."""
+    routes = [
+        ("index", "view", "/", None, 200),
+        ("history", "view", "/history", None, 200),
+        ("add_form", "view", "/add", None, 200),
+        ("api_summary", "api", "/api/summary", None, 200),
+        ("api_categories", "api", "/api/categories", None, 200),
+    ]
+    for range_ in analytics_ranges:
+        routes.append((f"api_analytics_{range_}", "api", f"/api/analytics?range={range_}", None, 200))
+    routes.append(("api_create_transaction", "api_post", "/api/transactions", "transaction", 201))
+    routes.append(("api_auth_login", "login", "/api/auth/login", "login", 200))
+    return routes
+
+
+class Harness:
+    def __init__(self, app, users, rng):
+        self.app = app
+        self.rng = rng
+        self.sessions = []
+        for i in range(users):
+            name = seed.username(i)
+            client = app.test_client()
+            r = client.post("/login", data={"username": name, "password": seed.PASSWORD})
+            if r.status_code != 302:
+                raise SystemExit(f"No se pudo iniciar sesion como {name}: {r.status_code}")
+            token = client.post(
+                "/api/auth/login", json={"username": name, "password": seed.PASSWORD}
+            ).get_json()["token"]
+            self.sessions.append((name, client, {"Authorization": f"Bearer {token}"}))
+
+    def request(self, kind, url, body):
+        name, client, headers = self.rng.choice(self.sessions)
+        if kind == "view":
+            return client.get(url)
+        if kind == "api":
+            return client.get(url, headers=headers)
+        if kind == "login":
+            return client.post(url, json={"username": name, "password": seed.PASSWORD})
+        return client.post(url, headers=headers, json={
+            "amount": f"{self.rng.randint(1, 50_000)}.{self.rng.randint(0, 99):02d}",
+            "type": self.rng.choice(("income", "expense")),
+            "category": f"Categoria {self.rng.randrange(12):02d}",
+            "date": datetime.now().date().isoformat(),
+        })
+
+    def measure(self, kind, url, body, expected, requests, warmup):
+        for _ in range(warmup):
+            self.request(kind, url, body)
+
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            response = self.request(kind, url, body)
+            # las vistas transmitidas recien se renderizan al leer el cuerpo
+            response.get_data()
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code != expected:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+        return {
+            "requests": requests,
+            "errors": errors,
+            "rps": round(requests / elapsed, 1) if elapsed else 0.0,
+            "mean_ms": round(statistics.fmean(latencies), 3),
+            "p50_ms": round(_percentile(latencies, 50), 3),
+            "p95_ms": round(_percentile(latencies, 95), 3),
+            "p99_ms": round(_percentile(latencies, 99), 3),
+            "max_ms": round(max(latencies), 3),
+        }
+
+
+def check(results, thresholds=None, baseline=None, max_regression=None):
+    """Lista de fallas (texto) contra umbrales absolutos y contra un baseline."""
+    failures = []
+    for route, limits in (thresholds or {}).items():
+        got = results.get(route)
+        if got is None:
+            continue
+        for metric, limit in limits.items():
+            if metric == "min_rps":
+                if got["rps"] < limit:
+                    failures.append(f"{route}: rps {got['rps']} < {limit}")
+            elif metric == "max_errors":
+                if got["errors"] > limit:
+                    failures.append(f"{route}: errors {got['errors']} > {limit}")
+            elif got.get(metric, 0) > limit:
+                failures.append(f"{route}: {metric} {got[metric]} > {limit}")
+
+    if baseline and max_regression is not None:
+        for route, got in results.items():
+            before = baseline.get(route)
+            if not before or not before.get("p95_ms"):
+                continue
+            change = (got["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            if change > max_regression:
+                failures.append(
+                    f"{route}: p95 {before['p95_ms']} -> {got['p95_ms']} ms (+{change:.1f}%)"
+                )
+
+    for route, got in results.items():
+        if got["errors"] and not (thresholds or {}).get(route, {}).get("max_errors"):
+            failures.append(f"{route}: {got['errors']} respuestas con estado inesperado")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="base generada con seed.py (por defecto, una chica nueva)")
+    parser.add_argument("--shards", type=int, default=1, help="DB_SHARDS con el que se genero la base")
+    parser.add_argument("--users", type=int, default=10, help="usuarios del seed a usar")
+    parser.add_argument("--requests", type=int, default=200, help="requests por ruta")
+    parser.add_argument("--login-requests", type=int, default=20, help="el KDF hace lento el login")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--routes", nargs="*", help="subconjunto de rutas (por nombre)")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--thresholds", help="JSON {ruta: {p95_ms|p99_ms|p50_ms|min_rps|max_errors: valor}}")
+    parser.add_argument("--baseline", help="resultados anteriores (JSON de --output)")
+    parser.add_argument("--max-regression", type=float, default=None, help="%% de p95 tolerado contra --baseline")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--config", nargs="*", default=[], help="KEY=VALOR (JSON) para app.config")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    if args.database:
+        database = _copy_database(args.database, args.shards)
+    else:
+        database = os.path.join(tempfile.mkdtemp(prefix="cashflow-bench-"), "bench.db")
+        seed.seed(database, users=args.users, transactions=2000, shard_count=args.shards)
+
+    from app import app
+    from analytics import RANGES
+
+    app.config["DATABASE"] = database
+    app.config["DB_SHARDS"] = args.shards
+    app.config["TESTING"] = True
+    for item in args.config:
+        key, _, value = item.partition("=")
+        app.config[key] = json.loads(value)
+
+    rng = random.Random(args.seed)
+    harness = Harness(app, args.users, rng)
+
+    results = {}
+    for name, kind, url, body, expected in _routes(RANGES):
+        if args.routes and name not in args.routes:
+            continue
+        requests = args.login_requests if kind == "login" else args.requests
+        results[name] = harness.measure(kind, url, body, expected, requests, args.warmup)
+        print(f"{name:28s} p50 {results[name]['p50_ms']:8.2f}  p95 {results[name]['p95_ms']:8.2f}  "
+              f"p99 {results[name]['p99_ms']:8.2f} ms  {results[name]['rps']:8.1f} req/s")
+
+    thresholds = None
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["routes"]
+
+    failures = check(results, thresholds, baseline, args.max_regression)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "database": args.database or "(generada)",
+                "shards": args.shards,
+                "users": args.users,
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "config": args.config,
+            },
+            "routes": results,
+            "failures": failures,
+        }, f, indent=2)
+
+    for failure in failures:
+        print("REGRESION:", failure)
+    print(f"Resultados en {args.output}")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Genera una base con datos sinteticos para benchmarks.
+
+N usuarios (bench0..benchN-1, todos con la misma password), M transacciones
+por usuario repartidas en --days dias hacia atras desde hoy y --categories
+categorias por usuario:
+
+    python benchmarks/seed.py --database /tmp/bench.db --users 50 --transactions 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import shards  # noqa: E402
+from init_db import init_db  # noqa: E402
+
+PASSWORD = "bench-password"
+USERNAME_PREFIX = "bench"
+BATCH_SIZE = 10_000
+
+DESCRIPTIONS = ("", "", "supermercado", "alquiler", "sueldo", "transferencia", "cafe", "nafta")
+
+
+def username(i):
+    return f"{USERNAME_PREFIX}{i}"
+
+
+def _password_hash(method):
+    from werkzeug.security import generate_password_hash
+
+    return generate_password_hash(PASSWORD, method)
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+
+def seed(database, users=10, transactions=1000, categories=12, days=730,
+         shard_count=1, seed_value=42, hash_method="scrypt:32768:8:1", end=None):
+    """Crea la base (de cero) y la llena; devuelve un resumen con los conteos."""
+    rng = random.Random(seed_value)
+    end = end or date.today()
+    init_db(database, reset=True, shards=shard_count)
+
+    directory = _connect(database)
+    shard_conns = {
+        n: (directory if n == 0 else _connect(shards.shard_path(database, n)))
+        for n in range(max(shard_count, 1))
+    }
+    password_hash = _password_hash(hash_method)
+
+    started = time.perf_counter()
+    total = 0
+    with directory:
+        user_ids = []
+        for i in range(users):
+            cursor = directory.execute(
+                "INSERT INTO users (username, hash) VALUES (?, ?)",
+                (username(i), password_hash),
+            )
+            shards.assign(directory, cursor.lastrowid, shard_count)
+            user_ids.append(cursor.lastrowid)
+
+    for user_id in user_ids:
+        conn = shard_conns[shards.hash_shard(user_id, shard_count)]
+        with conn:
+            category_ids = []
+            for c in range(categories):
+                cursor = conn.execute(
+                    "INSERT INTO categories (user_id, name) VALUES (?, ?)",
+                    (user_id, f"Categoria {c:02d}"),
+                )
+                category_ids.append(cursor.lastrowid)
+
+            # pocas categorias concentran la mayoria de los movimientos, como en datos reales
+            weights = [1 / (k + 1) for k in range(len(category_ids))]
+            remaining = transactions
+            while remaining:
+                n = min(BATCH_SIZE, remaining)
+                cats = rng.choices(category_ids, weights, k=n)
+                rows = []
+                for category_id in cats:
+                    is_income = rng.random() < 0.2
+                    amount_minor = (
+                        rng.randint(50_000, 500_000) if is_income else rng.randint(100, 30_000)
+                    )
+                    rows.append((
+                        user_id,
+                        category_id,
+                        amount_minor,
+                        "income" if is_income else "expense",
+                        rng.choice(DESCRIPTIONS),
+                        (end - timedelta(days=rng.randrange(days))).isoformat(),
+                    ))
+                conn.executemany(
+                    """
+                    INSERT INTO transactions (user_id, category_id, amount_minor, type, description, date)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+                remaining -= n
+                total += n
+
+    for conn in shard_conns.values():
+        conn.execute("PRAGMA optimize")
+        conn.close()
+
+    return {
+        "database": database,
+        "shards": max(shard_count, 1),
+        "users": users,
+        "transactions": total,
+        "categories_per_user": categories,
+        "days": days,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default="bench.db")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--transactions", type=int, default=1000, help="por usuario")
+    parser.add_argument("--categories", type=int, default=12, help="por usuario")
+    parser.add_argument("--days", type=int, default=730, help="dispersion de fechas hacia atras")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--hash-method", default="scrypt:32768:8:1")
+    args = parser.parse_args()
+
+    summary = seed(
+        args.database,
+        users=args.users,
+        transactions=args.transactions,
+        categories=args.categories,
+        days=args.days,
+        shard_count=args.shards,
+        seed_value=args.seed,
+        hash_method=args.hash_method,
+    )
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Costo por request de cada backend de sesion (SESSION_BACKEND).
+
+Mide con el test client una ruta que solo lee session["user_id"] (lo que
+hace cada vista) y otra que lo escribe (login), mas una linea de base
+sin sesion. El overhead es la diferencia de la media contra esa base:
+
+    python benchmarks/session_backends.py --requests 2000
+    python benchmarks/session_backends.py --backends sqlite cookie --output sessions.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.sessions import SessionInterface  # noqa: E402
+
+SCENARIOS = ("read", "write")
+
+
+class _NoSession(SessionInterface):
+    """Linea de base: sesion nula, sin cookie ni almacenamiento."""
+
+    def open_session(self, app, request):
+        return None
+
+    def save_session(self, app, session, response):
+        pass
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _install_routes(app):
+    from flask import session
+
+    # antes del primer request: Flask no deja registrar rutas despues
+    @app.route("/_bench/session/read")
+    def bench_session_read():
+        return str(session.get("user_id"))
+
+    @app.route("/_bench/session/write")
+    def bench_session_write():
+        if isinstance(app.session_interface, _NoSession):
+            return "None"
+        session["user_id"] = 1
+        return "1"
+
+
+def measure(app, backend, scenario, requests, warmup):
+    import sessions
+
+    if backend == "none":
+        app.session_interface = _NoSession()
+    else:
+        app.config["SESSION_BACKEND"] = backend
+        sessions.init_app(app)
+
+    client = app.test_client()
+    # sesion iniciada: las lecturas encuentran al usuario como en las vistas
+    client.get("/_bench/session/write")
+    url = f"/_bench/session/{scenario}"
+    for _ in range(warmup):
+        client.get(url)
+
+    latencies = []
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        latencies.append((time.perf_counter() - t0) * 1e6)
+        if backend != "none" and response.get_data() != b"1":
+            raise SystemExit(f"{backend}/{scenario}: la sesion no tiene user_id")
+
+    return {
+        "requests": requests,
+        "mean_us": round(statistics.fmean(latencies), 1),
+        "p50_us": round(_percentile(latencies, 50), 1),
+        "p95_us": round(_percentile(latencies, 95), 1),
+        "p99_us": round(_percentile(latencies, 99), 1),
+    }
+
+
+def main():
+    import sessions
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="requests por backend y escenario")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--backends", nargs="+", default=list(sessions.BACKENDS))
+    parser.add_argument("--output", help="JSON con los resultados")
+    args = parser.parse_args()
+
+    from app import app
+    from init_db import init_db
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    # FileSystemSessionInterface avisa que esta deprecado en cada init
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    tmp = tempfile.mkdtemp(prefix="cashflow-bench-")
+    database = os.path.join(tmp, "bench.db")
+    init_db(database)
+    app.config["DATABASE"] = database
+    app.config["SESSION_FILE_DIR"] = os.path.join(tmp, "flask_session")
+    app.config["SESSION_SWEEP_SECONDS"] = 0
+    app.config["TESTING"] = True
+    _install_routes(app)
+
+    results = {}
+    for scenario in SCENARIOS:
+        base = measure(app, "none", scenario, args.requests, args.warmup)
+        results[f"none/{scenario}"] = base
+        for backend in args.backends:
+            got = measure(app, backend, scenario, args.requests, args.warmup)
+            got["overhead_us"] = round(got["mean_us"] - base["mean_us"], 1)
+            results[f"{backend}/{scenario}"] = got
+
+    for name, got in results.items():
+        print(f"{name:20s} mean {got['mean_us']:8.1f}  p50 {got['p50_us']:8.1f}  "
+              f"p95 {got['p95_us']:8.1f} us  overhead {got.get('overhead_us', 0.0):8.1f} us")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
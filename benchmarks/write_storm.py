@@ -0,0 +1,138 @@
+"""Tormenta de escrituras: POST /api/transactions concurrentes con y sin
+WRITE_QUEUE (commit agrupado), sobre un servidor threaded real y una base
+temporal por corrida:
+
+    python benchmarks/write_storm.py --inserts 2000 --concurrency 32
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USERNAME = "bench"
+PASSWORD = "bench-password"
+
+
+def _request(url, body=None, headers=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, headers=headers or {})
+    if data is not None:
+        req.add_header("Content-Type", "application/json")
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_once(app, write_queue_on, inserts, concurrency, synchronous):
+    import write_queue
+    from init_db import init_db
+    from werkzeug.security import generate_password_hash
+    from werkzeug.serving import make_server
+
+    tmp = tempfile.mkdtemp(prefix="cashflow-bench-")
+    database = os.path.join(tmp, "bench.db")
+    init_db(database)
+
+    app.config["DATABASE"] = database
+    app.config["WRITE_QUEUE"] = write_queue_on
+    app.config["DB_SYNCHRONOUS"] = synchronous
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    base = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with app.app_context():
+        from db import get_db
+
+        db = get_db()
+        db.execute(
+            "INSERT INTO users (username, hash) VALUES (?, ?)",
+            (USERNAME, generate_password_hash(PASSWORD, "pbkdf2:sha256:1000")),
+        )
+        db.commit()
+
+    status, body = _request(f"{base}/api/auth/login", {"username": USERNAME, "password": PASSWORD})
+    token = json.loads(body)["token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    _request(
+        f"{base}/api/transactions",
+        {"amount": 1, "type": "expense", "category": "Bench"},
+        auth,
+    )
+
+    latencies = []
+
+    def insert(i):
+        t0 = time.perf_counter()
+        status = _request(
+            f"{base}/api/transactions",
+            {"amount": f"{i % 1000 + 1}.25", "type": "expense", "category": "Bench"},
+            auth,
+        )[0]
+        latencies.append((time.perf_counter() - t0) * 1000)
+        return status
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(insert, range(inserts)))
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+
+    queue_stats = write_queue.stats()
+    write_queue.close_all()
+
+    ok = statuses.count(201)
+    return {
+        "write_queue": write_queue_on,
+        "synchronous": synchronous,
+        "inserts": inserts,
+        "ok": ok,
+        "rejected_503": statuses.count(503),
+        "inserts_per_s": round(ok / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "writer": queue_stats[0] if queue_stats else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inserts", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    # FULL: un fsync por commit, el caso en que agrupar commits mas rinde
+    parser.add_argument("--synchronous", choices=["NORMAL", "FULL"], default="FULL")
+    args = parser.parse_args()
+
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app.config["DB_POOL_SIZE"] = args.concurrency
+
+    results = [
+        run_once(app, on, args.inserts, args.concurrency, args.synchronous)
+        for on in (False, True)
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import re
+import sqlite3
+from calendar import monthrange
+from datetime import date
+
+import recurring
+import rollups
+from shards import shard_paths
+
+DATABASE = "cashflow.db"
+
+_MONTH = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+class BudgetError(ValueError):
+    """Mes o presupuesto invalido (se responde 400)."""
+
+
+def parse_month(value, today=None):
+    """'YYYY-MM' validado; sin valor, el mes actual."""
+    if not value:
+        return (today or date.today()).strftime("%Y-%m")
+    if not _MONTH.match(value):
+        raise BudgetError("Mes inválido, use YYYY-MM")
+    return value
+
+
+def month_bounds(year_month):
+    year, month = int(year_month[:4]), int(year_month[5:7])
+    return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+
+
+def _limits(db, user_id, year_month, category_id=None):
+    """{category_id: (nombre, limite)}: la fila del mes pisa a la de todos los meses ('')."""
+    sql = """
+        SELECT b.category_id, c.name, b.amount_minor
+        FROM budgets b
+        JOIN categories c ON c.id = b.category_id
+        WHERE b.user_id = ? AND b.year_month IN (?, '')
+    """
+    params = [user_id, year_month]
+    if category_id is not None:
+        sql += " AND b.category_id = ?"
+        params.append(category_id)
+    # '' ordena primero: la del mes queda ultima y pisa en el dict
+    rows = db.execute(sql + " ORDER BY b.year_month", params).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def _spent(db, user_id, year_month, category_ids):
+    """Gasto del mes por categoria desde monthly_rollups (una busqueda por PK cada una)."""
+    if not category_ids:
+        return {}
+    placeholders = ", ".join("?" * len(category_ids))
+    rows = db.execute(
+        f"""
+        SELECT category_id, total
+        FROM monthly_rollups
+        WHERE user_id = ? AND year_month = ? AND type = 'expense'
+          AND category_id IN ({placeholders})
+        """,
+        [user_id, year_month, *category_ids],
+    ).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+
+def status(db, user_id, year_month, category_id=None):
+    """Estado de los presupuestos del mes, ordenado por nombre de categoria.
+
+    Cada fila: category_id, category, limit, spent, remaining y over_budget
+    (montos en unidades minimas). Lo gastado suma los rollups y las
+    ocurrencias de reglas recurrentes del mes, que no pasan por transactions.
+    """
+    limits = _limits(db, user_id, year_month, category_id)
+    if not limits:
+        return []
+
+    spent = _spent(db, user_id, year_month, list(limits))
+    start, end = month_bounds(year_month)
+    schedule = recurring.load(db, user_id, start, end)
+    if schedule:
+        for row in schedule.aggregate(start, end, "category"):
+            if row["key"] in limits:
+                spent[row["key"]] = spent.get(row["key"], 0) + row["expense"]
+
+    result = []
+    for cat_id, (name, limit) in sorted(limits.items(), key=lambda item: item[1][0]):
+        used = spent.get(cat_id, 0)
+        result.append({
+            "category_id": cat_id,
+            "category": name,
+            "limit": limit,
+            "spent": used,
+            "remaining": limit - used,
+            "over_budget": used > limit,
+        })
+    return result
+
+
+def set_budget(db, user_id, category_id, amount_minor, year_month=""):
+    if amount_minor <= 0:
+        raise BudgetError("El presupuesto debe ser mayor a cero")
+    with db:
+        db.execute(
+            """
+            INSERT INTO budgets (user_id, category_id, year_month, amount_minor)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, category_id, year_month)
+            DO UPDATE SET amount_minor = excluded.amount_minor
+            """,
+            (user_id, category_id, year_month, amount_minor),
+        )
+
+
+def delete_budget(db, user_id, category_id, year_month=""):
+    """Borra el presupuesto; False si no existia."""
+    with db:
+        cursor = db.execute(
+            "DELETE FROM budgets WHERE user_id = ? AND category_id = ? AND year_month = ?",
+            (user_id, category_id, year_month),
+        )
+    return cursor.rowcount > 0
+
+
+# ------------------------------------------------------------------
+# Reconciliacion
+# ------------------------------------------------------------------
+def reconcile(conn, user_id=None, dry_run=False):
+    """Recalcula los contadores de gasto (monthly_rollups) si no coinciden.
+
+    Devuelve las diferencias encontradas; con dry_run solo las informa.
+    """
+    diffs = rollups.verify(conn, user_id)
+    if diffs and not dry_run:
+        rollups.rebuild(conn, user_id)
+    return diffs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de presupuestos.")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument("--shards", type=int, default=1, help="DB_SHARDS de la app")
+    parser.add_argument("--user-id", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="solo informar las diferencias")
+    args = parser.parse_args()
+
+    diffs = []
+    for path in shard_paths(args.database, args.shards):
+        conn = sqlite3.connect(path)
+        diffs.extend(reconcile(conn, args.user_id, args.dry_run))
+        conn.close()
+
+    for d in diffs:
+        print("Diferencia:", d)
+    if not diffs:
+        print("Contadores OK")
+    elif args.dry_run:
+        print(f"{len(diffs)} diferencias")
+        raise SystemExit(1)
+    else:
+        print(f"{len(diffs)} diferencias corregidas")
@@ -0,0 +1,242 @@
+import csv
+import io
+import json
+import re
+
+import msgspec
+
+import category_cache
+import money
+import schemas
+from transactions import InvalidTransaction, validate_input
+
+BATCH_SIZE = 5000
+MAX_ROWS = 100_000
+MAX_REPORTED_ERRORS = 1000
+READ_CHUNK = 64 * 1024
+
+# limite de parametros por sentencia en SQLite viejos
+_IN_CHUNK = 500
+
+CSV_FIELDS = ("amount", "type", "category", "description", "date")
+
+_WS = re.compile(r"[ \t\n\r]*")
+
+
+class BulkError(ValueError):
+    """El cuerpo no se puede leer en el formato indicado (se responde 400)."""
+
+
+class TooManyRows(BulkError):
+    """Se supero BULK_MAX_ROWS (se responde 413)."""
+
+
+# ------------------------------------------------------------------
+# Lectura incremental del cuerpo
+# ------------------------------------------------------------------
+def iter_json_array(stream):
+    """Itera los elementos de un array JSON leyendo el stream de a bloques."""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(READ_CHUNK)
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            pos = _WS.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return
+            fill()
+
+    fill()
+    skip_ws()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise BulkError("Se esperaba un array JSON")
+    pos += 1
+
+    first = True
+    while True:
+        skip_ws()
+        if pos >= len(buf):
+            raise BulkError("Array JSON incompleto")
+        if buf[pos] == "]":
+            return
+        if not first:
+            if buf[pos] != ",":
+                raise BulkError("JSON inválido: se esperaba ','")
+            pos += 1
+            skip_ws()
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # un numero/literal al final del buffer puede estar cortado
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise BulkError("JSON inválido")
+            fill()
+
+        pos = end
+        first = False
+        yield item
+
+
+def iter_ndjson(stream):
+    # cada linea se decodifica y valida directo a TransactionIn en _parse_row
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def iter_csv(stream):
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames or not {"amount", "type", "category"} <= set(reader.fieldnames):
+        raise BulkError(f"CSV sin encabezado valido, columnas: {', '.join(CSV_FIELDS)}")
+    for row in reader:
+        # celdas vacias = campo ausente (description/date opcionales)
+        yield {k: v for k, v in row.items() if k and v not in ("", None)}
+
+
+def iter_payload(raw_stream, mimetype):
+    text = io.TextIOWrapper(raw_stream, encoding="utf-8", newline="")
+    if mimetype in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+        return iter_ndjson(text)
+    if mimetype in ("text/csv", "application/csv"):
+        return iter_csv(text)
+    if mimetype == "application/json":
+        return iter_json_array(text)
+    raise BulkError(
+        "Content-Type no soportado, use application/json, application/x-ndjson o text/csv"
+    )
+
+
+_ndjson_decoder = msgspec.json.Decoder(schemas.TransactionIn, strict=False)
+
+
+def _parse_row(item, exponent):
+    try:
+        if isinstance(item, str):
+            tx = _ndjson_decoder.decode(item)
+        else:
+            tx = schemas.convert(item, schemas.TransactionIn)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise InvalidTransaction(f"Datos inválidos: {str(e)}")
+    return validate_input(tx, exponent)
+
+
+# ------------------------------------------------------------------
+# Escritura por lotes
+# ------------------------------------------------------------------
+def _resolve_categories(db, user_id, names, known):
+    """Completa `known` (nombre -> id) creando las categorias que falten."""
+    missing = [n for n in names if n not in known]
+    if not missing:
+        return 0
+
+    def lookup(batch):
+        placeholders = ",".join("?" * len(batch))
+        for row in db.execute(
+            f"SELECT id, name FROM categories WHERE user_id = ? AND name IN ({placeholders})",
+            [user_id, *batch],
+        ):
+            known[row["name"]] = row["id"]
+
+    for i in range(0, len(missing), _IN_CHUNK):
+        lookup(missing[i:i + _IN_CHUNK])
+
+    to_create = [n for n in missing if n not in known]
+    if not to_create:
+        return 0
+
+    db.executemany(
+        "INSERT OR IGNORE INTO categories (user_id, name) VALUES (?, ?)",
+        [(user_id, n) for n in to_create],
+    )
+    for i in range(0, len(to_create), _IN_CHUNK):
+        lookup(to_create[i:i + _IN_CHUNK])
+    return len(to_create)
+
+
+def _flush(db, user_id, batch, known):
+    created = _resolve_categories(db, user_id, {row[3] for row in batch}, known)
+    db.executemany(
+        """
+        INSERT INTO transactions (user_id, category_id, amount_minor, type, description, date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        [
+            (user_id, known[category], amount_minor, type_, description, date_str)
+            for amount_minor, type_, description, category, date_str in batch
+        ],
+    )
+    return created
+
+
+def import_rows(db, user_id, items, batch_size=BATCH_SIZE, max_rows=MAX_ROWS, atomic=False):
+    """Valida e inserta filas en una sola transaccion, con executemany por lote.
+
+    Las filas invalidas se reportan ({row, error}) y el resto se inserta;
+    con atomic=True cualquier error deshace toda la carga.
+    """
+    known = dict(category_cache.get_categories(db, user_id).by_name)
+    exponent = money.get_exponent(user_id)
+    batch = []
+    errors = []
+    error_count = 0
+    inserted = 0
+    created = 0
+    row_no = 0
+
+    try:
+        for row_no, item in enumerate(items, start=1):
+            if row_no > max_rows:
+                raise TooManyRows(f"Máximo {max_rows} filas por carga")
+            try:
+                batch.append(_parse_row(item, exponent))
+            except InvalidTransaction as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_no, "error": str(e)})
+                continue
+
+            if len(batch) >= batch_size:
+                created += _flush(db, user_id, batch, known)
+                inserted += len(batch)
+                batch = []
+
+        if batch:
+            created += _flush(db, user_id, batch, known)
+            inserted += len(batch)
+
+        if atomic and error_count:
+            db.rollback()
+            inserted = created = 0
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        if created:
+            category_cache.invalidate(user_id)
+
+    return {
+        "rows": row_no,
+        "inserted": inserted,
+        "categories_created": created,
+        "error_count": error_count,
+        "errors": errors,
+        "errors_truncated": error_count > len(errors),
+    }
@@ -0,0 +1,74 @@
+from time import time
+
+from cache import LRUCache
+
+MAX_USERS = 1024
+TTL = 60  # segundos; acota lo que puede durar un cambio hecho por otro proceso
+
+_cache = LRUCache(MAX_USERS)
+_ttl = TTL
+
+
+class UserCategories:
+    """Categorias de un usuario: nombre -> id, id -> nombre y lista ordenada."""
+
+    __slots__ = ("by_name", "by_id", "sorted")
+
+    def __init__(self, rows):
+        self.sorted = [{"id": r["id"], "name": r["name"]} for r in rows]
+        self.by_name = {c["name"]: c["id"] for c in self.sorted}
+        self.by_id = {c["id"]: c["name"] for c in self.sorted}
+
+
+def init_app(app):
+    global _ttl
+    _cache.maxsize = app.config.get("CATEGORY_CACHE_USERS", MAX_USERS)
+    _ttl = app.config.get("CATEGORY_CACHE_TTL", TTL)
+
+
+def get_categories(db, user_id):
+    cats = _cache.get(user_id)
+    if cats is None:
+        rows = db.execute(
+            "SELECT id, name FROM categories WHERE user_id = ? ORDER BY name",
+            (user_id,),
+        ).fetchall()
+        cats = UserCategories(rows)
+        _cache.set(user_id, cats, expires_at=time() + _ttl)
+    return cats
+
+
+def invalidate(user_id):
+    _cache.pop(user_id)
+
+
+def _reload(db, user_id):
+    invalidate(user_id)
+    return get_categories(db, user_id)
+
+
+def id_for_name(db, user_id, name):
+    """id de la categoria `name` o None.
+
+    Un miss recarga de la base antes de responder None, por si la categoria
+    la creo otro proceso despues de cachear.
+    """
+    category_id = get_categories(db, user_id).by_name.get(name)
+    if category_id is None:
+        category_id = _reload(db, user_id).by_name.get(name)
+    return category_id
+
+
+def owns(db, user_id, category_id):
+    """True si category_id (int o str del form) es una categoria del usuario."""
+    try:
+        category_id = int(category_id)
+    except (TypeError, ValueError):
+        return False
+    if category_id in get_categories(db, user_id).by_id:
+        return True
+    return category_id in _reload(db, user_id).by_id
+
+
+def stats():
+    return _cache.stats()
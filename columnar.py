@@ -0,0 +1,452 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache
+
+from flask import current_app
+
+from db import get_db
+from http_cache import data_version
+
+try:
+    import numpy as np
+except ImportError:  # dependencia opcional: solo hace falta con ANALYTICS_COLUMNAR
+    np = None
+
+DEFAULTS = {
+    "ANALYTICS_COLUMNAR": False,       # True: /api/analytics agrega sobre arrays en memoria
+    "ANALYTICS_COLUMNAR_MB": 64,       # memoria total de los arrays, entre todos los usuarios
+}
+
+_EPOCH = date(1970, 1, 1)
+
+
+class ColumnarUnavailable(RuntimeError):
+    """ANALYTICS_COLUMNAR activado sin numpy instalado."""
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULTS[key])
+
+
+def _day(value):
+    return (date.fromisoformat(value[:10]) - _EPOCH).days
+
+
+def _cumsum(values):
+    """Suma acumulada con un 0 adelante: la suma de [a, b) es cs[b] - cs[a]."""
+    out = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def _cs_insert(cs, pos, delta):
+    cs = np.insert(cs, pos + 1, cs[pos])
+    cs[pos + 1:] += delta
+    return cs
+
+
+def _cs_delete(cs, pos, delta):
+    cs = np.delete(cs, pos + 1)
+    cs[pos + 1:] -= delta
+    return cs
+
+
+class UserColumns:
+    """Transacciones de un usuario como columnas en memoria.
+
+    Las filas van ordenadas por (categoria, dia): category (codigo en
+    category_ids/labels), day (dias desde 1970), amount (unidades minimas)
+    e income (1 ingreso / 0 egreso), mas id para ubicar la fila al editar
+    o borrar. key = category << 32 | day es la clave de busqueda y
+    income_cs/expense_cs sus sumas acumuladas: el total de una categoria
+    en un rango de dias son dos searchsorted y una resta.
+
+    by_day es la misma fecha ordenada sola, con sus propias sumas
+    acumuladas (day_income_cs, day_expense_cs, day_income_n), para los
+    agrupamientos por periodo. Solo se consultan en limites de dia, asi
+    que una baja puede sacar cualquier fila de ese dia.
+
+    Es inmutable: una escritura arma otra UserColumns y reemplaza la
+    entrada, asi quien ya la tomo sigue leyendo arrays consistentes.
+    """
+
+    __slots__ = ("version", "id", "category", "day", "amount", "income", "key",
+                 "income_cs", "expense_cs", "by_day", "day_income_cs", "day_expense_cs",
+                 "day_income_n", "category_ids", "labels", "codes", "nbytes")
+
+    _ARRAYS = ("id", "category", "day", "amount", "income", "key", "income_cs",
+               "expense_cs", "by_day", "day_income_cs", "day_expense_cs", "day_income_n")
+
+    def __init__(self, version, category_ids, labels, **arrays):
+        self.version = version
+        for name in self._ARRAYS:
+            setattr(self, name, arrays[name])
+        self.category_ids = category_ids
+        self.labels = labels
+        self.codes = {cid: code for code, cid in enumerate(category_ids)}
+        self.nbytes = sum(arrays[name].nbytes for name in self._ARRAYS)
+
+    @classmethod
+    def build(cls, version, ids, category, days, amounts, income, category_ids, labels):
+        key = (category.astype(np.int64) << 32) + days
+        order = np.lexsort((ids, key))
+        by_day = np.argsort(days, kind="stable")
+        return cls(
+            version, category_ids, labels,
+            id=ids[order], category=category[order], day=days[order],
+            amount=amounts[order], income=income[order], key=key[order],
+            income_cs=_cumsum((amounts * income)[order]),
+            expense_cs=_cumsum((amounts * (1 - income))[order]),
+            by_day=days[by_day],
+            day_income_cs=_cumsum((amounts * income)[by_day]),
+            day_expense_cs=_cumsum((amounts * (1 - income))[by_day]),
+            day_income_n=_cumsum(income[by_day]),
+        )
+
+    @property
+    def first_day(self):
+        return int(self.by_day[0])
+
+    @property
+    def last_day(self):
+        return int(self.by_day[-1])
+
+    def __len__(self):
+        return len(self.id)
+
+    def without(self, transaction_id):
+        """Copia sin la transaccion; None si no estaba."""
+        found = np.flatnonzero(self.id == transaction_id)
+        if not len(found):
+            return None
+        pos = int(found[0])
+        amount, income = int(self.amount[pos]), int(self.income[pos])
+        day_pos = int(np.searchsorted(self.by_day, self.day[pos]))
+
+        arrays = {
+            name: np.delete(getattr(self, name), pos)
+            for name in ("id", "category", "day", "amount", "income", "key")
+        }
+        arrays["income_cs"] = _cs_delete(self.income_cs, pos, amount * income)
+        arrays["expense_cs"] = _cs_delete(self.expense_cs, pos, amount * (1 - income))
+        arrays["by_day"] = np.delete(self.by_day, day_pos)
+        arrays["day_income_cs"] = _cs_delete(self.day_income_cs, day_pos, amount * income)
+        arrays["day_expense_cs"] = _cs_delete(self.day_expense_cs, day_pos, amount * (1 - income))
+        arrays["day_income_n"] = _cs_delete(self.day_income_n, day_pos, income)
+        return UserColumns(self.version, self.category_ids, self.labels, **arrays)
+
+    def with_row(self, transaction_id, category_id, amount_minor, type_, date_str):
+        """Copia con la transaccion insertada en su lugar; None si la categoria no se conoce."""
+        code = self.codes.get(category_id)
+        if code is None:
+            return None
+        day = _day(date_str)
+        income = 1 if type_ == "income" else 0
+        key = (code << 32) + day
+        pos = int(np.searchsorted(self.key, key, side="right"))
+        day_pos = int(np.searchsorted(self.by_day, day, side="right"))
+
+        values = {"id": transaction_id, "category": code, "day": day,
+                  "amount": amount_minor, "income": income, "key": key}
+        arrays = {name: np.insert(getattr(self, name), pos, value) for name, value in values.items()}
+        arrays["income_cs"] = _cs_insert(self.income_cs, pos, amount_minor * income)
+        arrays["expense_cs"] = _cs_insert(self.expense_cs, pos, amount_minor * (1 - income))
+        arrays["by_day"] = np.insert(self.by_day, day_pos, day)
+        arrays["day_income_cs"] = _cs_insert(self.day_income_cs, day_pos, amount_minor * income)
+        arrays["day_expense_cs"] = _cs_insert(self.day_expense_cs, day_pos, amount_minor * (1 - income))
+        arrays["day_income_n"] = _cs_insert(self.day_income_n, day_pos, income)
+        return UserColumns(self.version, self.category_ids, self.labels, **arrays)
+
+
+def load(db, user_id):
+    """Lee todas las transacciones del usuario con la version de datos que les corresponde.
+
+    Version y filas salen de la misma transaccion de lectura: una
+    escritura que entre en el medio no puede quedar a medias en el cache.
+    """
+    db.execute("BEGIN")
+    try:
+        version = data_version(db, user_id)
+        categories = db.execute(
+            "SELECT id, name FROM categories WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        rows = db.execute(
+            """
+            SELECT id, category_id,
+                   CAST(julianday(substr(date, 1, 10)) - 2440587.5 AS INTEGER),
+                   amount_minor, type = 'income'
+            FROM transactions
+            WHERE user_id = ?
+            """,
+            (user_id,),
+        ).fetchall()
+    finally:
+        db.commit()
+
+    data = np.array([tuple(r) for r in rows], dtype=np.int64).reshape(-1, 5)
+    ids, category, days, amounts, income = data.T
+
+    category_ids = [r[0] for r in categories]
+    labels = [r[1] for r in categories]
+    # categorias borradas: cuentan en los totales con label None, como el LEFT JOIN
+    for category_id in np.setdiff1d(category, category_ids).tolist():
+        category_ids.append(category_id)
+        labels.append(None)
+    known = np.array(category_ids, dtype=np.int64)
+    order = np.argsort(known)
+    codes = order[np.searchsorted(known, category, sorter=order)]
+
+    return UserColumns.build(
+        version, ids, codes.astype(np.int32), days.astype(np.int32), amounts,
+        income.astype(np.int8), category_ids, labels,
+    )
+
+
+class ColumnarCache:
+    """Columnas por usuario con LRU acotado por bytes (no por cantidad de usuarios).
+
+    Una entrada vale mientras su version coincida con data_versions, que
+    los triggers incrementan con cualquier escritura: lo que escriba otro
+    proceso, una carga masiva o un movimiento de shard se detecta al leer
+    y se recarga. record()/forget() aplican en el lugar las altas, ediciones
+    y bajas de una fila de este proceso para no recargar todo el historial.
+    """
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.updates = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _put(self, user_id, columns, max_bytes):
+        old = self._data.pop(user_id, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        if columns.nbytes > max_bytes:
+            return
+        self._data[user_id] = columns
+        self._bytes += columns.nbytes
+        while self._bytes > max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, db, user_id, max_bytes):
+        version = data_version(db, user_id)
+        with self._lock:
+            columns = self._data.get(user_id)
+            if columns is not None and columns.version == version:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+                return columns
+
+        columns = load(db, user_id)
+        with self._lock:
+            self.loads += 1
+            current = self._data.get(user_id)
+            # no pisar una entrada mas nueva que armo otra request mientras tanto
+            if current is None or current.version <= columns.version:
+                self._put(user_id, columns, max_bytes)
+        return columns
+
+    def apply(self, user_id, change, max_bytes):
+        """Aplica `change(columns)` tras una escritura de una sola fila ya commiteada.
+
+        Solo si la escritura fue el unico cambio desde la version cacheada
+        (version + 1); si no, o si `change` devuelve None, se descarta la
+        entrada y la proxima lectura recarga.
+
+        La version se lee y los arrays nuevos se arman fuera del lock (esperar
+        una conexion y copiar los arrays no frena las lecturas de los demas
+        usuarios); bajo el lock solo se confirma que la entrada siga siendo
+        la misma y se reemplaza.
+        """
+        with self._lock:
+            columns = self._data.get(user_id)
+        if columns is None:
+            return
+        version = data_version(get_db(user_id), user_id)
+        updated = change(columns) if version == columns.version + 1 else None
+        if updated is not None:
+            updated.version = version
+
+        with self._lock:
+            current = self._data.get(user_id)
+            if current is None:
+                return
+            if current is not columns:
+                # otra request la reemplazo mientras tanto; si quedo vieja
+                # respecto de esta escritura, que la proxima lectura recargue
+                if current.version < version:
+                    self._bytes -= self._data.pop(user_id).nbytes
+                    self.invalidations += 1
+                return
+            if updated is None:
+                self._bytes -= self._data.pop(user_id).nbytes
+                self.invalidations += 1
+                return
+            self._put(user_id, updated, max_bytes)
+            self.updates += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.loads
+            return {
+                "users": len(self._data),
+                "rows": sum(len(c) for c in self._data.values()),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "updates": self.updates,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
+
+
+_cache = ColumnarCache()
+
+
+def init_app(app):
+    if app.config.get("ANALYTICS_COLUMNAR", DEFAULTS["ANALYTICS_COLUMNAR"]) and np is None:
+        raise ColumnarUnavailable(
+            "ANALYTICS_COLUMNAR requiere numpy (pip install -r requirements-analytics.txt)"
+        )
+
+
+def enabled():
+    return np is not None and bool(_config("ANALYTICS_COLUMNAR"))
+
+
+def _max_bytes():
+    return int(_config("ANALYTICS_COLUMNAR_MB") * 1024 * 1024)
+
+
+def record(user_id, transaction_id, category_id, amount_minor, type_, date_str):
+    """Alta o edicion de una transaccion ya commiteada."""
+    if not enabled():
+        return
+
+    def change(columns):
+        base = columns.without(transaction_id)
+        return (columns if base is None else base).with_row(transaction_id, int(category_id), amount_minor, type_, date_str)
+
+    _cache.apply(user_id, change, _max_bytes())
+
+
+def forget(user_id, transaction_id):
+    """Baja de una transaccion ya commiteada."""
+    if not enabled():
+        return
+    _cache.apply(user_id, lambda columns: columns.without(transaction_id), _max_bytes())
+
+
+def _boundaries(first, last, group_by):
+    """Dia en que empieza cada periodo de [first, last], mas last + 1 al final."""
+    if group_by == "month":
+        starts = np.arange(
+            np.datetime64(_EPOCH + timedelta(days=first), "M") + 1,
+            np.datetime64(_EPOCH + timedelta(days=last), "M") + 1,
+        ).astype("datetime64[D]").astype(np.int64)
+    elif group_by == "week":
+        # lunes de cada semana (1970-01-01 fue jueves)
+        monday = first - (first + 3) % 7
+        starts = np.arange(monday + 7, last + 1, 7, dtype=np.int64)
+    else:
+        starts = np.empty(0, dtype=np.int64)
+    return np.concatenate(([first], starts, [last + 1]))
+
+
+@lru_cache(maxsize=16384)
+def _period_label(day, group_by):
+    """'YYYY-MM' o el lunes 'YYYY-MM-DD' del periodo que contiene `day`."""
+    value = _EPOCH + timedelta(days=day)
+    if group_by == "month":
+        return value.strftime("%Y-%m")
+    return (value - timedelta(days=value.weekday())).isoformat()
+
+
+def _by_category(columns, first, last):
+    codes = np.arange(len(columns.category_ids), dtype=np.int64) << 32
+    a = np.searchsorted(columns.key, codes + first)
+    b = np.searchsorted(columns.key, codes + last + 1)
+    income = columns.income_cs[b] - columns.income_cs[a]
+    expense = columns.expense_cs[b] - columns.expense_cs[a]
+    income, expense, count = income.tolist(), expense.tolist(), (b - a).tolist()
+    return [
+        {
+            "key": columns.category_ids[code],
+            "label": columns.labels[code],
+            "income": income[code],
+            "expense": expense[code],
+            "count": count[code],
+        }
+        for code in sorted(
+            (code for code, n in enumerate(count) if n), key=columns.category_ids.__getitem__
+        )
+    ]
+
+
+def _by_period(columns, first, last, group_by):
+    bounds = _boundaries(first, last, group_by)
+    idx = np.searchsorted(columns.by_day, bounds)
+    a, b = idx[:-1], idx[1:]
+    income = columns.day_income_cs[b] - columns.day_income_cs[a]
+    expense = columns.day_expense_cs[b] - columns.day_expense_cs[a]
+
+    if group_by == "type":
+        count = int(b[0] - a[0])
+        n_income = int(columns.day_income_n[b[0]] - columns.day_income_n[a[0]])
+        rows = []
+        if count - n_income:
+            rows.append({"key": "expense", "label": "expense",
+                         "income": 0, "expense": int(expense[0]), "count": count - n_income})
+        if n_income:
+            rows.append({"key": "income", "label": "income",
+                         "income": int(income[0]), "expense": 0, "count": n_income})
+        return rows
+
+    count = b - a
+    nonempty = np.flatnonzero(count)
+    rows = []
+    for day, inc, exp, n in zip(bounds[nonempty].tolist(), income[nonempty].tolist(),
+                                expense[nonempty].tolist(), count[nonempty].tolist()):
+        label = _period_label(day, group_by)
+        rows.append({"key": label, "label": label, "income": inc, "expense": exp, "count": n})
+    return rows
+
+
+def aggregate(db, user_id, start, end, group_by="category"):
+    """Mismas filas que analytics.aggregate (key, label, income, expense, count).
+
+    El rango se recorta a los dias con datos; cada grupo sale de ubicar
+    sus limites con searchsorted y restar sumas acumuladas, asi que el
+    costo depende de la cantidad de grupos y no de transacciones.
+    """
+    columns = _cache.get(db, user_id, _max_bytes())
+    if not len(columns):
+        return []
+    first = max((start - _EPOCH).days, columns.first_day)
+    last = min((end - _EPOCH).days, columns.last_day)
+    if first > last:
+        return []
+    if group_by == "category":
+        return _by_category(columns, first, last)
+    return _by_period(columns, first, last, group_by)
+
+
+def stats():
+    result = _cache.stats()
+    result["enabled"] = enabled()
+    result["max_bytes"] = _max_bytes()
+    return result
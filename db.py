@@ -1,16 +1,271 @@
+import os
+import queue
 import sqlite3
-from flask import g
+import threading
+from urllib.request import pathname2url
+
+from flask import current_app, g
+
+import init_db
+import metrics
+import shards
 
 DATABASE = "cashflow.db"
 
-def get_db():
-    if "db" not in g:
-        conn = sqlite3.connect(DATABASE)
-        conn.row_factory = sqlite3.Row  
-        g.db = conn
-    return g.db
+# valores por defecto, se pueden pisar desde app.config
+DEFAULTS = {
+    "DATABASE": DATABASE,
+    "DB_POOL_SIZE": 4,             # conexiones de escritura
+    "DB_READ_POOL_SIZE": 8,        # conexiones solo lectura
+    "DB_POOL_TIMEOUT": 5.0,        # segundos esperando una conexion libre
+    "DB_BUSY_TIMEOUT": 5.0,        # segundos esperando el lock de SQLite
+    "DB_READ_SPLIT": True,         # False: get_read_db() usa la conexion de escritura
+    "DB_STATEMENT_CACHE": 256,
+    "DB_CACHE_SIZE_KB": 16384,
+    "DB_MMAP_SIZE": 256 * 1024 * 1024,
+    "DB_SYNCHRONOUS": "NORMAL",    # FULL: fsync en cada commit (ver WRITE_QUEUE)
+    "DB_SHARDS": 1,                # >1: datos de cada usuario en su shard (ver shards.py)
+    "DB_AUTO_MIGRATE": True,       # aplicar migrations/ al abrir cada archivo (init_db.upgrade)
+}
+
+
+class PoolTimeout(RuntimeError):
+    """No hubo una conexion libre en DB_POOL_TIMEOUT segundos."""
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULTS[key])
+
+
+class ConnectionPool:
+    """Pool de conexiones SQLite reutilizables, con PRAGMAs aplicados al abrir.
+
+    Las conexiones se crean a demanda hasta `size`; despues se espera a que
+    otra request devuelva una. Con readonly=True se abren con mode=ro y
+    query_only, asi las consultas pesadas nunca toman el lock de escritura.
+    Con METRICS_ENABLED `factory` es metrics.InstrumentedConnection.
+    """
+
+    def __init__(self, database, size, readonly=False, timeout=5.0,
+                 busy_timeout=5.0, statement_cache=256, cache_size_kb=16384,
+                 mmap_size=0, synchronous="NORMAL", factory=sqlite3.Connection):
+        self.database = database
+        self.size = size
+        self.readonly = readonly
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self.statement_cache = statement_cache
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.synchronous = synchronous
+        self.factory = factory
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._timeouts = 0
+
+    def _connect(self):
+        if self.readonly:
+            uri = f"file:{pathname2url(os.path.abspath(self.database))}?mode=ro"
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                cached_statements=self.statement_cache,
+                factory=self.factory,
+            )
+        else:
+            conn = sqlite3.connect(
+                self.database,
+                timeout=self.busy_timeout,
+                check_same_thread=False,
+                cached_statements=self.statement_cache,
+                factory=self.factory,
+            )
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if self.readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+
+        if conn is None:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._waits += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Sin conexiones libres en el pool ({self.database})"
+                    )
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def release(self, conn):
+        # nada de transacciones abiertas entre requests
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Cierra una conexion rota en lugar de devolverla al pool."""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "database": self.database,
+                "readonly": self.readonly,
+                "size": self.size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": self._idle.qsize(),
+                "acquired": self._acquired,
+                "reused": self._acquired - self._created,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+            }
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+_pools = {}
+_pools_lock = threading.RLock()
+
+
+def get_pool(readonly=False, database=None):
+    database = database or _config("DATABASE")
+    key = (database, readonly)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if readonly:
+                # mode=ro no puede activar WAL; lo deja activado el pool de escritura
+                get_pool(readonly=False, database=database)
+            elif _config("DB_AUTO_MIGRATE"):
+                # una base vieja (o un shard nuevo) queda al dia antes de la primera consulta
+                init_db.upgrade(database)
+            pool = ConnectionPool(
+                database,
+                _config("DB_READ_POOL_SIZE" if readonly else "DB_POOL_SIZE"),
+                readonly=readonly,
+                timeout=_config("DB_POOL_TIMEOUT"),
+                busy_timeout=_config("DB_BUSY_TIMEOUT"),
+                statement_cache=_config("DB_STATEMENT_CACHE"),
+                cache_size_kb=_config("DB_CACHE_SIZE_KB"),
+                mmap_size=_config("DB_MMAP_SIZE"),
+                synchronous=_config("DB_SYNCHRONOUS"),
+                factory=metrics.connection_factory(),
+            )
+            if not readonly:
+                pool.release(pool.acquire())
+            _pools[key] = pool
+    return pool
+
+
+def _connection(database, readonly):
+    """Una conexion por (base, modo) y por request; close_db las devuelve todas."""
+    conns = g.setdefault("db_conns", {})
+    key = (database, readonly)
+    if key not in conns:
+        conns[key] = get_pool(readonly, database).acquire()
+    return conns[key]
+
+
+def shard_count():
+    return _config("DB_SHARDS")
+
+
+def user_database(user_id=None):
+    """Archivo con los datos de `user_id`; sin usuario (o sin sharding), la base principal."""
+    database = _config("DATABASE")
+    if user_id is None or shard_count() <= 1:
+        return database
+    shard = shards.shard_for(user_id, lambda: _connection(database, _config("DB_READ_SPLIT")))
+    return shards.shard_path(database, shard)
+
+
+def get_db(user_id=None):
+    """Conexion de escritura. Con user_id va al shard del usuario; sin user_id,
+    a la base principal (users, shard_map)."""
+    return _connection(user_database(user_id), False)
+
+
+def get_read_db(user_id=None):
+    """Conexion solo lectura para rutas que no escriben (resumenes, analytics)."""
+    if not _config("DB_READ_SPLIT"):
+        return get_db(user_id)
+    return _connection(user_database(user_id), True)
+
+
+def get_read_pool(user_id=None):
+    """Pool detras de get_read_db(), para trabajo fuera del contexto de la request."""
+    return get_pool(_config("DB_READ_SPLIT"), user_database(user_id))
+
 
 def close_db(e=None):
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+    for (database, readonly), conn in g.pop("db_conns", {}).items():
+        pool = get_pool(readonly, database)
+        try:
+            pool.release(conn)
+        except sqlite3.Error:
+            pool.discard(conn)
+
+
+def pool_stats():
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def pool_timeout_handler(e):
+    return "Base de datos ocupada, intente de nuevo", 503
@@ -0,0 +1,203 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import current_app, jsonify, request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from db import get_db
+
+DEFAULTS = {
+    "PASSWORD_HASH_METHOD": "scrypt:32768:8:1",
+    "PASSWORD_SALT_LENGTH": 16,
+    "HASH_WORKERS": 2,        # 0 = calcular en el thread de la request
+    "HASH_QUEUE_SIZE": 16,    # pedidos esperando ademas de los que corren
+    "HASH_TIMEOUT": 10.0,     # segundos maximos esperando un resultado
+}
+
+
+class HashPoolBusy(RuntimeError):
+    """No hay lugar en la cola de hashing (se responde 503)."""
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULTS[key])
+
+
+class HashPool:
+    """Pool de procesos para el KDF de passwords con cola acotada.
+
+    Las requests que no consiguen lugar fallan enseguida con HashPoolBusy
+    en vez de encolarse detras de una tormenta de logins.
+    """
+
+    def __init__(self, workers, queue_size, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._broken = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: hacer fork desde un servidor con threads no es seguro
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        """Descarta un executor roto (murio un worker); el proximo run crea otro."""
+        with self._lock:
+            self._broken += 1
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashPoolBusy("Demasiados logins simultáneos, intente de nuevo")
+
+        with self._lock:
+            self._submitted += 1
+
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self._discard(executor)
+            raise HashPoolBusy("El pool de hashing se reinicia, intente de nuevo")
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise HashPoolBusy("Timeout calculando el hash, intente de nuevo")
+        except BrokenProcessPool:
+            self._discard(executor)
+            raise HashPoolBusy("El pool de hashing se reinicia, intente de nuevo")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts,
+                "broken": self._broken,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashPool(
+                    _config("HASH_WORKERS"),
+                    _config("HASH_QUEUE_SIZE"),
+                    _config("HASH_TIMEOUT"),
+                )
+    return _pool
+
+
+def reset_pool():
+    """Descarta el pool actual; el proximo uso lo recrea con la config vigente."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def hash_password(password):
+    return get_pool().run(
+        generate_password_hash,
+        password,
+        _config("PASSWORD_HASH_METHOD"),
+        _config("PASSWORD_SALT_LENGTH"),
+    )
+
+
+def check_password(stored_hash, password):
+    return get_pool().run(check_password_hash, stored_hash, password)
+
+
+@lru_cache(maxsize=8)
+def _effective_method(method):
+    # werkzeug completa los parametros por defecto ("pbkdf2:sha256" ->
+    # "pbkdf2:sha256:1000000"); se calcula una vez con un hash barato de salt corto
+    return generate_password_hash("", method, salt_length=1).split("$", 1)[0]
+
+
+def needs_rehash(stored_hash):
+    """True si el hash guardado usa otro metodo/costo que el configurado."""
+    return stored_hash.split("$", 1)[0] != _effective_method(_config("PASSWORD_HASH_METHOD"))
+
+
+def verify_and_upgrade(user_id, stored_hash, password):
+    """Chequea el password y, si los parametros del KDF cambiaron, lo re-hashea.
+
+    El re-hash es best effort: si el pool esta lleno el login sigue igual y
+    se reintenta en el proximo. La conexion de escritura se toma recien para
+    el UPDATE, despues del KDF, asi un pico de logins no agota DB_POOL_SIZE.
+    """
+    if not check_password(stored_hash, password):
+        return False
+
+    if needs_rehash(stored_hash):
+        try:
+            new_hash = hash_password(password)
+        except HashPoolBusy:
+            return True
+        db = get_db()
+        db.execute("UPDATE users SET hash = ? WHERE id = ?", (new_hash, user_id))
+        db.commit()
+    return True
+
+
+def pool_stats():
+    return _pool.stats() if _pool is not None else None
+
+
+def busy_handler(e):
+    if request.blueprint == "api":
+        response = jsonify({"error": str(e)})
+    else:
+        response = current_app.make_response(str(e))
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
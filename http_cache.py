@@ -0,0 +1,60 @@
+import hashlib
+from datetime import date
+
+from flask import Response, current_app, request
+
+from cache import LRUCache
+
+RESPONSE_CACHE_SIZE = 0  # 0 = solo ETag/304, sin guardar cuerpos
+
+_responses = LRUCache(RESPONSE_CACHE_SIZE)
+
+
+def init_app(app):
+    _responses.maxsize = app.config.get("RESPONSE_CACHE_SIZE", RESPONSE_CACHE_SIZE)
+
+
+def data_version(db, user_id):
+    row = db.execute(
+        "SELECT version FROM data_versions WHERE user_id = ?",
+        (user_id,),
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def compute_etag(user_id, version):
+    # la fecha entra en la clave porque los rangos relativos (month, year...)
+    # cambian de un dia a otro aunque los datos no cambien
+    key = f"{user_id}:{version}:{date.today().isoformat()}:{request.full_path}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def conditional(db, user_id, build):
+    """Responde 304 si el cliente ya tiene la version actual de los datos.
+
+    Solo consulta data_versions; `build` (la vista) corre unicamente si hay
+    que generar el cuerpo. Con RESPONSE_CACHE_SIZE > 0 los cuerpos 200 se
+    guardan por ETag y se reusan entre clientes.
+    """
+    etag = compute_etag(user_id, data_version(db, user_id))
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        cached = _responses.get(etag) if _responses.maxsize else None
+        if cached is not None:
+            body, mimetype = cached
+            response = Response(body, mimetype=mimetype)
+        else:
+            response = current_app.make_response(build())
+            if response.status_code == 200 and _responses.maxsize and not response.is_streamed:
+                _responses.set(etag, (response.get_data(), response.mimetype))
+
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def stats():
+    return _responses.stats()
@@ -1,14 +1,115 @@
+import argparse
+import os
 import sqlite3
 
+from shards import shard_paths
+
 DATABASE = "cashflow.db"
 
-def init_db():
-    conn = sqlite3.connect(DATABASE)
-    with open("schema.sql", "r", encoding="utf-8") as f:
-        conn.executescript(f.read())
-    conn.commit()
-    conn.close()
-    print("DB inicializada en", DATABASE)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_PATH = os.path.join(BASE_DIR, "schema.sql")
+MIGRATIONS_DIR = os.path.join(BASE_DIR, "migrations")
+
+
+def _list_migrations():
+    """Devuelve [(version, path)] ordenado, a partir de migrations/NNNN_nombre.sql."""
+    migrations = []
+    for name in os.listdir(MIGRATIONS_DIR):
+        if not name.endswith(".sql"):
+            continue
+        version = int(name.split("_", 1)[0])
+        migrations.append((version, os.path.join(MIGRATIONS_DIR, name)))
+    return sorted(migrations)
+
+
+def _is_empty(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'"
+    ).fetchone()
+    return row is None
+
+
+def migrate(conn):
+    """Aplica en orden las migraciones pendientes segun PRAGMA user_version.
+
+    Cada migracion corre en su propia transaccion junto con el bump de
+    user_version, asi que una falla deja la base en la version anterior.
+    Si otro proceso la aplico primero (la app migra al abrir la base), la
+    falla se ignora y se sigue con la siguiente.
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for version, path in _list_migrations():
+        if version <= current:
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            sql = f.read()
+        try:
+            conn.executescript(
+                f"BEGIN;\n{sql}\nPRAGMA user_version = {version};\nCOMMIT;"
+            )
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= version:
+                continue
+            raise
+        applied.append(os.path.basename(path))
+    if applied:
+        conn.execute("PRAGMA optimize")
+    return applied
+
+
+def upgrade(path):
+    """Crea el esquema base si el archivo esta vacio y aplica las migraciones pendientes.
+
+    Devuelve (creada, migraciones aplicadas, version final).
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        created = _is_empty(conn)
+        if created:
+            with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+                conn.executescript(f.read())
+            conn.commit()
+        applied = migrate(conn)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+    return created, applied, version
+
+
+def _init_file(path, reset):
+    if reset and os.path.exists(path):
+        os.remove(path)
+
+    created, applied, version = upgrade(path)
+    if created:
+        print("Esquema base creado en", path)
+    for name in applied:
+        print("Migracion aplicada:", name)
+    print(f"DB inicializada en {path} (version {version})")
+
+
+def init_db(database=DATABASE, reset=False, shards=1):
+    """Crea/migra la base principal y, con shards > 1, cada archivo de shard."""
+    for path in shard_paths(database, shards):
+        _init_file(path, reset)
+
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Crea o actualiza la base de datos.")
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="borra la base existente y la crea de cero",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="cantidad de shards por usuario (DB_SHARDS); 1 = una sola base",
+    )
+    args = parser.parse_args()
+    init_db(args.database, reset=args.reset, shards=args.shards)
@@ -0,0 +1,367 @@
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from time import perf_counter
+
+from flask import Response, before_render_template, current_app, g, has_request_context, request, template_rendered
+
+METRICS_ENABLED = False
+SLOW_QUERY_MS = 0          # 0 = sin log de consultas lentas
+MAX_FINGERPRINTS = 500     # las consultas distintas de mas se agrupan en "other"
+MAX_LABEL_LENGTH = 300
+
+# segundos, como los buckets por defecto de los clientes de Prometheus
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_enabled = METRICS_ENABLED
+_slow_ms = SLOW_QUERY_MS
+
+slow_log = logging.getLogger("cashflow.slow_query")
+
+
+# ------------------------------------------------------------------
+# Histogramas
+# ------------------------------------------------------------------
+class Histogram:
+    """Histograma acumulativo por conjunto de labels, en el formato de Prometheus."""
+
+    def __init__(self, name, help_text, labels, buckets=BUCKETS, max_series=None):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.max_series = max_series
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, seconds):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                if self.max_series and len(self._series) >= self.max_series:
+                    label_values = ("other",) * len(self.labels)
+                    series = self._series.get(label_values)
+                if series is None:
+                    series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [(labels, list(counts), total, n) for labels, (counts, total, n) in self._series.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, counts, total, n in self.snapshot():
+            labels = ",".join(
+                f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {n}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {n}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+query_seconds = Histogram(
+    "cashflow_sql_query_seconds",
+    "Duracion de cada sentencia SQL (ejecucion y lectura de filas), por fingerprint.",
+    ("query",),
+    max_series=MAX_FINGERPRINTS,
+)
+request_seconds = Histogram(
+    "cashflow_http_request_seconds",
+    "Duracion de cada request, por ruta.",
+    ("method", "route", "status"),
+)
+request_db_seconds = Histogram(
+    "cashflow_http_request_db_seconds",
+    "Tiempo en SQLite de cada request, por ruta.",
+    ("method", "route"),
+)
+
+_slow_count = 0
+_slow_lock = threading.Lock()
+
+
+# ------------------------------------------------------------------
+# Fingerprints
+# ------------------------------------------------------------------
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql):
+    """SQL normalizado: literales -> ?, listas de placeholders -> (...), espacios colapsados.
+
+    Las consultas que solo difieren en valores (o en el largo de un IN)
+    cuentan como la misma.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _SPACE.sub(" ", sql).strip().rstrip(";")
+    sql = _PLACEHOLDER_LIST.sub("(...)", sql)
+    return sql[:MAX_LABEL_LENGTH]
+
+
+def observe_query(fp, seconds):
+    query_seconds.observe((fp,), seconds)
+
+    # desde los threads de analytics/write_queue no hay request a la cual sumar
+    if has_request_context():
+        current = g.get("metrics")
+        if current is not None:
+            current.db += seconds
+            current.queries += 1
+
+    if _slow_ms and seconds * 1000 >= _slow_ms:
+        global _slow_count
+        with _slow_lock:
+            _slow_count += 1
+        route = request.path if has_request_context() else "-"
+        slow_log.warning("consulta lenta %.1f ms [%s] %s", seconds * 1000, route, fp)
+
+
+# ------------------------------------------------------------------
+# Conexiones instrumentadas
+# ------------------------------------------------------------------
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor que mide cada sentencia desde execute() hasta leer la ultima fila.
+
+    set_trace_callback solo avisa cuando empieza una sentencia, asi que la
+    duracion se toma aca; la sentencia se da por terminada al agotar las
+    filas, al cerrar el cursor o al ejecutar otra.
+    """
+
+    _fp = None
+    _elapsed = 0.0
+
+    def _finish(self):
+        if self._fp is not None:
+            observe_query(self._fp, self._elapsed)
+            self._fp = None
+
+    def _timed(self, method, *args):
+        start = perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._fp = fingerprint(sql)
+        self._elapsed = 0.0
+        self._timed(super().execute, sql, parameters)
+        if self.description is None:
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        self._fp = fingerprint(sql)
+        self._elapsed = 0.0
+        try:
+            self._timed(super().executemany, sql, seq_of_parameters)
+        finally:
+            self._finish()
+        return self
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Conexion cuyos cursores son InstrumentedCursor; tambien mide los COMMIT."""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = perf_counter()
+        try:
+            super().commit()
+        finally:
+            observe_query("COMMIT", perf_counter() - start)
+
+
+def connection_factory():
+    """Clase para sqlite3.connect(factory=...) segun METRICS_ENABLED."""
+    return InstrumentedConnection if _enabled else sqlite3.Connection
+
+
+# ------------------------------------------------------------------
+# Tiempos por request
+# ------------------------------------------------------------------
+class RequestMetrics:
+    __slots__ = ("start", "db", "queries", "render", "serialize", "_render_start")
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.render = 0.0
+        self.serialize = 0.0
+        self._render_start = None
+
+
+@contextmanager
+def timer(kind):
+    """Suma la duracion del bloque a `kind` ("render" o "serialize") de la request actual."""
+    current = g.get("metrics") if has_request_context() else None
+    if current is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        setattr(current, kind, getattr(current, kind) + perf_counter() - start)
+
+
+def _before_request():
+    g.metrics = RequestMetrics()
+
+
+def _before_render(sender, template, context, **extra):
+    current = g.get("metrics")
+    if current is not None:
+        current._render_start = perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    current = g.get("metrics")
+    if current is not None and current._render_start is not None:
+        current.render += perf_counter() - current._render_start
+        current._render_start = None
+
+
+def _after_request(response):
+    current = g.pop("metrics", None)
+    if current is None:
+        return response
+
+    total = perf_counter() - current.start
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request_seconds.observe((request.method, route, str(response.status_code)), total)
+    request_db_seconds.observe((request.method, route), current.db)
+
+    timing = [
+        f'db;dur={current.db * 1000:.1f};desc="{current.queries} consultas"',
+        f"render;dur={current.render * 1000:.1f}",
+        f"serialize;dur={current.serialize * 1000:.1f}",
+        f"app;dur={total * 1000:.1f}",
+    ]
+    existing = response.headers.get("Server-Timing")
+    if existing:
+        timing.append(existing)
+    response.headers["Server-Timing"] = ", ".join(timing)
+    return response
+
+
+def metrics_view():
+    # latencias por ruta y huellas de SQL: mismo resguardo que /api/stats
+    if not current_app.config.get("STATS_ENABLED"):
+        return Response("No encontrado\n", status=404, mimetype="text/plain")
+    lines = []
+    for histogram in (request_seconds, request_db_seconds, query_seconds):
+        lines.extend(histogram.render())
+    lines.append("# HELP cashflow_sql_slow_queries_total Sentencias por encima de SLOW_QUERY_MS.")
+    lines.append("# TYPE cashflow_sql_slow_queries_total counter")
+    lines.append(f"cashflow_sql_slow_queries_total {_slow_count}")
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    """Instala los hooks de medicion y /metrics si METRICS_ENABLED.
+
+    /metrics ademas responde 404 salvo con STATS_ENABLED, como /api/stats.
+
+    Se llama antes de abrir el primer pool: las conexiones se crean con
+    connection_factory().
+    """
+    global _enabled, _slow_ms
+    _enabled = app.config.get("METRICS_ENABLED", METRICS_ENABLED)
+    _slow_ms = app.config.get("SLOW_QUERY_MS", SLOW_QUERY_MS)
+    if not _enabled:
+        return
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+
+
+def stats(limit=20):
+    """Las `limit` sentencias con mas tiempo acumulado."""
+    top = sorted(query_seconds.snapshot(), key=lambda s: s[2], reverse=True)[:limit]
+    return {
+        "enabled": _enabled,
+        "slow_queries": _slow_count,
+        "top_queries": [
+            {
+                "query": labels[0],
+                "count": n,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total * 1000 / n, 3) if n else 0.0,
+            }
+            for labels, _, total, n in top
+        ],
+    }
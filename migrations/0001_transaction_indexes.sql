@@ -0,0 +1,8 @@
+-- Indices compuestos para los filtros por usuario + fecha.
+-- (user_id, date, id) sirve el listado mensual ordenado por fecha/id;
+-- (user_id, type, date, amount) cubre los SUM por tipo sin ir a la tabla.
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date
+    ON transactions (user_id, date, id);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_type_date
+    ON transactions (user_id, type, date, amount);
@@ -0,0 +1,68 @@
+-- Totales por usuario / mes / categoria / tipo, mantenidos por triggers
+-- en cada INSERT, UPDATE y DELETE sobre transactions.
+CREATE TABLE IF NOT EXISTS monthly_rollups (
+    user_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+    total REAL NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, year_month, category_id, type)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollups_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category_id, NEW.type, NEW.amount, 1)
+    ON CONFLICT (user_id, year_month, category_id, type)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollups_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_rollups
+    SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type;
+
+    DELETE FROM monthly_rollups
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type
+      AND count <= 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollups_update
+AFTER UPDATE OF user_id, category_id, amount, type, date ON transactions
+BEGIN
+    UPDATE monthly_rollups
+    SET total = total - OLD.amount, count = count - 1
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type;
+
+    DELETE FROM monthly_rollups
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type
+      AND count <= 0;
+
+    INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category_id, NEW.type, NEW.amount, 1)
+    ON CONFLICT (user_id, year_month, category_id, type)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+-- Carga inicial a partir de las transacciones existentes
+DELETE FROM monthly_rollups;
+INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count)
+SELECT user_id, substr(date, 1, 7), category_id, type, SUM(amount), COUNT(*)
+FROM transactions
+GROUP BY user_id, substr(date, 1, 7), category_id, type;
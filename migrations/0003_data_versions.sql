@@ -0,0 +1,51 @@
+-- Version de datos por usuario: se incrementa con cualquier escritura en
+-- transactions o categories. Los GET la usan como ETag sin leer transactions.
+CREATE TABLE IF NOT EXISTS data_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_version_tx_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_tx_update
+AFTER UPDATE ON transactions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_tx_delete
+AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_cat_insert
+AFTER INSERT ON categories
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_cat_update
+AFTER UPDATE ON categories
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_cat_delete
+AFTER DELETE ON categories
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+INSERT OR IGNORE INTO data_versions (user_id, version)
+SELECT id, 1 FROM users;
@@ -0,0 +1,142 @@
+-- Montos como INTEGER en la unidad minima de la moneda (centavos con el
+-- exponente 2 por defecto). Las sumas pasan a ser enteras y exactas.
+ALTER TABLE users ADD COLUMN currency_exponent INTEGER NOT NULL DEFAULT 2
+    CHECK (currency_exponent BETWEEN 0 AND 4);
+
+-- SQLite no cambia el tipo de una columna: se reconstruye la tabla
+-- conservando ids y el contador de AUTOINCREMENT.
+CREATE TABLE transactions_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    amount_minor INTEGER NOT NULL CHECK (typeof(amount_minor) = 'integer'),
+    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+    description TEXT,
+    date TEXT NOT NULL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+);
+
+-- todos los usuarios existentes quedan con exponente 2
+INSERT INTO transactions_new (id, user_id, category_id, amount_minor, type, description, date, created_at)
+SELECT id, user_id, category_id, CAST(round(amount * 100) AS INTEGER), type, description, date, created_at
+FROM transactions;
+
+-- Que el INSERT de arriba deje una fila de transactions_new en
+-- sqlite_sequence con la tabla vacia depende de la version de SQLite; sin
+-- ella los ids ya usados se volverian a asignar. Como sqlite_sequence no
+-- tiene clave, se agrega una con el mayor de los dos contadores y se borra
+-- la anterior.
+INSERT INTO sqlite_sequence (name, seq)
+SELECT 'transactions_new', max(seq)
+FROM sqlite_sequence
+WHERE name IN ('transactions', 'transactions_new')
+HAVING count(*) > 0;
+
+DELETE FROM sqlite_sequence
+WHERE name = 'transactions_new'
+  AND rowid < (SELECT max(rowid) FROM sqlite_sequence WHERE name = 'transactions_new');
+
+-- borra tambien los indices y triggers de la tabla vieja
+DROP TABLE transactions;
+ALTER TABLE transactions_new RENAME TO transactions;
+
+CREATE INDEX idx_transactions_user_date
+    ON transactions (user_id, date, id);
+
+CREATE INDEX idx_transactions_user_type_date
+    ON transactions (user_id, type, date, amount_minor);
+
+-- Rollups con totales enteros
+DROP TABLE monthly_rollups;
+
+CREATE TABLE monthly_rollups (
+    user_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,
+    category_id INTEGER NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+    total INTEGER NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, year_month, category_id, type)
+) WITHOUT ROWID;
+
+CREATE TRIGGER trg_rollups_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category_id, NEW.type, NEW.amount_minor, 1)
+    ON CONFLICT (user_id, year_month, category_id, type)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+CREATE TRIGGER trg_rollups_delete
+AFTER DELETE ON transactions
+BEGIN
+    UPDATE monthly_rollups
+    SET total = total - OLD.amount_minor, count = count - 1
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type;
+
+    DELETE FROM monthly_rollups
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type
+      AND count <= 0;
+END;
+
+CREATE TRIGGER trg_rollups_update
+AFTER UPDATE OF user_id, category_id, amount_minor, type, date ON transactions
+BEGIN
+    UPDATE monthly_rollups
+    SET total = total - OLD.amount_minor, count = count - 1
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type;
+
+    DELETE FROM monthly_rollups
+    WHERE user_id = OLD.user_id
+      AND year_month = substr(OLD.date, 1, 7)
+      AND category_id = OLD.category_id
+      AND type = OLD.type
+      AND count <= 0;
+
+    INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count)
+    VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category_id, NEW.type, NEW.amount_minor, 1)
+    ON CONFLICT (user_id, year_month, category_id, type)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+
+INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count)
+SELECT user_id, substr(date, 1, 7), category_id, type, SUM(amount_minor), COUNT(*)
+FROM transactions
+GROUP BY user_id, substr(date, 1, 7), category_id, type;
+
+-- Triggers de data_versions (0003), que se fueron con la tabla vieja
+CREATE TRIGGER trg_version_tx_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_version_tx_update
+AFTER UPDATE ON transactions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER trg_version_tx_delete
+AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+-- los totales ahora son exactos: invalida los ETag emitidos con los anteriores
+UPDATE data_versions SET version = version + 1;
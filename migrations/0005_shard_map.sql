@@ -0,0 +1,7 @@
+-- Directorio de shards (solo se usa en la base principal con DB_SHARDS > 1).
+-- Un usuario sin fila vive en el shard 0, que es la misma base principal:
+-- las bases creadas antes del sharding no necesitan backfill.
+CREATE TABLE IF NOT EXISTS shard_map (
+    user_id INTEGER PRIMARY KEY,
+    shard INTEGER NOT NULL
+);
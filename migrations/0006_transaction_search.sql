@@ -0,0 +1,55 @@
+-- Busqueda de texto sobre la descripcion y el nombre de categoria.
+-- rowid = transactions.id. `owner` guarda 'u<user_id>' como un token mas:
+-- la consulta agrega owner:u<id> y FTS5 cruza las listas de documentos,
+-- asi una palabra comun en otros usuarios no se recorre.
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    owner,
+    description,
+    category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- rank = bm25 sin peso para owner; la descripcion pesa mas que la categoria
+INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('rank', 'bm25(0.0, 2.0, 1.0)');
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_insert
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, owner, description, category)
+    VALUES (
+        NEW.id,
+        'u' || NEW.user_id,
+        NEW.description,
+        (SELECT name FROM categories WHERE id = NEW.category_id)
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+AFTER UPDATE OF user_id, category_id, description ON transactions
+BEGIN
+    UPDATE transactions_fts
+    SET owner = 'u' || NEW.user_id,
+        description = NEW.description,
+        category = (SELECT name FROM categories WHERE id = NEW.category_id)
+    WHERE rowid = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_delete
+AFTER DELETE ON transactions
+BEGIN
+    DELETE FROM transactions_fts WHERE rowid = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_category_rename
+AFTER UPDATE OF name ON categories
+BEGIN
+    UPDATE transactions_fts
+    SET category = NEW.name
+    WHERE rowid IN (SELECT id FROM transactions WHERE category_id = NEW.id);
+END;
+
+INSERT INTO transactions_fts (rowid, owner, description, category)
+SELECT t.id, 'u' || t.user_id, t.description, c.name
+FROM transactions t
+LEFT JOIN categories c ON c.id = t.category_id;
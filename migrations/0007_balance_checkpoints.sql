@@ -0,0 +1,43 @@
+-- Saldo acumulado al cierre de cada mes con movimientos (prefijo de
+-- monthly_rollups). Un cambio en los rollups de un mes borra el checkpoint
+-- de ese mes y de los siguientes; los anteriores siguen valiendo y
+-- balances.refresh() recalcula solo el tramo borrado.
+CREATE TABLE IF NOT EXISTS balance_checkpoints (
+    user_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL,
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (user_id, year_month)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_checkpoints_rollup_insert
+AFTER INSERT ON monthly_rollups
+BEGIN
+    DELETE FROM balance_checkpoints
+    WHERE user_id = NEW.user_id AND year_month >= NEW.year_month;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checkpoints_rollup_update
+AFTER UPDATE ON monthly_rollups
+BEGIN
+    DELETE FROM balance_checkpoints
+    WHERE user_id = OLD.user_id AND year_month >= min(OLD.year_month, NEW.year_month);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_checkpoints_rollup_delete
+AFTER DELETE ON monthly_rollups
+BEGIN
+    DELETE FROM balance_checkpoints
+    WHERE user_id = OLD.user_id AND year_month >= OLD.year_month;
+END;
+
+INSERT INTO balance_checkpoints (user_id, year_month, balance)
+SELECT user_id,
+       year_month,
+       SUM(net) OVER (PARTITION BY user_id ORDER BY year_month)
+FROM (
+    SELECT user_id,
+           year_month,
+           SUM(CASE WHEN type = 'income' THEN total ELSE -total END) AS net
+    FROM monthly_rollups
+    GROUP BY user_id, year_month
+);
@@ -0,0 +1,67 @@
+-- Reglas de movimientos recurrentes (alquiler, sueldo, suscripciones).
+-- Una fila por regla: las ocurrencias se calculan al consultar
+-- (recurring.py), solo para el rango pedido, y no pasan por transactions
+-- ni por monthly_rollups.
+CREATE TABLE IF NOT EXISTS recurring_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    amount_minor INTEGER NOT NULL,
+    type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+    description TEXT,
+    frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
+    interval INTEGER NOT NULL DEFAULT 1 CHECK (interval >= 1),
+    start_date TEXT NOT NULL,
+    end_date TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_recurring_rules_user
+    ON recurring_rules (user_id, start_date);
+
+-- Fechas de una regla que ya no se generan: la ocurrencia se materializo
+-- como transaccion al editarla, o se borro.
+CREATE TABLE IF NOT EXISTS recurring_exceptions (
+    user_id INTEGER NOT NULL,
+    rule_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (user_id, rule_id, date),
+    FOREIGN KEY (rule_id) REFERENCES recurring_rules(id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_recurring_rule_delete
+AFTER DELETE ON recurring_rules
+BEGIN
+    DELETE FROM recurring_exceptions WHERE user_id = OLD.user_id AND rule_id = OLD.id;
+END;
+
+-- las ocurrencias entran en los GET, asi que cambian el ETag igual que transactions
+CREATE TRIGGER IF NOT EXISTS trg_version_rule_insert
+AFTER INSERT ON recurring_rules
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_rule_update
+AFTER UPDATE ON recurring_rules
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_rule_delete
+AFTER DELETE ON recurring_rules
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_exception_insert
+AFTER INSERT ON recurring_exceptions
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
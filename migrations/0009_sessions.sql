@@ -0,0 +1,10 @@
+-- Sesiones web del backend 'sqlite' (sessions.py). Viven en la base
+-- principal, junto a users. expires_at en segundos epoch; el indice lo usa
+-- el barrido de vencidas.
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    expires_at INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at);
@@ -0,0 +1,40 @@
+-- Presupuesto de gasto por categoria y mes. year_month = '' vale para
+-- todos los meses; una fila con el mes concreto la reemplaza en ese mes.
+-- Lo gastado sale de monthly_rollups (que los triggers de transactions
+-- mantienen al dia en cada escritura), asi que evaluar un presupuesto es
+-- una busqueda por PK, sin SUM sobre transactions.
+CREATE TABLE IF NOT EXISTS budgets (
+    user_id INTEGER NOT NULL,
+    category_id INTEGER NOT NULL,
+    year_month TEXT NOT NULL DEFAULT '',
+    amount_minor INTEGER NOT NULL CHECK (amount_minor > 0),
+    PRIMARY KEY (user_id, category_id, year_month),
+    FOREIGN KEY (category_id) REFERENCES categories(id)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_budgets_category_delete
+AFTER DELETE ON categories
+BEGIN
+    DELETE FROM budgets WHERE user_id = OLD.user_id AND category_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_budget_insert
+AFTER INSERT ON budgets
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_budget_update
+AFTER UPDATE ON budgets
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_version_budget_delete
+AFTER DELETE ON budgets
+BEGIN
+    INSERT INTO data_versions (user_id, version) VALUES (OLD.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
@@ -0,0 +1,91 @@
+from decimal import Decimal, InvalidOperation
+from time import time
+
+from cache import LRUCache
+from db import get_read_db
+
+# los montos se guardan como enteros en la unidad minima de la moneda del
+# usuario: amount_minor = monto * 10 ** currency_exponent (2 = centavos)
+DEFAULT_EXPONENT = 2
+MAX_EXPONENT = 4
+# hasta 2**53 la conversion a float de las respuestas JSON es exacta
+MAX_MINOR = 2 ** 53 - 1
+
+EXPONENT_TTL = 300  # segundos
+
+_exponents = LRUCache(4096)
+
+
+class InvalidAmount(ValueError):
+    """Monto no positivo, no numerico o con mas decimales que la moneda."""
+
+
+def parse_amount(value, exponent=DEFAULT_EXPONENT):
+    """Convierte un monto ("12.50", Decimal, int) a entero en unidades minimas.
+
+    Es exacto: no pasa por float y rechaza decimales que la moneda no tiene
+    en vez de redondearlos.
+    """
+    if isinstance(value, bool) or value is None:
+        raise InvalidAmount("Monto inválido")
+    if isinstance(value, float):
+        # repr da el decimal mas corto que vuelve al mismo float ("0.1", no 0.1000000000000000055)
+        value = repr(value)
+    try:
+        amount = Decimal(value.strip() if isinstance(value, str) else value)
+    except (InvalidOperation, TypeError, ValueError):
+        raise InvalidAmount("Monto inválido")
+
+    if not amount.is_finite():
+        raise InvalidAmount("Monto inválido")
+    if amount <= 0:
+        raise InvalidAmount("El monto debe ser mayor a 0")
+
+    minor = amount.scaleb(exponent)
+    if minor > MAX_MINOR:
+        raise InvalidAmount("Monto demasiado grande")
+    if minor != minor.to_integral_value():
+        raise InvalidAmount(f"El monto admite como máximo {exponent} decimales")
+    return int(minor)
+
+
+def to_major(minor, exponent=DEFAULT_EXPONENT):
+    """Monto para respuestas JSON. La division entera->float es de redondeo
+    correcto, asi que 1234 / 100 se serializa como 12.34."""
+    return minor / 10 ** exponent if exponent else float(minor)
+
+
+def divisor(exponent=DEFAULT_EXPONENT):
+    """Parametro para convertir en SQL (amount_minor / ?) con el mismo resultado que to_major."""
+    return float(10 ** exponent)
+
+
+def format_amount(minor, exponent=DEFAULT_EXPONENT):
+    """Texto exacto con `exponent` decimales, p.ej. 123450 -> '1234.50'."""
+    minor = int(minor or 0)
+    sign = "-" if minor < 0 else ""
+    minor = abs(minor)
+    if not exponent:
+        return f"{sign}{minor}"
+    units, cents = divmod(minor, 10 ** exponent)
+    return f"{sign}{units}.{cents:0{exponent}d}"
+
+
+def get_exponent(user_id):
+    """Exponente de la moneda del usuario (users vive en la base principal)."""
+    exponent = _exponents.get(user_id)
+    if exponent is None:
+        row = get_read_db().execute(
+            "SELECT currency_exponent FROM users WHERE id = ?", (user_id,)
+        ).fetchone()
+        exponent = row[0] if row is not None else DEFAULT_EXPONENT
+        _exponents.set(user_id, exponent, expires_at=time() + EXPONENT_TTL)
+    return exponent
+
+
+def init_app(app):
+    app.add_template_filter(format_amount, "money")
+
+
+def stats():
+    return _exponents.stats()
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import perf_counter
+
+from flask import current_app, jsonify
+
+from db import get_read_pool
+
+DEFAULTS = {
+    "ANALYTICS_PARALLEL": False,   # True: /api/analytics reparte el rango en subconsultas
+    "ANALYTICS_WORKERS": 4,        # threads (y conexiones de lectura) por proceso
+    "ANALYTICS_PARTITIONS": 4,     # subrangos por consulta
+    "ANALYTICS_TIMEOUT": 10.0,     # segundos para el conjunto de subconsultas
+}
+
+
+class ParallelTimeout(RuntimeError):
+    """Las subconsultas no terminaron en ANALYTICS_TIMEOUT (se responde 504)."""
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULTS[key])
+
+
+class QueryResult:
+    __slots__ = ("name", "rows", "duration_ms")
+
+    def __init__(self, name, rows, duration_ms):
+        self.name = name
+        self.rows = rows
+        self.duration_ms = duration_ms
+
+
+class _Batch:
+    __slots__ = ("lock", "running", "aborted")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = {}
+        self.aborted = False
+
+
+class QueryRunner:
+    """Corre consultas de solo lectura en paralelo, una conexion del pool por thread.
+
+    sqlite3 libera el GIL mientras ejecuta, asi que N subconsultas sobre
+    conexiones distintas usan N nucleos. Las conexiones salen del pool de
+    lectura de siempre, de modo que DB_READ_POOL_SIZE sigue acotando el total.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._timeouts = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="analytics"
+                )
+            return self._executor
+
+    @staticmethod
+    def _run_one(pool, batch, name, sql, params):
+        conn = pool.acquire()
+        try:
+            with batch.lock:
+                if batch.aborted:
+                    raise ParallelTimeout("Consulta cancelada")
+                batch.running[name] = conn
+            started = perf_counter()
+            rows = conn.execute(sql, params).fetchall()
+            return QueryResult(name, rows, (perf_counter() - started) * 1000)
+        finally:
+            with batch.lock:
+                batch.running.pop(name, None)
+            pool.release(conn)
+
+    def _submit(self, pool, queries):
+        batch = _Batch()
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self._run_one, pool, batch, name, sql, params)
+            for name, sql, params in queries
+        ]
+        with self._lock:
+            self._batches += 1
+            self._queries += len(futures)
+        return futures, batch
+
+    def _abort(self, futures, batch):
+        for future in futures:
+            future.cancel()
+        # las que ya estan en SQLite se cortan con OperationalError('interrupted');
+        # bajo el lock, para no interrumpir una conexion ya devuelta al pool
+        with batch.lock:
+            batch.aborted = True
+            for conn in batch.running.values():
+                conn.interrupt()
+        with self._lock:
+            self._timeouts += 1
+
+    def run(self, pool, queries, timeout):
+        """queries: [(nombre, sql, params)]. Devuelve [QueryResult] en el mismo orden."""
+        futures, batch = self._submit(pool, queries)
+        _, pending = wait(futures, timeout=timeout)
+        if pending:
+            self._abort(futures, batch)
+            raise ParallelTimeout("La consulta tardó demasiado, intente con un rango menor")
+        return [f.result() for f in futures]
+
+    async def run_async(self, pool, queries, timeout):
+        """Igual que run() para handlers async: espera sin bloquear el event loop."""
+        futures, batch = self._submit(pool, queries)
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(asyncio.wrap_future(f) for f in futures)), timeout
+            )
+        except asyncio.TimeoutError:
+            self._abort(futures, batch)
+            raise ParallelTimeout("La consulta tardó demasiado, intente con un rango menor")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "batches": self._batches,
+                "queries": self._queries,
+                "timeouts": self._timeouts,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = QueryRunner(_config("ANALYTICS_WORKERS"))
+    return _runner
+
+
+def enabled():
+    return bool(_config("ANALYTICS_PARALLEL"))
+
+
+def partitions():
+    return _config("ANALYTICS_PARTITIONS")
+
+
+def run_queries(queries, user_id=None):
+    """Corre las consultas sobre el pool de lectura (del shard del usuario) con el timeout configurado."""
+    return get_runner().run(get_read_pool(user_id), queries, _config("ANALYTICS_TIMEOUT"))
+
+
+async def run_queries_async(queries, user_id=None):
+    return await get_runner().run_async(
+        get_read_pool(user_id), queries, _config("ANALYTICS_TIMEOUT")
+    )
+
+
+def server_timing(results, descriptions=None):
+    """Valor del header Server-Timing con la duracion de cada subconsulta."""
+    descriptions = descriptions or {}
+    entries = []
+    for r in results:
+        entry = f"{r.name};dur={r.duration_ms:.1f}"
+        if r.name in descriptions:
+            entry += f';desc="{descriptions[r.name]}"'
+        entries.append(entry)
+    return ", ".join(entries)
+
+
+def runner_stats():
+    return _runner.stats() if _runner is not None else None
+
+
+def timeout_handler(e):
+    return jsonify({"error": str(e)}), 504
@@ -0,0 +1,325 @@
+import heapq
+from calendar import monthrange
+from datetime import date, timedelta
+
+import money
+
+FREQUENCIES = ("daily", "weekly", "monthly", "yearly")
+
+_DAYS = {"daily": 1, "weekly": 7}
+_MONTHS = {"monthly": 1, "yearly": 12}
+
+_COLUMNS = """r.id, r.category_id, c.name AS category, r.amount_minor, r.type,
+               r.description, r.frequency, r.interval, r.start_date, r.end_date"""
+
+
+class RecurringError(ValueError):
+    """Regla u ocurrencia invalida (se responde 400)."""
+
+
+def _day(value):
+    return date.fromisoformat(value[:10])
+
+
+def _months_between(a, b):
+    return (b.year - a.year) * 12 + b.month - a.month
+
+
+def _nth(rule, n):
+    """Fecha de la ocurrencia n (0 = start_date), sin recorrer las anteriores.
+
+    Mensual y anual conservan el dia de start_date; en meses mas cortos
+    caen en el ultimo dia (31 -> 30/28, 29 de febrero -> 28).
+    """
+    first = _day(rule["start_date"])
+    freq = rule["frequency"]
+    if freq in _DAYS:
+        return first + timedelta(days=n * rule["interval"] * _DAYS[freq])
+    years, month = divmod(first.month - 1 + n * rule["interval"] * _MONTHS[freq], 12)
+    year = first.year + years
+    return date(year, month + 1, min(first.day, monthrange(year, month + 1)[1]))
+
+
+def _bounds(rule, start, end):
+    """(primera, ultima) ocurrencia dentro de [start, end], o None si no hay."""
+    first = _day(rule["start_date"])
+    start = max(start, first)
+    if rule["end_date"]:
+        end = min(end, _day(rule["end_date"]))
+    if start > end:
+        return None
+
+    freq = rule["frequency"]
+    if freq in _DAYS:
+        step = rule["interval"] * _DAYS[freq]
+        lo = -(-(start - first).days // step)
+        hi = (end - first).days // step
+    else:
+        step = rule["interval"] * _MONTHS[freq]
+        lo = -(-_months_between(first, start) // step)
+        if _nth(rule, lo) < start:
+            lo += 1
+        hi = _months_between(first, end) // step
+        if _nth(rule, hi) > end:
+            hi -= 1
+    return (lo, hi) if lo <= hi else None
+
+
+def occurrences(rule, start, end, reverse=False):
+    """Fechas de la regla en [start, end] (inclusive), generadas de a una."""
+    bounds = _bounds(rule, start, end)
+    if bounds is None:
+        return
+    lo, hi = bounds
+    for n in (range(hi, lo - 1, -1) if reverse else range(lo, hi + 1)):
+        yield _nth(rule, n)
+
+
+def is_occurrence(rule, day):
+    return _bounds(rule, day, day) is not None
+
+
+def _row_date(row):
+    return row["date"]
+
+
+def merge(rows, projected, reverse=False):
+    """Une filas reales y ocurrencias, ambas ya ordenadas por fecha.
+
+    A igual fecha van primero las reales (heapq.merge es estable).
+    """
+    return heapq.merge(rows, projected, key=_row_date, reverse=reverse)
+
+
+class Schedule:
+    """Reglas de un usuario que tocan un rango, con sus fechas salteadas.
+
+    load() lee una fila por regla; las ocurrencias se generan recien al
+    recorrer expand() y los totales se cuentan sin generarlas.
+    """
+
+    def __init__(self, rules, skips):
+        self.rules = rules
+        self.skips = skips   # {rule_id: {'YYYY-MM-DD', ...}}
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def _rule_rows(self, rule, start, end, reverse):
+        skipped = self.skips.get(rule["id"], ())
+        for day in occurrences(rule, start, end, reverse):
+            iso = day.isoformat()
+            if iso in skipped:
+                continue
+            yield {
+                "id": None,
+                "rule_id": rule["id"],
+                "amount_minor": rule["amount_minor"],
+                "type": rule["type"],
+                "description": rule["description"],
+                "date": iso,
+                "category": rule["category"],
+                "category_id": rule["category_id"],
+            }
+
+    def expand(self, start, end, reverse=False):
+        """Ocurrencias de [start, end] como filas, ordenadas por fecha."""
+        return heapq.merge(
+            *(self._rule_rows(rule, start, end, reverse) for rule in self.rules),
+            key=_row_date,
+            reverse=reverse,
+        )
+
+    def _count(self, rule, start, end):
+        bounds = _bounds(rule, start, end)
+        if bounds is None:
+            return 0
+        # solo cuentan las que siguen siendo ocurrencias (la regla pudo cambiar)
+        skipped = sum(
+            1 for iso in self.skips.get(rule["id"], ())
+            if start <= _day(iso) <= end and is_occurrence(rule, _day(iso))
+        )
+        return bounds[1] - bounds[0] + 1 - skipped
+
+    def totals(self, start, end):
+        """(ingresos, egresos, cantidad) de las ocurrencias de [start, end]."""
+        income = expense = count = 0
+        for rule in self.rules:
+            n = self._count(rule, start, end)
+            if rule["type"] == "income":
+                income += n * rule["amount_minor"]
+            else:
+                expense += n * rule["amount_minor"]
+            count += n
+        return income, expense, count
+
+    def aggregate(self, start, end, group_by="category"):
+        """Filas con el formato de analytics.aggregate (key, label, income, expense, count).
+
+        Por categoria o tipo alcanza con contar; por mes, semana o dia se
+        recorren las ocurrencias del rango.
+        """
+        groups = {}
+
+        def add(key, label, type_, amount, n):
+            acc = groups.setdefault(
+                key, {"key": key, "label": label, "income": 0, "expense": 0, "count": 0}
+            )
+            acc[type_] += amount * n
+            acc["count"] += n
+
+        for rule in self.rules:
+            if group_by in ("category", "type"):
+                n = self._count(rule, start, end)
+                if not n:
+                    continue
+                if group_by == "category":
+                    add(rule["category_id"], rule["category"], rule["type"], rule["amount_minor"], n)
+                else:
+                    add(rule["type"], rule["type"], rule["type"], rule["amount_minor"], n)
+                continue
+
+            for row in self._rule_rows(rule, start, end, False):
+                day = _day(row["date"])
+                if group_by == "month":
+                    key = day.strftime("%Y-%m")
+                elif group_by == "day":
+                    key = row["date"]
+                else:
+                    key = (day - timedelta(days=day.weekday())).isoformat()
+                add(key, key, rule["type"], rule["amount_minor"], 1)
+
+        return [groups[k] for k in sorted(groups)]
+
+
+def load(db, user_id, start, end):
+    """Schedule con las reglas vigentes en [start, end].
+
+    Las reglas de categorias borradas dejan de generar ocurrencias, como
+    las transacciones de esas categorias desaparecen del listado.
+    """
+    rules = db.execute(
+        f"""
+        SELECT {_COLUMNS}
+        FROM recurring_rules r
+        JOIN categories c ON c.id = r.category_id
+        WHERE r.user_id = ?
+          AND r.start_date <= ?
+          AND (r.end_date IS NULL OR r.end_date >= ?)
+        ORDER BY r.id
+        """,
+        (user_id, end.isoformat(), start.isoformat()),
+    ).fetchall()
+    if not rules:
+        return Schedule([], {})
+
+    cursor = db.execute(
+        """
+        SELECT rule_id, date FROM recurring_exceptions
+        WHERE user_id = ? AND date >= ? AND date <= ?
+        """,
+        (user_id, start.isoformat(), end.isoformat()),
+    )
+    skips = {}
+    for rule_id, day in cursor:
+        skips.setdefault(rule_id, set()).add(day)
+    return Schedule(rules, skips)
+
+
+def get_rule(db, user_id, rule_id):
+    return db.execute(
+        f"""
+        SELECT {_COLUMNS}
+        FROM recurring_rules r
+        LEFT JOIN categories c ON c.id = r.category_id
+        WHERE r.id = ? AND r.user_id = ?
+        """,
+        (rule_id, user_id),
+    ).fetchone()
+
+
+def list_rules(db, user_id):
+    return db.execute(
+        f"""
+        SELECT {_COLUMNS}
+        FROM recurring_rules r
+        LEFT JOIN categories c ON c.id = r.category_id
+        WHERE r.user_id = ?
+        ORDER BY r.start_date, r.id
+        """,
+        (user_id,),
+    ).fetchall()
+
+
+def validate_rule(rule, exponent=money.DEFAULT_EXPONENT):
+    """Completa un schemas.RecurringRuleIn ya decodificado.
+
+    Devuelve (amount_minor, type, description, category_name, frequency,
+    interval, start_str, end_str | None).
+    """
+    try:
+        amount_minor = money.parse_amount(rule.amount, exponent)
+    except money.InvalidAmount as e:
+        raise RecurringError(str(e))
+
+    category_name = rule.category.strip()
+    if not category_name:
+        raise RecurringError("Categoría requerida")
+    if rule.interval < 1:
+        raise RecurringError("'interval' debe ser mayor o igual a 1")
+    if rule.end_date is not None and rule.end_date < rule.start_date:
+        raise RecurringError("'end_date' debe ser posterior o igual a 'start_date'")
+
+    return (
+        amount_minor,
+        rule.type,
+        rule.description or "",
+        category_name,
+        rule.frequency,
+        rule.interval,
+        rule.start_date.isoformat(),
+        rule.end_date.isoformat() if rule.end_date else None,
+    )
+
+
+def parse_occurrence(rule, value):
+    """Fecha 'YYYY-MM-DD' de una ocurrencia de `rule`; RecurringError si no lo es."""
+    try:
+        day = date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RecurringError("Fecha inválida, use YYYY-MM-DD")
+    if not is_occurrence(rule, day):
+        raise RecurringError("La regla no tiene una ocurrencia en esa fecha")
+    return day
+
+
+def skip(db, user_id, rule_id, day):
+    """Deja de generar la ocurrencia `day`. False si ya estaba salteada."""
+    with db:
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO recurring_exceptions (user_id, rule_id, date) VALUES (?, ?, ?)",
+            (user_id, rule_id, day.isoformat()),
+        )
+    return cursor.rowcount == 1
+
+
+def materialize(db, user_id, rule_id, day, category_id, amount_minor, type_, description, date_str):
+    """Convierte la ocurrencia `day` en una transaccion real con los datos editados.
+
+    La excepcion y el INSERT van en la misma transaccion: la ocurrencia
+    nunca se cuenta dos veces ni se pierde. Devuelve el id de la transaccion.
+    """
+    with db:
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO recurring_exceptions (user_id, rule_id, date) VALUES (?, ?, ?)",
+            (user_id, rule_id, day.isoformat()),
+        )
+        if cursor.rowcount != 1:
+            raise RecurringError("La ocurrencia ya fue editada o eliminada")
+        return db.execute(
+            """
+            INSERT INTO transactions (user_id, category_id, amount_minor, type, description, date)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (user_id, category_id, amount_minor, type_, description, date_str),
+        ).lastrowid
@@ -0,0 +1,192 @@
+import argparse
+import sqlite3
+from datetime import date, timedelta
+
+from shards import shard_paths
+
+DATABASE = "cashflow.db"
+
+_RECOMPUTE_SQL = """
+    SELECT user_id,
+           substr(date, 1, 7) AS year_month,
+           category_id,
+           type,
+           SUM(amount_minor) AS total,
+           COUNT(*) AS count
+    FROM transactions
+    {where}
+    GROUP BY user_id, substr(date, 1, 7), category_id, type
+"""
+
+
+def _month_start(d):
+    return d.replace(day=1)
+
+
+def _next_month_start(d):
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def split_range(start, end):
+    """Divide el rango [start, end] (fechas inclusive) en meses completos y bordes.
+
+    Devuelve ((primer_mes, ultimo_mes) | None, [(inicio, fin), ...]). Los meses
+    completos se leen de monthly_rollups y los bordes de transactions.
+    """
+    if start > end:
+        return None, []
+
+    first_full = start if start.day == 1 else _next_month_start(start)
+    last_full_end = _next_month_start(end) - timedelta(days=1)
+    if last_full_end != end:
+        last_full_end = _month_start(end) - timedelta(days=1)
+
+    if first_full > last_full_end:
+        return None, [(start, end)]
+
+    edges = []
+    if start < first_full:
+        edges.append((start, first_full - timedelta(days=1)))
+    if last_full_end < end:
+        edges.append((last_full_end + timedelta(days=1), end))
+
+    months = (first_full.strftime("%Y-%m"), last_full_end.strftime("%Y-%m"))
+    return months, edges
+
+
+def range_source(user_id, start, end, category_id=None):
+    """SQL (year_month, category_id, type, total, count) que combina rollups y bordes del rango."""
+    months, edges = split_range(start, end)
+    parts = []
+    params = []
+    category_filter = " AND category_id = ?" if category_id is not None else ""
+
+    if months:
+        parts.append(
+            """
+            SELECT year_month, category_id, type, total, count
+            FROM monthly_rollups
+            WHERE user_id = ? AND year_month BETWEEN ? AND ?
+            """
+            + category_filter
+        )
+        params.extend([user_id, months[0], months[1]])
+        if category_id is not None:
+            params.append(category_id)
+
+    for edge_start, edge_end in edges:
+        parts.append(
+            """
+            SELECT substr(date, 1, 7) AS year_month, category_id, type,
+                   amount_minor AS total, 1 AS count
+            FROM transactions
+            WHERE user_id = ? AND date BETWEEN ? AND ?
+            """
+            + category_filter
+        )
+        params.extend([user_id, edge_start.isoformat(), edge_end.isoformat()])
+        if category_id is not None:
+            params.append(category_id)
+
+    if not parts:
+        # rango vacio: fuente sin filas con las mismas columnas
+        parts.append(
+            "SELECT year_month, category_id, type, total, count "
+            "FROM monthly_rollups WHERE 0"
+        )
+
+    return " UNION ALL ".join(parts), params
+
+
+def type_totals(db, user_id, year_month=None):
+    """(ingresos, egresos) en unidades minimas, de un mes 'YYYY-MM' o de todo el historial."""
+    sql = """
+        SELECT
+            SUM(CASE WHEN type = 'income' THEN total ELSE 0 END) AS income,
+            SUM(CASE WHEN type = 'expense' THEN total ELSE 0 END) AS expense
+        FROM monthly_rollups
+        WHERE user_id = ?
+    """
+    params = [user_id]
+    if year_month is not None:
+        sql += " AND year_month = ?"
+        params.append(year_month)
+
+    row = db.execute(sql, params).fetchone()
+    return row[0] or 0, row[1] or 0
+
+
+# ------------------------------------------------------------------
+# Reconstruccion / verificacion
+# ------------------------------------------------------------------
+def rebuild(conn, user_id=None):
+    """Recalcula monthly_rollups desde cero (de un usuario o de todos)."""
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    with conn:
+        conn.execute(f"DELETE FROM monthly_rollups {where}", params)
+        conn.execute(
+            "INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count) "
+            + _RECOMPUTE_SQL.format(where=where),
+            params,
+        )
+
+
+def verify(conn, user_id=None):
+    """Compara monthly_rollups contra un recalculo; devuelve las diferencias."""
+    where = "WHERE user_id = ?" if user_id is not None else ""
+    params = (user_id,) if user_id is not None else ()
+
+    expected = {
+        tuple(r[:4]): (r[4], r[5])
+        for r in conn.execute(_RECOMPUTE_SQL.format(where=where), params)
+    }
+    stored = {
+        tuple(r[:4]): (r[4], r[5])
+        for r in conn.execute(
+            f"SELECT user_id, year_month, category_id, type, total, count "
+            f"FROM monthly_rollups {where}",
+            params,
+        )
+    }
+
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        exp_total, exp_count = expected.get(key, (0, 0))
+        got_total, got_count = stored.get(key, (0, 0))
+        if exp_count != got_count or exp_total != got_total:
+            mismatches.append({
+                "user_id": key[0],
+                "year_month": key[1],
+                "category_id": key[2],
+                "type": key[3],
+                "expected": (exp_total, exp_count),
+                "stored": (got_total, got_count),
+            })
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de monthly_rollups.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument("--shards", type=int, default=1, help="DB_SHARDS de la app")
+    parser.add_argument("--user-id", type=int, default=None)
+    args = parser.parse_args()
+
+    diffs = []
+    for path in shard_paths(args.database, args.shards):
+        conn = sqlite3.connect(path)
+        if args.command == "rebuild":
+            rebuild(conn, args.user_id)
+            print("Rollups reconstruidos en", path)
+        else:
+            diffs.extend(verify(conn, args.user_id))
+        conn.close()
+
+    if args.command == "verify":
+        for d in diffs:
+            print("Diferencia:", d)
+        print("Rollups OK" if not diffs else f"{len(diffs)} diferencias")
+        raise SystemExit(1 if diffs else 0)
@@ -0,0 +1,257 @@
+import datetime
+import decimal
+from typing import List, Literal, Optional
+
+import msgspec
+from flask import Response, request
+
+import metrics
+
+# ------------------------------------------------------------------
+# Requests
+# ------------------------------------------------------------------
+class LoginRequest(msgspec.Struct):
+    username: str = ""
+    password: str = ""
+
+
+class TokenRequest(msgspec.Struct):
+    token: Optional[str] = None
+
+
+class TransactionIn(msgspec.Struct):
+    # Decimal: el numero JSON se lee tal cual se escribio, sin pasar por float
+    amount: decimal.Decimal
+    type: Literal["income", "expense"]
+    category: str
+    description: Optional[str] = ""
+    date: Optional[datetime.date] = None
+
+
+class RecurringRuleIn(msgspec.Struct):
+    amount: decimal.Decimal
+    type: Literal["income", "expense"]
+    category: str
+    frequency: Literal["daily", "weekly", "monthly", "yearly"]
+    start_date: datetime.date
+    interval: int = 1
+    description: Optional[str] = ""
+    end_date: Optional[datetime.date] = None
+
+
+class BudgetIn(msgspec.Struct):
+    category: str
+    amount: decimal.Decimal
+    month: Optional[str] = None   # YYYY-MM; sin mes vale para todos
+
+
+# ------------------------------------------------------------------
+# Responses
+# ------------------------------------------------------------------
+class UserOut(msgspec.Struct):
+    id: int
+    username: str
+
+
+class TokenResponse(msgspec.Struct):
+    token: str
+    expires_at: str
+    expires_in: int
+    user: UserOut
+
+
+class CategoryOut(msgspec.Struct):
+    id: int
+    name: str
+
+
+class CategoriesResponse(msgspec.Struct):
+    categories: List[CategoryOut]
+
+
+class TransactionOut(msgspec.Struct, omit_defaults=True):
+    """Mismo orden que las columnas de los SELECT: TransactionOut(*row).
+
+    Las ocurrencias de reglas recurrentes van con id null y rule_id.
+    """
+    id: Optional[int]
+    amount: float
+    type: str
+    description: Optional[str]
+    date: str
+    category: str
+    rule_id: Optional[int] = None
+
+
+class RecurringRuleOut(msgspec.Struct):
+    id: int
+    amount: float
+    type: str
+    category: Optional[str]
+    description: Optional[str]
+    frequency: str
+    interval: int
+    start_date: str
+    end_date: Optional[str]
+
+
+class RecurringRulesResponse(msgspec.Struct):
+    rules: List[RecurringRuleOut]
+
+
+class ExportRow(msgspec.Struct):
+    """Orden de transactions.EXPORT_FIELDS."""
+    id: int
+    date: str
+    type: str
+    amount: float
+    category: str
+    description: Optional[str]
+
+
+class SummaryResponse(msgspec.Struct):
+    total_income: float
+    total_expense: float
+    balance: float
+    transactions: List[TransactionOut]
+
+
+class Totals(msgspec.Struct):
+    income: float
+    expense: float
+    balance: float
+    count: int
+
+
+class TransactionPage(msgspec.Struct, omit_defaults=True):
+    transactions: List[TransactionOut]
+    limit: int
+    has_more: bool
+    next_cursor: Optional[str]
+    totals: Optional[Totals] = None
+
+
+class BalanceResponse(msgspec.Struct):
+    date: str
+    balance: float
+
+
+class TimeseriesPoint(msgspec.Struct):
+    period: str
+    income: float
+    expense: float
+    net: float
+    balance: float
+    count: int
+
+
+class TimeseriesResponse(msgspec.Struct):
+    range: str
+    bucket: str
+    start_date: str
+    end_date: str
+    opening_balance: float
+    closing_balance: float
+    points: List[TimeseriesPoint]
+
+
+class SearchHit(msgspec.Struct):
+    id: int
+    amount: float
+    type: str
+    description: Optional[str]
+    date: str
+    category: str
+    score: Optional[float]   # None: fuera de las RANK_WINDOW coincidencias rankeadas
+
+
+class SearchPage(msgspec.Struct):
+    query: str
+    transactions: List[SearchHit]
+    limit: int
+    has_more: bool
+    next_cursor: Optional[str]
+
+
+class BudgetOut(msgspec.Struct):
+    category_id: int
+    category: str
+    limit: float
+    spent: float
+    remaining: float
+    over_budget: bool
+
+
+class BudgetsResponse(msgspec.Struct):
+    month: str
+    over_budget: int
+    budgets: List[BudgetOut]
+
+
+class CategoryTotal(msgspec.Struct):
+    category: str
+    total: float
+
+
+class AnalyticsResponse(msgspec.Struct):
+    range: str
+    start_date: str
+    end_date: str
+    income_total: float
+    expense_total: float
+    balance: float
+    expenses_by_category: List[CategoryTotal]
+    incomes_by_category: List[CategoryTotal]
+
+
+class AnalyticsGroup(msgspec.Struct, omit_defaults=True):
+    key: Optional[str]
+    income: float
+    expense: float
+    balance: float
+    count: int
+    category_id: Optional[int] = None
+
+
+class GroupedAnalyticsResponse(msgspec.Struct):
+    range: str
+    start_date: str
+    end_date: str
+    group_by: str
+    income_total: float
+    expense_total: float
+    balance: float
+    count: int
+    groups: List[AnalyticsGroup]
+
+
+# ------------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------------
+_encoder = msgspec.json.Encoder()
+
+
+def decode_body(type_):
+    """Decodifica y valida el cuerpo JSON en una sola pasada.
+
+    strict=False acepta numeros enviados como string ("12.5"), como hacia
+    el float() anterior. Levanta msgspec.ValidationError / DecodeError.
+    """
+    body = request.get_data(cache=True) or b"{}"
+    return msgspec.json.decode(body, type=type_, strict=False)
+
+
+def convert(obj, type_):
+    """Como decode_body, para objetos ya parseados (filas de carga masiva)."""
+    return msgspec.convert(obj, type_, strict=False)
+
+
+def encode_lines(items):
+    with metrics.timer("serialize"):
+        return _encoder.encode_lines(items)
+
+
+def json_response(obj, status=200):
+    with metrics.timer("serialize"):
+        body = _encoder.encode(obj)
+    return Response(body, status=status, mimetype="application/json")
@@ -0,0 +1,165 @@
+import re
+
+from transactions import ListingError, decode_cursor, encode_cursor
+
+DEFAULT_PAGE_SIZE = 20
+RANK_WINDOW = 2000   # bm25 se calcula sobre las N coincidencias filtradas mas nuevas
+MAX_TERMS = 8
+MAX_QUERY_LENGTH = 200
+
+_TERM = re.compile(r"\w+")
+
+
+def match_expression(query, user_id):
+    """Consulta FTS5 para el texto del usuario.
+
+    Todas las palabras tienen que aparecer; la ultima se busca como prefijo
+    ("super caf" encuentra "Cafetería del super"). Las completas van exactas
+    porque FTS5 puede saltar dentro de su lista de documentos, mientras que
+    un prefijo largo obliga a juntar las de todos los terminos que lo
+    comparten. Solo se toman palabras, asi que la sintaxis de FTS5
+    (comillas, NEAR, ^, :) no llega al MATCH.
+    """
+    terms = _TERM.findall((query or "")[:MAX_QUERY_LENGTH])[:MAX_TERMS]
+    if not terms:
+        raise ListingError("Búsqueda vacía")
+    phrases = [f'"{t}"' for t in terms[:-1]] + [f'"{terms[-1]}"*']
+    return f"owner:u{int(user_id)} AND " + " ".join(phrases)
+
+
+def _filter_sql(user_id, filters):
+    """Condiciones sobre t (transactions) de los filtros de parse_filters."""
+    where = ["t.user_id = ?", "t.date >= ?", "t.date <= ?"]
+    params = [user_id, filters["start"].isoformat(), filters["end"].isoformat()]
+    if filters["type"]:
+        where.append("t.type = ?")
+        params.append(filters["type"])
+    if filters["category_id"] is not None:
+        where.append("t.category_id = ?")
+        params.append(filters["category_id"])
+    return where, params
+
+
+def _window_floor(db, match, where, params, window):
+    """rowid minimo entre las `window` coincidencias filtradas mas nuevas (0 si hay menos)."""
+    row = db.execute(
+        f"""
+        SELECT f.rowid FROM transactions_fts f
+        CROSS JOIN transactions t ON t.id = f.rowid
+        WHERE transactions_fts MATCH ? AND {" AND ".join(where)}
+        ORDER BY f.rowid DESC
+        LIMIT 1 OFFSET ?
+        """,
+        [match] + params + [window - 1],
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _ranked(db, match, where, params, floor, after, limit):
+    """Coincidencias con rowid >= floor, por bm25 y despues id descendente."""
+    keyset, keyset_params = "", []
+    if after:
+        cursor_rank, cursor_id = after
+        keyset = "WHERE h.rank > ? OR (h.rank = ? AND h.id < ?)"
+        keyset_params = [cursor_rank, cursor_rank, cursor_id]
+
+    # MATERIALIZED: bm25 una sola vez por coincidencia (en el join se
+    # evaluaba de nuevo para el ORDER BY). CROSS JOIN fija el orden: sin
+    # estadisticas del CTE el planner preferia recorrer todas las
+    # transacciones del usuario por el indice (user_id, date). Los filtros
+    # van adentro del CTE, igual que en _window_floor
+    return db.execute(
+        f"""
+        WITH hits AS MATERIALIZED (
+            SELECT f.rowid AS id, f.rank AS rank
+            FROM transactions_fts f
+            CROSS JOIN transactions t ON t.id = f.rowid
+            WHERE transactions_fts MATCH ? AND f.rowid >= ? AND {" AND ".join(where)}
+        )
+        SELECT t.id,
+               t.amount_minor,
+               t.type,
+               t.description,
+               t.date,
+               c.name AS category,
+               h.rank AS rank
+        FROM hits h
+        CROSS JOIN transactions t ON t.id = h.id
+        JOIN categories c ON c.id = t.category_id
+        {keyset}
+        ORDER BY h.rank, t.id DESC
+        LIMIT ?
+        """,
+        [match, floor] + params + keyset_params + [limit],
+    ).fetchall()
+
+
+def _older(db, match, where, params, floor, before_id, limit):
+    """Coincidencias fuera de la ventana (rowid < floor), de la mas nueva a la mas vieja."""
+    return db.execute(
+        f"""
+        SELECT t.id,
+               t.amount_minor,
+               t.type,
+               t.description,
+               t.date,
+               c.name AS category,
+               NULL AS rank
+        FROM transactions_fts f
+        CROSS JOIN transactions t ON t.id = f.rowid
+        JOIN categories c ON c.id = t.category_id
+        WHERE transactions_fts MATCH ? AND f.rowid < ? AND {" AND ".join(where)}
+        ORDER BY f.rowid DESC
+        LIMIT ?
+        """,
+        [match, min(floor, before_id) if before_id else floor] + params + [limit],
+    ).fetchall()
+
+
+def search(db, user_id, query, filters, cursor=None, limit=DEFAULT_PAGE_SIZE,
+           window=RANK_WINDOW):
+    """Transacciones que matchean `query` y los filtros, de mas a menos relevante.
+
+    El costo de bm25 crece con la cantidad de coincidencias, asi que se
+    rankean solo las `window` mas nuevas (por id) de las que pasan los
+    filtros; el resto sigue despues, de la mas nueva a la mas vieja, sin
+    rank. Pagina por keyset: (rank, id) dentro de la ventana e id despues,
+    y el cursor guarda el piso de la ventana para que no se corra entre
+    paginas. `filters` es el de transactions.parse_filters. Devuelve
+    (filas, next_cursor | None); las filas traen amount_minor y rank (bm25:
+    menor es mejor; None fuera de la ventana).
+    """
+    match = match_expression(query, user_id)
+    where, params = _filter_sql(user_id, filters)
+
+    after = before_id = None
+    if cursor:
+        cursor_key, cursor_id = decode_cursor(cursor)
+        try:
+            tier, cursor_rank, floor = cursor_key.split("/")
+            floor = int(floor)
+            if tier == "r":
+                after = (float(cursor_rank), cursor_id)
+            elif tier == "o":
+                before_id = cursor_id
+            else:
+                raise ValueError(tier)
+        except ValueError:
+            raise ListingError("Cursor inválido")
+    else:
+        floor = _window_floor(db, match, where, params, window)
+
+    rows = []
+    if before_id is None:
+        rows = _ranked(db, match, where, params, floor, after, limit + 1)
+    if len(rows) <= limit and floor:
+        rows += _older(db, match, where, params, floor, before_id, limit + 1 - len(rows))
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if last["rank"] is None:
+            return rows, encode_cursor(f"o//{floor}", last["id"])
+        # repr() ida y vuelta por float() devuelve exactamente el mismo rank
+        return rows, encode_cursor(f"r/{last['rank']!r}/{floor}", last["id"])
+    return rows, None
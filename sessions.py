@@ -0,0 +1,287 @@
+import hashlib
+import logging
+import os
+import secrets
+import threading
+import time
+
+import msgspec
+from flask import current_app
+from flask.sessions import SecureCookieSession, SecureCookieSessionInterface, SessionInterface
+
+from db import get_db, get_pool, get_read_db
+
+SESSION_BACKEND = "sqlite"      # sqlite | cookie | filesystem (Flask-Session)
+SESSION_SWEEP_SECONDS = 300     # 0 = sin barrido en segundo plano
+SESSION_SWEEP_BATCH = 500       # filas borradas por transaccion
+
+BACKENDS = ("sqlite", "cookie", "filesystem")
+
+# contador interno de cachelib.FileSystemCache, no es una sesion: se guarda
+# como cualquier clave, con el md5 de "__wz_cache_count" como nombre de archivo
+_CACHELIB_COUNT_FILE = hashlib.md5(b"__wz_cache_count").hexdigest()
+
+log = logging.getLogger("cashflow.sessions")
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+class ServerSession(SecureCookieSession):
+    """Sesion guardada en la tabla sessions; en la cookie viaja solo el id.
+
+    sid es None hasta que se guarda algo por primera vez, asi las visitas
+    anonimas no crean filas.
+    """
+
+    def __init__(self, initial=None, sid=None, expires_at=0):
+        super().__init__(initial)
+        self.sid = sid
+        self.expires_at = expires_at
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Sesiones en SQLite con las conexiones del pool de la app.
+
+    Leer es una busqueda por PK en la conexion de lectura de la request.
+    Solo se escribe cuando la sesion cambia o cuando paso mas de la mitad
+    de su vigencia (renovacion), no en cada request.
+    """
+
+    def __init__(self):
+        self._encoder = msgspec.msgpack.Encoder()
+        self._decoder = msgspec.msgpack.Decoder(dict)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = get_read_db().execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?",
+                (sid, int(time.time())),
+            ).fetchone()
+            if row is not None:
+                try:
+                    return ServerSession(self._decoder.decode(row[0]), sid, row[1])
+                except msgspec.DecodeError:
+                    pass
+        # un id desconocido nunca se reutiliza: la sesion nueva recibe otro al guardarse
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if not session:
+            if session.modified and session.sid:
+                db = get_db()
+                db.execute("DELETE FROM sessions WHERE id = ?", (session.sid,))
+                db.commit()
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        now = int(time.time())
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        renew = session.sid is not None and session.expires_at - now < lifetime // 2
+        if not session.modified and not renew:
+            return
+
+        new_sid = session.sid is None
+        if new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        session.expires_at = now + lifetime
+
+        db = get_db()
+        db.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (session.sid, self._encoder.encode(dict(session)), session.expires_at),
+        )
+        db.commit()
+
+        if new_sid or session.permanent:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+            response.vary.add("Cookie")
+
+
+class _UserIdSerializer:
+    """La cookie lleva solo el user_id: '7' en vez de un JSON etiquetado."""
+
+    @staticmethod
+    def dumps(session):
+        user_id = session.get("user_id")
+        return "" if user_id is None else str(int(user_id))
+
+    @staticmethod
+    def loads(value):
+        return {"user_id": int(value)} if value else {}
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    """Sesion sin estado: user_id firmado con SECRET_KEY y con timestamp.
+
+    La firma vence a los PERMANENT_SESSION_LIFETIME de emitida, asi que no
+    hay nada que barrer del lado del servidor; cualquier otra clave de la
+    sesion se descarta al guardarla.
+    """
+
+    salt = "cashflow-session"
+    serializer = _UserIdSerializer()
+
+
+class Sweeper:
+    """Thread que borra sesiones vencidas cada `interval` segundos.
+
+    Barre la tabla sessions con el indice de expires_at, de a `batch` filas
+    para no tomar el lock de escritura mucho tiempo, y los archivos del
+    backend filesystem mas viejos que la vigencia (Flask-Session no los
+    borra). Corre con cualquier backend: al cambiar de uno a otro limpia
+    lo que dejo el anterior.
+    """
+
+    def __init__(self, pool, interval, batch, lifetime, file_dir=None):
+        self.pool = pool
+        self.interval = interval
+        self.batch = batch
+        self.lifetime = lifetime
+        self.file_dir = file_dir
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sweeps = 0
+        self._rows = 0
+        self._files = 0
+        self._failed = 0
+        self._last_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                with self._lock:
+                    self._failed += 1
+                log.exception("Fallo el barrido de sesiones")
+
+    def sweep(self, now=None):
+        """Un barrido completo; devuelve (filas, archivos) borrados."""
+        now = int(now if now is not None else time.time())
+        started = time.perf_counter()
+        rows = self._sweep_table(now)
+        files = self._sweep_files(now)
+        with self._lock:
+            self._sweeps += 1
+            self._rows += rows
+            self._files += files
+            self._last_ms = (time.perf_counter() - started) * 1000
+        return rows, files
+
+    def _sweep_table(self, now):
+        deleted = 0
+        conn = self.pool.acquire()
+        try:
+            while True:
+                with conn:
+                    cursor = conn.execute(
+                        """
+                        DELETE FROM sessions WHERE rowid IN (
+                            SELECT rowid FROM sessions WHERE expires_at <= ? LIMIT ?
+                        )
+                        """,
+                        (now, self.batch),
+                    )
+                deleted += cursor.rowcount
+                if cursor.rowcount < self.batch:
+                    return deleted
+        finally:
+            self.pool.release(conn)
+
+    def _sweep_files(self, now):
+        if not self.file_dir or not os.path.isdir(self.file_dir):
+            return 0
+        deleted = 0
+        with os.scandir(self.file_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.name == _CACHELIB_COUNT_FILE or not entry.is_file():
+                        continue
+                    if entry.stat().st_mtime < now - self.lifetime:
+                        os.remove(entry.path)
+                        deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval_s": self.interval,
+                "sweeps": self._sweeps,
+                "rows_deleted": self._rows,
+                "files_deleted": self._files,
+                "failed": self._failed,
+                "last_sweep_ms": round(self._last_ms, 3),
+            }
+
+
+def _start_sweeper():
+    """Arranca el barrido con el primer request (el pool sale de app.config)."""
+    global _sweeper
+    if _sweeper is not None:
+        return
+    app = current_app
+    interval = app.config.get("SESSION_SWEEP_SECONDS", SESSION_SWEEP_SECONDS)
+    if not interval:
+        return
+    with _sweeper_lock:
+        if _sweeper is None:
+            _sweeper = Sweeper(
+                get_pool(False),
+                interval,
+                app.config.get("SESSION_SWEEP_BATCH", SESSION_SWEEP_BATCH),
+                int(app.permanent_session_lifetime.total_seconds()),
+                app.config.get("SESSION_FILE_DIR", os.path.join(os.getcwd(), "flask_session")),
+            )
+
+
+def init_app(app):
+    """Instala el backend de SESSION_BACKEND; se puede volver a llamar para cambiarlo."""
+    backend = app.config.get("SESSION_BACKEND", SESSION_BACKEND)
+    if backend == "sqlite":
+        app.session_interface = SqliteSessionInterface()
+    elif backend == "cookie":
+        app.session_interface = CookieSessionInterface()
+    elif backend == "filesystem":
+        from flask_session import Session
+
+        # derivado de SESSION_BACKEND para que las dos opciones no se contradigan
+        app.config["SESSION_TYPE"] = "filesystem"
+        Session(app)
+    else:
+        raise ValueError(f"SESSION_BACKEND inválido, use uno de: {', '.join(BACKENDS)}")
+
+    if "cashflow.sessions" not in app.extensions:
+        app.extensions["cashflow.sessions"] = True
+        app.before_request(_start_sweeper)
+
+
+def stats():
+    return {
+        "backend": current_app.config.get("SESSION_BACKEND", SESSION_BACKEND),
+        "sweeper": _sweeper.stats() if _sweeper is not None else None,
+    }
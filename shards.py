@@ -0,0 +1,350 @@
+"""Sharding opcional por usuario (DB_SHARDS > 1).
+
+La base principal (DATABASE) es el directorio: guarda users y shard_map, y
+ademas es el shard 0. Los shards 1..N-1 son archivos hermanos
+(cashflow.shard1.db, ...) con el mismo esquema; cada usuario vive entero
+en uno, asi que las escrituras de usuarios distintos no compiten por el
+mismo lock de SQLite.
+
+Todas las consultas filtran por user_id, asi que los ids solo son unicos
+dentro de cada shard; mover un usuario le asigna ids nuevos en el destino.
+"""
+import argparse
+import os
+import sqlite3
+import zlib
+from time import time
+
+from cache import LRUCache
+
+DATABASE = "cashflow.db"
+
+# tablas con datos de un usuario (padres primero); monthly_rollups y
+# data_versions las mantienen los triggers de cada shard
+USER_TABLES = ("categories", "transactions", "recurring_rules", "recurring_exceptions", "budgets")
+
+SHARD_MAP_TTL = 60  # segundos
+
+# destino de las transacciones y reglas cuya categoria fue borrada
+ORPHAN_CATEGORY = "Sin categoría"
+
+_shard_cache = LRUCache(4096)
+
+
+def shard_path(database, shard):
+    if shard == 0:
+        return database
+    root, ext = os.path.splitext(database)
+    return f"{root}.shard{shard}{ext}"
+
+
+def shard_paths(database, count):
+    return [shard_path(database, n) for n in range(max(count, 1))]
+
+
+def hash_shard(user_id, count):
+    """Shard inicial de un usuario: crc32 estable entre procesos (no hash())."""
+    if count <= 1:
+        return 0
+    return zlib.crc32(str(user_id).encode("ascii")) % count
+
+
+def lookup(conn, user_id):
+    row = conn.execute(
+        "SELECT shard FROM shard_map WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def shard_for(user_id, connect):
+    """Shard del usuario; `connect()` da la conexion al directorio y solo se llama en un miss."""
+    shard = _shard_cache.get(user_id)
+    if shard is None:
+        shard = lookup(connect(), user_id)
+        _shard_cache.set(user_id, shard, expires_at=time() + SHARD_MAP_TTL)
+    return shard
+
+
+def assign(conn, user_id, count):
+    """Registra el shard de un usuario nuevo (en la transaccion del INSERT en users)."""
+    if count <= 1:
+        return 0
+    shard = hash_shard(user_id, count)
+    conn.execute(
+        "INSERT OR REPLACE INTO shard_map (user_id, shard) VALUES (?, ?)",
+        (user_id, shard),
+    )
+    return shard
+
+
+def stats():
+    return _shard_cache.stats()
+
+
+# ------------------------------------------------------------------
+# Movimiento de usuarios entre shards
+# ------------------------------------------------------------------
+def _columns(conn, schema, table):
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})") if r[1] != "id"]
+
+
+def _delete_user(conn, schema, user_id):
+    # hijos primero; los triggers del shard descuentan monthly_rollups
+    for table in reversed(USER_TABLES):
+        conn.execute(f"DELETE FROM {schema}.{table} WHERE user_id = ?", (user_id,))
+
+
+def _orphan_category(conn, user_id):
+    """Id en dst de ORPHAN_CATEGORY si hay transacciones o reglas con la categoria borrada.
+
+    Se crea solo si hace falta; si el usuario ya tenia una con ese nombre se usa esa.
+    """
+    orphans = conn.execute(
+        """
+        SELECT 1 FROM main.transactions
+        WHERE user_id = ? AND category_id NOT IN (SELECT old_id FROM temp.category_map)
+        UNION ALL
+        SELECT 1 FROM main.recurring_rules
+        WHERE user_id = ? AND category_id NOT IN (SELECT old_id FROM temp.category_map)
+        LIMIT 1
+        """,
+        (user_id, user_id),
+    ).fetchone()
+    if orphans is None:
+        return None
+    row = conn.execute(
+        "SELECT id FROM dst.categories WHERE user_id = ? AND name = ?",
+        (user_id, ORPHAN_CATEGORY),
+    ).fetchone()
+    if row is not None:
+        return row[0]
+    return conn.execute(
+        "INSERT INTO dst.categories (user_id, name) VALUES (?, ?)",
+        (user_id, ORPHAN_CATEGORY),
+    ).lastrowid
+
+
+def _copy_user(src_path, dst_path, user_id):
+    """Copia categorias, transacciones, reglas recurrentes y presupuestos al shard destino con ids nuevos.
+
+    Un id traido de otro shard haria saltar el AUTOINCREMENT del destino
+    (que sigue desde el rowid maximo), asi que se renumera: las categorias
+    una por una, armando el mapa viejo -> nuevo, y las transacciones en
+    orden de id para que (date, id) conserve el orden del listado.
+
+    Borrar una categoria deja sus transacciones y reglas con un id sin mapa;
+    en el destino ese id puede ser de una categoria de otro usuario, asi que
+    pasan a ORPHAN_CATEGORY del usuario. Los presupuestos de categorias
+    borradas no se copian (no se ven en ninguna consulta).
+    """
+    conn = sqlite3.connect(src_path, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS dst", (dst_path,))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # restos de un movimiento interrumpido
+            _delete_user(conn, "dst", user_id)
+
+            conn.execute("CREATE TEMP TABLE category_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+            cat_cols = _columns(conn, "main", "categories")
+            cols = ", ".join(cat_cols)
+            placeholders = ", ".join("?" * len(cat_cols))
+            for row in conn.execute(
+                f"SELECT id, {cols} FROM main.categories WHERE user_id = ? ORDER BY id",
+                (user_id,),
+            ).fetchall():
+                new_id = conn.execute(
+                    f"INSERT INTO dst.categories ({cols}) VALUES ({placeholders})", row[1:]
+                ).lastrowid
+                conn.execute("INSERT INTO temp.category_map VALUES (?, ?)", (row[0], new_id))
+            orphan_id = _orphan_category(conn, user_id)
+
+            tx_cols = _columns(conn, "main", "transactions")
+            select = ", ".join(
+                "coalesce(m.new_id, ?)" if c == "category_id" else f"t.{c}"
+                for c in tx_cols
+            )
+            conn.execute(
+                f"""
+                INSERT INTO dst.transactions ({", ".join(tx_cols)})
+                SELECT {select}
+                FROM main.transactions t
+                LEFT JOIN temp.category_map m ON m.old_id = t.category_id
+                WHERE t.user_id = ?
+                ORDER BY t.id
+                """,
+                (orphan_id, user_id),
+            )
+            # reglas recurrentes: mismo renumerado que las categorias, y las
+            # excepciones siguen a su regla
+            conn.execute("CREATE TEMP TABLE rule_map (old_id INTEGER PRIMARY KEY, new_id INTEGER)")
+            rule_cols = _columns(conn, "main", "recurring_rules")
+            cols = ", ".join(rule_cols)
+            placeholders = ", ".join("?" * len(rule_cols))
+            category_index = rule_cols.index("category_id")
+            category_map = dict(conn.execute("SELECT old_id, new_id FROM temp.category_map"))
+            for row in conn.execute(
+                f"SELECT id, {cols} FROM main.recurring_rules WHERE user_id = ? ORDER BY id",
+                (user_id,),
+            ).fetchall():
+                values = list(row[1:])
+                values[category_index] = category_map.get(values[category_index], orphan_id)
+                new_id = conn.execute(
+                    f"INSERT INTO dst.recurring_rules ({cols}) VALUES ({placeholders})", values
+                ).lastrowid
+                conn.execute("INSERT INTO temp.rule_map VALUES (?, ?)", (row[0], new_id))
+            conn.execute(
+                """
+                INSERT INTO dst.recurring_exceptions (user_id, rule_id, date)
+                SELECT e.user_id, m.new_id, e.date
+                FROM main.recurring_exceptions e
+                JOIN temp.rule_map m ON m.old_id = e.rule_id
+                WHERE e.user_id = ?
+                """,
+                (user_id,),
+            )
+            conn.execute(
+                """
+                INSERT INTO dst.budgets (user_id, category_id, year_month, amount_minor)
+                SELECT b.user_id, m.new_id, b.year_month, b.amount_minor
+                FROM main.budgets b
+                JOIN temp.category_map m ON m.old_id = b.category_id
+                WHERE b.user_id = ?
+                """,
+                (user_id,),
+            )
+            # la version nunca retrocede: los ETag emitidos por el origen no vuelven a valer
+            conn.execute(
+                """
+                INSERT INTO dst.data_versions (user_id, version)
+                SELECT user_id, version FROM main.data_versions WHERE user_id = ?
+                ON CONFLICT (user_id) DO UPDATE SET version = max(version, excluded.version) + 1
+                """,
+                (user_id,),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DROP TABLE IF EXISTS temp.category_map")
+            conn.execute("DROP TABLE IF EXISTS temp.rule_map")
+    finally:
+        conn.close()
+
+
+def _purge_user(path, user_id):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            _delete_user(conn, "main", user_id)
+    finally:
+        conn.close()
+
+
+def move_user(database, user_id, target, count):
+    """Mueve los datos de un usuario al shard `target`.
+
+    Copia, actualiza shard_map y recien despues borra del origen; cada paso
+    es idempotente, asi que si se corta se vuelve a correr el mismo comando.
+    Correr con la app detenida: otros procesos cachean el shard de cada
+    usuario hasta SHARD_MAP_TTL segundos.
+    """
+    if not 0 <= target < count:
+        raise ValueError(f"Shard inválido: {target} (hay {count})")
+
+    directory = sqlite3.connect(database)
+    try:
+        if directory.execute("SELECT 1 FROM users WHERE id = ?", (user_id,)).fetchone() is None:
+            raise ValueError(f"Usuario inexistente: {user_id}")
+        current = lookup(directory, user_id)
+
+        if current != target:
+            _copy_user(shard_path(database, current), shard_path(database, target), user_id)
+            with directory:
+                directory.execute(
+                    "INSERT OR REPLACE INTO shard_map (user_id, shard) VALUES (?, ?)",
+                    (user_id, target),
+                )
+    finally:
+        directory.close()
+
+    for shard in range(count):
+        if shard != target:
+            _purge_user(shard_path(database, shard), user_id)
+    _shard_cache.pop(user_id)
+    return current
+
+
+def rebalance(database, count, dry_run=False):
+    """Mueve cada usuario al shard que le toca por hash_shard(); devuelve [(user_id, de, a)]."""
+    directory = sqlite3.connect(database)
+    try:
+        placement = dict(directory.execute("SELECT user_id, shard FROM shard_map"))
+        user_ids = [r[0] for r in directory.execute("SELECT id FROM users ORDER BY id")]
+    finally:
+        directory.close()
+
+    moves = []
+    for user_id in user_ids:
+        current = placement.get(user_id, 0)
+        target = hash_shard(user_id, count)
+        if current != target:
+            moves.append((user_id, current, target))
+            if not dry_run:
+                move_user(database, user_id, target, count)
+    return moves
+
+
+def status(database, count):
+    """Usuarios y transacciones por shard."""
+    directory = sqlite3.connect(database)
+    try:
+        placement = dict(directory.execute("SELECT user_id, shard FROM shard_map"))
+        user_ids = [r[0] for r in directory.execute("SELECT id FROM users")]
+    finally:
+        directory.close()
+
+    users = [0] * count
+    for user_id in user_ids:
+        shard = placement.get(user_id, 0)
+        if shard < count:
+            users[shard] += 1
+
+    result = []
+    for shard, path in enumerate(shard_paths(database, count)):
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        finally:
+            conn.close()
+        result.append({"shard": shard, "path": path, "users": users[shard], "transactions": rows})
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Administracion de shards por usuario.")
+    parser.add_argument("command", choices=["status", "move", "rebalance"])
+    parser.add_argument("--database", default=DATABASE)
+    parser.add_argument("--shards", type=int, required=True, help="cantidad de shards (DB_SHARDS)")
+    parser.add_argument("--user-id", type=int, help="usuario a mover (move)")
+    parser.add_argument("--to", type=int, help="shard destino (move)")
+    parser.add_argument("--dry-run", action="store_true", help="rebalance: solo listar movimientos")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for s in status(args.database, args.shards):
+            print(f"shard {s['shard']}: {s['users']} usuarios, {s['transactions']} transacciones ({s['path']})")
+    elif args.command == "move":
+        if args.user_id is None or args.to is None:
+            parser.error("move requiere --user-id y --to")
+        try:
+            previous = move_user(args.database, args.user_id, args.to, args.shards)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        print(f"Usuario {args.user_id}: shard {previous} -> {args.to}")
+    else:
+        moves = rebalance(args.database, args.shards, dry_run=args.dry_run)
+        for user_id, src, dst in moves:
+            print(f"Usuario {user_id}: shard {src} -> {dst}")
+        print(f"{len(moves)} usuarios {'a mover' if args.dry_run else 'movidos'}")
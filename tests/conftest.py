@@ -0,0 +1,92 @@
+import itertools
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import init_db  # noqa: E402
+from app import app as flask_app  # noqa: E402
+
+_usernames = (f"user{i}" for i in itertools.count(1))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    database = str(tmp_path_factory.mktemp("db") / "cashflow.db")
+    init_db.init_db(database)
+    flask_app.config.update(
+        TESTING=True,
+        DATABASE=database,
+        # KDF barato y en el thread del test: el pool de procesos no aporta aca
+        PASSWORD_HASH_METHOD="pbkdf2:sha256:1000",
+        HASH_WORKERS=0,
+    )
+    return flask_app
+
+
+class User:
+    """Cliente logueado (sesion web) con su token de la API.
+
+    Cada test usa un usuario nuevo sobre la misma base, asi los caches por
+    usuario (categorias, exponente, tokens) nunca ven datos de otro test.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        self.name = username = next(_usernames)
+        form = {"username": username, "password": "p", "confirmation": "p"}
+        assert self.client.post("/register", data=form).status_code == 302
+        assert self.client.post("/login", data=form).status_code == 302
+        body = self.client.post(
+            "/api/auth/login", json={"username": username, "password": "p"}
+        ).get_json()
+        self.id = body["user"]["id"]
+        self.headers = {"Authorization": "Bearer " + body["token"]}
+
+    def get(self, url, **kwargs):
+        response = self.client.get(url, headers=self.headers, **kwargs)
+        assert response.status_code == 200, response.data
+        return response.get_json()
+
+    def add(self, amount, type_, category, date, description=""):
+        response = self.client.post("/api/transactions", headers=self.headers, json={
+            "amount": amount,
+            "type": type_,
+            "category": category,
+            "date": date,
+            "description": description,
+        })
+        assert response.status_code == 201, response.data
+        return response.get_json()["transaction_id"]
+
+    def edit(self, tx_id, amount, type_, category_id, date):
+        response = self.client.post(f"/transactions/{tx_id}/edit", data={
+            "type": type_,
+            "amount": str(amount),
+            "date": date,
+            "category_id": str(category_id),
+        })
+        assert response.status_code == 302, response.data
+
+    def delete(self, tx_id):
+        assert self.client.post(f"/transactions/{tx_id}/delete").status_code == 302
+
+    def category_id(self, name):
+        row = self.db().execute(
+            "SELECT id FROM categories WHERE user_id = ? AND name = ?", (self.id, name)
+        ).fetchone()
+        return row[0]
+
+    def db(self):
+        conn = sqlite3.connect(self.app.config["DATABASE"])
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+@pytest.fixture
+def user(app):
+    return User(app)
@@ -0,0 +1,39 @@
+from contextlib import closing
+
+import hashing
+from db import get_pool
+
+
+def _login(user, app, monkeypatch):
+    in_use = []
+    check = hashing.check_password
+
+    def spy(stored_hash, password):
+        # ninguna conexion de escritura queda tomada mientras corre el KDF
+        in_use.append(get_pool(False, app.config["DATABASE"]).stats()["in_use"])
+        return check(stored_hash, password)
+
+    monkeypatch.setattr(hashing, "check_password", spy)
+    response = user.client.post("/api/auth/login", json={"username": user.name, "password": "p"})
+    assert response.status_code == 200, response.data
+    assert in_use == [0]
+
+
+def test_login_releases_connections_before_kdf(app, user, monkeypatch):
+    with app.app_context():
+        _login(user, app, monkeypatch)
+
+
+def test_login_rehashes_after_kdf(app, user, monkeypatch):
+    monkeypatch.setitem(app.config, "PASSWORD_HASH_METHOD", "pbkdf2:sha256:2000")
+    with app.app_context():
+        _login(user, app, monkeypatch)
+    with closing(user.db()) as conn:
+        stored = conn.execute("SELECT hash FROM users WHERE id = ?", (user.id,)).fetchone()[0]
+    assert stored.startswith("pbkdf2:sha256:2000$")
+
+
+def test_register_duplicate(user):
+    form = {"username": user.name, "password": "p", "confirmation": "p"}
+    response = user.app.test_client().post("/register", data=form)
+    assert response.status_code == 400
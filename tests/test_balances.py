@@ -0,0 +1,112 @@
+import random
+from contextlib import closing
+from datetime import date
+
+import pytest
+
+DAYS = ["2023-12-31", "2024-01-15", "2024-03-31", "2024-06-01", "2024-08-20", "2024-12-31"]
+
+
+def _expected(user, day):
+    with closing(user.db()) as conn:
+        row = conn.execute(
+            """
+            SELECT COALESCE(SUM(CASE type WHEN 'income' THEN amount_minor ELSE -amount_minor END), 0)
+            FROM transactions WHERE user_id = ? AND date <= ?
+            """,
+            (user.id, day),
+        ).fetchone()
+    return row[0] / 100
+
+
+def _check(user):
+    for day in DAYS:
+        body = user.get(f"/api/balance?date={day}")
+        assert body["balance"] == pytest.approx(_expected(user, day)), day
+    # los checkpoints que quedaron son el saldo al cierre de cada mes
+    with closing(user.db()) as conn:
+        checkpoints = conn.execute(
+            "SELECT year_month, balance FROM balance_checkpoints WHERE user_id = ?",
+            (user.id,),
+        ).fetchall()
+    assert checkpoints
+    for year_month, balance in checkpoints:
+        assert balance / 100 == pytest.approx(_expected(user, f"{year_month}-31")), year_month
+
+
+@pytest.fixture
+def history(user):
+    rng = random.Random(6)
+    ids = [
+        user.add(
+            round(rng.uniform(1, 200), 2),
+            rng.choice(["income", "expense"]),
+            "Food",
+            f"2024-{rng.randint(2, 11):02d}-{rng.randint(1, 28):02d}",
+        )
+        for _ in range(60)
+    ]
+    _check(user)
+    return user, ids
+
+
+def test_backdated_insert(history):
+    user, _ = history
+    user.add(1000, "income", "Food", "2024-01-10")
+    _check(user)
+    user.add(7.5, "expense", "Food", "2023-11-30")
+    _check(user)
+
+
+def test_backdated_edit(history):
+    user, ids = history
+    food = user.category_id("Food")
+    user.edit(ids[0], 333, "expense", food, "2024-01-02")
+    _check(user)
+    user.edit(ids[1], 12, "income", food, date(2024, 2, 29).isoformat())
+    _check(user)
+
+
+def test_backdated_delete(history):
+    user, ids = history
+    with closing(user.db()) as conn:
+        oldest = conn.execute(
+            "SELECT id FROM transactions WHERE user_id = ? ORDER BY date LIMIT 1", (user.id,)
+        ).fetchone()[0]
+    user.delete(oldest)
+    _check(user)
+    for tx_id in ids[10:20]:
+        user.delete(tx_id)
+    _check(user)
+
+
+def test_balance_and_timeseries_include_recurring(user):
+    user.add(1000, "income", "Food", "2024-01-01")
+    user.add(40, "expense", "Food", "2024-02-10")
+    response = user.client.post("/api/recurring", headers=user.headers, json={
+        "amount": 100, "type": "expense", "category": "Food", "frequency": "monthly",
+        "start_date": "2024-01-15", "end_date": "2024-04-15",
+    })
+    assert response.status_code == 201, response.data
+    rule_id = response.get_json()["rule_id"]
+    # una ocurrencia salteada no cuenta
+    assert user.client.delete(
+        f"/api/recurring/{rule_id}/occurrences/2024-03-15", headers=user.headers
+    ).status_code == 200
+
+    assert user.get("/api/balance?date=2024-01-14")["balance"] == 1000
+    assert user.get("/api/balance?date=2024-02-28")["balance"] == 1000 - 200 - 40
+    assert user.get("/api/balance?date=2024-12-31")["balance"] == 1000 - 300 - 40
+
+    body = user.get("/api/timeseries?start=2024-02-01&end=2024-04-30&bucket=month")
+    assert body["opening_balance"] == 900
+    assert [(p["period"], p["expense"], p["count"], p["balance"]) for p in body["points"]] == [
+        ("2024-02", 140, 2, 760),
+        ("2024-04", 100, 1, 660),
+    ]
+    assert body["closing_balance"] == 660
+
+    body = user.get("/api/timeseries?start=2024-01-01&end=2024-01-31&bucket=day")
+    assert [(p["period"], p["balance"]) for p in body["points"]] == [
+        ("2024-01-01", 1000), ("2024-01-15", 900),
+    ]
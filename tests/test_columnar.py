@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+import columnar
+
+pytest.importorskip("numpy")
+
+
+def _analytics(user, app, monkeypatch, columnar_on, group_by):
+    monkeypatch.setitem(app.config, "ANALYTICS_COLUMNAR", columnar_on)
+    return user.get(f"/api/analytics?range=all&group_by={group_by}")
+
+
+@pytest.mark.parametrize("group_by", ["category", "month", "week", "type"])
+def test_in_place_updates_match_sql(app, user, monkeypatch, group_by):
+    rng = random.Random(7)
+
+    def add():
+        return user.add(
+            round(rng.uniform(1, 100), 2),
+            rng.choice(["income", "expense"]),
+            rng.choice(["Food", "Rent"]),
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        )
+
+    ids = [add() for _ in range(30)]
+    # carga las columnas; lo que sigue se aplica en el lugar
+    _analytics(user, app, monkeypatch, True, group_by)
+    with app.app_context():
+        before = columnar.stats()
+    ids += [add() for _ in range(5)]
+    user.edit(ids[0], 42, "expense", user.category_id("Rent"), "2023-12-31")
+    user.delete(ids[1])
+    with app.app_context():
+        after = columnar.stats()
+
+    assert after["updates"] - before["updates"] == 7
+    assert after["loads"] == before["loads"]
+    assert _analytics(user, app, monkeypatch, True, group_by) == \
+        _analytics(user, app, monkeypatch, False, group_by)
@@ -0,0 +1,59 @@
+import random
+from contextlib import closing
+
+import pytest
+
+
+def _pages(user, limit, **filters):
+    ids, cursor = [], None
+    while True:
+        query = {**filters, "limit": limit}
+        if cursor:
+            query["cursor"] = cursor
+        page = user.get("/api/transactions", query_string=query)
+        ids.extend(t["id"] for t in page["transactions"])
+        if not page["has_more"]:
+            assert page["next_cursor"] is None
+            return ids
+        cursor = page["next_cursor"]
+
+
+@pytest.fixture
+def history(user):
+    rng = random.Random(4)
+    for _ in range(90):
+        # pocas fechas distintas: muchos empates en date que desempata el id
+        user.add(
+            round(rng.uniform(1, 100), 2),
+            rng.choice(["income", "expense"]),
+            rng.choice(["Food", "Rent"]),
+            f"2024-0{rng.randint(1, 6)}-{rng.choice(['01', '15'])}",
+        )
+    return user
+
+
+@pytest.mark.parametrize("limit", [1, 7, 20, 200])
+def test_keyset_pagination_is_complete(history, limit):
+    with closing(history.db()) as conn:
+        expected = [r[0] for r in conn.execute(
+            "SELECT id FROM transactions WHERE user_id = ? ORDER BY date DESC, id DESC",
+            (history.id,),
+        )]
+    assert _pages(history, limit) == expected
+
+
+def test_keyset_pagination_with_filters(history):
+    with closing(history.db()) as conn:
+        expected = [r[0] for r in conn.execute(
+            """
+            SELECT t.id FROM transactions t JOIN categories c ON c.id = t.category_id
+            WHERE t.user_id = ? AND t.type = 'expense' AND c.name = 'Food'
+              AND t.date BETWEEN '2024-02-01' AND '2024-05-15'
+            ORDER BY t.date DESC, t.id DESC
+            """,
+            (history.id,),
+        )]
+    assert expected
+    assert _pages(
+        history, 4, type="expense", category="Food", start="2024-02-01", end="2024-05-15"
+    ) == expected
@@ -0,0 +1,68 @@
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import init_db
+
+
+def _base(path):
+    conn = sqlite3.connect(path)
+    with open(init_db.SCHEMA_PATH, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.execute("INSERT INTO users (username, hash) VALUES ('a', 'x')")
+    conn.execute("INSERT INTO categories (user_id, name) VALUES (1, 'Food')")
+    return conn
+
+
+def _next_id(conn):
+    return conn.execute(
+        "INSERT INTO transactions (user_id, category_id, amount_minor, type, date) "
+        "VALUES (1, 1, 100, 'expense', '2024-01-01')"
+    ).lastrowid
+
+
+@pytest.mark.parametrize("keep", [0, 1])
+def test_integer_amounts_keeps_autoincrement(tmp_path, keep):
+    with closing(_base(str(tmp_path / "old.db"))) as conn:
+        conn.executemany(
+            "INSERT INTO transactions (user_id, category_id, amount, type, date) "
+            "VALUES (1, 1, 1.5, 'expense', '2024-01-01')",
+            [()] * 5,
+        )
+        # con keep=0 la tabla queda vacia pero sus ids ya se usaron
+        conn.execute("DELETE FROM transactions WHERE id > ?", (keep,))
+        conn.commit()
+
+        init_db.migrate(conn)
+
+        assert conn.execute("SELECT name, seq FROM sqlite_sequence WHERE name = 'transactions'").fetchall() \
+            == [("transactions", 5)]
+        assert _next_id(conn) == 6
+
+
+def test_fresh_database_starts_at_one(tmp_path):
+    with closing(_base(str(tmp_path / "new.db"))) as conn:
+        init_db.migrate(conn)
+        assert _next_id(conn) == 1
+
+
+def test_app_migrates_old_database(app, tmp_path, monkeypatch):
+    path = str(tmp_path / "cashflow.db")
+    with closing(_base(path)) as conn:
+        conn.execute(
+            "INSERT INTO transactions (user_id, category_id, amount, type, date) "
+            "VALUES (1, 1, 2.5, 'expense', '2024-01-01')"
+        )
+        conn.commit()
+    monkeypatch.setitem(app.config, "DATABASE", path)
+
+    client = app.test_client()
+    form = {"username": "viejo", "password": "p", "confirmation": "p"}
+    assert client.post("/register", data=form).status_code == 302
+    assert client.post("/login", data=form).status_code == 302
+
+    latest = init_db._list_migrations()[-1][0]
+    with closing(sqlite3.connect(path)) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == latest
+        assert conn.execute("SELECT amount_minor FROM transactions").fetchall() == [(250,)]
@@ -0,0 +1,107 @@
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+from contextlib import closing
+
+import budgets
+import init_db
+import rollups
+import shards
+
+ROLLUPS = os.path.join(os.path.dirname(os.path.abspath(rollups.__file__)), "rollups.py")
+
+CATEGORIES = ["Food", "Rent", "Misc"]
+
+
+def _random_history(user, count=80, seed=1):
+    rng = random.Random(seed)
+    ids = []
+    for _ in range(count):
+        ids.append(user.add(
+            round(rng.uniform(1, 300), 2),
+            rng.choice(["income", "expense"]),
+            rng.choice(CATEGORIES),
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        ))
+    # ediciones que cambian mes, tipo y categoria, y algunos borrados
+    for tx_id in rng.sample(ids, 15):
+        user.edit(
+            tx_id,
+            round(rng.uniform(1, 300), 2),
+            rng.choice(["income", "expense"]),
+            user.category_id(rng.choice(CATEGORIES)),
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        )
+    for tx_id in rng.sample(ids, 10):
+        user.delete(tx_id)
+    return rng
+
+
+def test_rollups_match_full_recompute(user):
+    _random_history(user)
+    with closing(user.db()) as conn:
+        assert rollups.verify(conn, user.id) == []
+        assert budgets.reconcile(conn, user.id, dry_run=True) == []
+
+
+def test_budget_spent_matches_transactions(user):
+    _random_history(user, seed=2)
+    for name in CATEGORIES:
+        response = user.client.put("/api/budgets", headers=user.headers, json={
+            "category": name, "amount": 500,
+        })
+        assert response.status_code == 200, response.data
+
+    with closing(user.db()) as conn:
+        for month in range(1, 13):
+            year_month = f"2024-{month:02d}"
+            expected = dict(conn.execute(
+                """
+                SELECT c.name, COALESCE(SUM(t.amount_minor), 0)
+                FROM categories c
+                LEFT JOIN transactions t
+                  ON t.category_id = c.id AND t.type = 'expense'
+                 AND t.date BETWEEN ? AND ?
+                WHERE c.user_id = ?
+                GROUP BY c.name
+                """,
+                (f"{year_month}-01", f"{year_month}-31", user.id),
+            ).fetchall())
+            body = user.get(f"/api/budgets?month={year_month}")
+            assert {b["category"]: b["spent"] for b in body["budgets"]} == {
+                name: expected[name] / 100 for name in CATEGORIES
+            }
+            assert body["over_budget"] == sum(expected[name] > 50000 for name in CATEGORIES)
+
+
+def test_rebuild_restores_drifted_counters(user):
+    _random_history(user, count=20, seed=3)
+    with closing(user.db()) as conn:
+        conn.execute("UPDATE monthly_rollups SET total = total + 1 WHERE user_id = ?", (user.id,))
+        conn.commit()
+        diffs = budgets.reconcile(conn, user.id)
+        assert diffs
+        assert rollups.verify(conn, user.id) == []
+
+
+def test_cli_covers_every_shard(tmp_path):
+    database = str(tmp_path / "cashflow.db")
+    init_db.init_db(database, shards=2)
+    with closing(sqlite3.connect(shards.shard_path(database, 1))) as conn, conn:
+        conn.execute(
+            "INSERT INTO monthly_rollups (user_id, year_month, category_id, type, total, count) "
+            "VALUES (1, '2024-01', 1, 'expense', 100, 1)"
+        )
+
+    def run(*args):
+        return subprocess.run(
+            [sys.executable, ROLLUPS, *args, "--database", database, "--shards", "2"],
+            capture_output=True, text=True,
+        )
+
+    assert run("verify").returncode == 1
+    assert run("rebuild").returncode == 0
+    result = run("verify")
+    assert result.returncode == 0, result.stdout
@@ -0,0 +1,68 @@
+import random
+from contextlib import closing
+
+WINDOW = 10
+
+
+def _search(user, params, limit):
+    hits, cursor = [], None
+    while True:
+        query = {**params, "limit": limit}
+        if cursor:
+            query["cursor"] = cursor
+        page = user.get("/api/transactions/search", query_string=query)
+        hits.extend(page["transactions"])
+        if not page["has_more"]:
+            return hits
+        cursor = page["next_cursor"]
+
+
+def test_filtered_search_past_rank_window(app, user, monkeypatch):
+    monkeypatch.setitem(app.config, "SEARCH_RANK_WINDOW", WINDOW)
+    rng = random.Random(5)
+    for i in range(120):
+        user.add(
+            round(rng.uniform(1, 100), 2),
+            rng.choice(["income", "expense"]),
+            "Food",
+            f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            # "cafe" repetido en algunas para que el rank no sea parejo
+            "cafe " * rng.randint(1, 3) + f"pedido {i}" if i % 4 else f"otro {i}",
+        )
+
+    with closing(user.db()) as conn:
+        expected = {r[0] for r in conn.execute(
+            """
+            SELECT id FROM transactions
+            WHERE user_id = ? AND type = 'expense' AND date <= '2024-09-30'
+              AND description LIKE 'cafe%'
+            """,
+            (user.id,),
+        )}
+    # los filtros dejan mas coincidencias que la ventana rankeada
+    assert len(expected) > 2 * WINDOW
+
+    hits = _search(user, {"q": "cafe", "type": "expense", "end": "2024-09-30"}, 7)
+    ids = [h["id"] for h in hits]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+
+    ranked = [h for h in hits if h["score"] is not None]
+    rest = hits[len(ranked):]
+    assert len(ranked) == WINDOW
+    assert all(h["score"] is None for h in rest)
+    # la ventana son las coincidencias filtradas mas nuevas, por relevancia
+    assert min(h["id"] for h in ranked) > max(h["id"] for h in rest)
+    scores = [h["score"] for h in ranked]
+    assert scores == sorted(scores, reverse=True)
+    assert [h["id"] for h in rest] == sorted((h["id"] for h in rest), reverse=True)
+
+
+def test_search_smaller_than_window(app, user, monkeypatch):
+    monkeypatch.setitem(app.config, "SEARCH_RANK_WINDOW", WINDOW)
+    ids = {user.add(5, "expense", "Food", "2024-03-01", f"cafe {i}") for i in range(WINDOW - 3)}
+    user.add(5, "income", "Food", "2024-03-01", "cafe ingreso")
+
+    hits = _search(user, {"q": "caf", "type": "expense"}, 3)
+    assert {h["id"] for h in hits} == ids
+    assert all(h["score"] is not None for h in hits)
@@ -0,0 +1,93 @@
+import sqlite3
+from contextlib import closing
+
+import init_db
+import rollups
+import shards
+
+
+def _connect(database, shard):
+    conn = sqlite3.connect(shards.shard_path(database, shard))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_move_user_with_deleted_category(tmp_path):
+    database = str(tmp_path / "cashflow.db")
+    init_db.init_db(database, shards=2)
+    with closing(sqlite3.connect(database)) as directory, directory:
+        mover = directory.execute("INSERT INTO users (username, hash) VALUES ('a', 'x')").lastrowid
+        other = directory.execute("INSERT INTO users (username, hash) VALUES ('b', 'x')").lastrowid
+        directory.execute("INSERT INTO shard_map VALUES (?, 0), (?, 1)", (mover, other))
+
+    with closing(_connect(database, 0)) as conn, conn:
+        food = conn.execute("INSERT INTO categories (user_id, name) VALUES (?, 'Food')", (mover,)).lastrowid
+        gone = conn.execute("INSERT INTO categories (user_id, name) VALUES (?, 'Gone')", (mover,)).lastrowid
+        conn.executemany(
+            "INSERT INTO transactions (user_id, category_id, amount_minor, type, date) VALUES (?, ?, ?, 'expense', ?)",
+            [(mover, food, 100, "2024-01-05"), (mover, gone, 250, "2024-01-06"), (mover, gone, 50, "2024-02-01")],
+        )
+        conn.execute(
+            "INSERT INTO recurring_rules (user_id, category_id, amount_minor, type, description, frequency, start_date) "
+            "VALUES (?, ?, 10, 'expense', 'gym', 'monthly', '2024-01-01')",
+            (mover, gone),
+        )
+        conn.execute("DELETE FROM categories WHERE id = ?", (gone,))
+        # presupuesto de una categoria borrada (anterior al trigger de 0010)
+        conn.execute(
+            "INSERT INTO budgets (user_id, category_id, year_month, amount_minor) VALUES (?, ?, '', 500)",
+            (mover, gone),
+        )
+
+    # en el destino el id viejo de 'Gone' es una categoria de otro usuario
+    with closing(_connect(database, 1)) as conn, conn:
+        conn.execute("INSERT INTO categories (id, user_id, name) VALUES (?, ?, 'Secret')", (gone, other))
+
+    shards.move_user(database, mover, 1, 2)
+
+    with closing(_connect(database, 1)) as conn:
+        rows = conn.execute(
+            """
+            SELECT c.user_id, c.name, t.amount_minor
+            FROM transactions t JOIN categories c ON c.id = t.category_id
+            WHERE t.user_id = ?
+            ORDER BY t.id
+            """,
+            (mover,),
+        ).fetchall()
+        assert [tuple(r) for r in rows] == [
+            (mover, "Food", 100),
+            (mover, shards.ORPHAN_CATEGORY, 250),
+            (mover, shards.ORPHAN_CATEGORY, 50),
+        ]
+        rule = conn.execute(
+            "SELECT c.user_id, c.name FROM recurring_rules r JOIN categories c ON c.id = r.category_id "
+            "WHERE r.user_id = ?",
+            (mover,),
+        ).fetchone()
+        assert tuple(rule) == (mover, shards.ORPHAN_CATEGORY)
+        assert conn.execute("SELECT COUNT(*) FROM budgets WHERE user_id = ?", (mover,)).fetchone()[0] == 0
+        assert rollups.verify(conn) == []
+
+    with closing(_connect(database, 0)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions WHERE user_id = ?", (mover,)).fetchone()[0] == 0
+
+
+def test_move_user_without_orphans(tmp_path):
+    database = str(tmp_path / "cashflow.db")
+    init_db.init_db(database, shards=2)
+    with closing(sqlite3.connect(database)) as directory, directory:
+        user_id = directory.execute("INSERT INTO users (username, hash) VALUES ('a', 'x')").lastrowid
+
+    with closing(_connect(database, 0)) as conn, conn:
+        food = conn.execute("INSERT INTO categories (user_id, name) VALUES (?, 'Food')", (user_id,)).lastrowid
+        conn.execute(
+            "INSERT INTO transactions (user_id, category_id, amount_minor, type, date) VALUES (?, ?, 100, 'expense', '2024-01-05')",
+            (user_id, food),
+        )
+
+    shards.move_user(database, user_id, 1, 2)
+
+    with closing(_connect(database, 1)) as conn:
+        names = [r[0] for r in conn.execute("SELECT name FROM categories WHERE user_id = ?", (user_id,))]
+        assert names == ["Food"]
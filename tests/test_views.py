@@ -0,0 +1,33 @@
+from contextlib import closing
+
+import pytest
+
+
+@pytest.mark.parametrize("value", ["2024-13-01", "ayer", "2024-02-30"])
+def test_invalid_form_date_is_rejected_before_writing(user, value):
+    user.add(10, "expense", "Food", "2024-01-05")
+    food = user.category_id("Food")
+    form = {"type": "expense", "amount": "5", "date": value, "category_id": str(food)}
+
+    response = user.client.post("/add", data=form)
+    assert response.status_code == 400
+    with closing(user.db()) as conn:
+        tx_id, stored = conn.execute(
+            "SELECT id, date FROM transactions WHERE user_id = ?", (user.id,)
+        ).fetchone()
+
+    response = user.client.post(f"/transactions/{tx_id}/edit", data=form)
+    assert response.status_code == 400
+    with closing(user.db()) as conn:
+        rows = conn.execute("SELECT date FROM transactions WHERE user_id = ?", (user.id,)).fetchall()
+    assert [r[0] for r in rows] == [stored]
+
+
+def test_form_date_is_stored_as_iso(user):
+    user.add(10, "expense", "Food", "2024-01-05")
+    food = user.category_id("Food")
+    form = {"type": "expense", "amount": "5", "date": "20240301", "category_id": str(food)}
+    assert user.client.post("/add", data=form).status_code == 302
+    with closing(user.db()) as conn:
+        dates = sorted(r[0] for r in conn.execute("SELECT date FROM transactions WHERE user_id = ?", (user.id,)))
+    assert dates == ["2024-01-05", "2024-03-01"]
@@ -0,0 +1,80 @@
+import sqlite3
+from concurrent.futures import Future
+
+import pytest
+
+import write_queue
+from db import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    database = str(tmp_path / "queue.db")
+    conn = sqlite3.connect(database)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY AUTOINCREMENT, x BLOB)")
+    conn.commit()
+    conn.close()
+    pool = ConnectionPool(database, 1)
+    yield pool
+    pool.close_all()
+
+
+def _rows(pool):
+    conn = sqlite3.connect(pool.database)
+    try:
+        return [r[0] for r in conn.execute("SELECT id FROM t ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_group_lost_by_sqlite_is_not_confirmed(pool):
+    conn = pool.acquire()
+    # con la base llena SQLite deshace toda la transaccion, no solo la sentencia
+    conn.execute("PRAGMA max_page_count = 3")
+    pool.release(conn)
+
+    writer = write_queue.GroupWriter(pool, max_batch=8, max_delay=0.5, queue_size=8)
+    first = writer.submit("INSERT INTO t (x) VALUES (1)", ())
+    full = writer.submit("INSERT INTO t (x) VALUES (?)", (b"x" * 100000,))
+    after = writer.submit("INSERT INTO t (x) VALUES (2)", ())
+    writer.close()
+
+    with pytest.raises(sqlite3.OperationalError):
+        first.result()
+    with pytest.raises(sqlite3.OperationalError):
+        full.result()
+    assert _rows(pool) == [after.result()]
+    assert writer.stats()["failed"] == 1
+
+
+def test_timed_out_insert_is_cancelled(app, pool, monkeypatch):
+    writer = write_queue.GroupWriter(pool, max_batch=8, max_delay=0.001, queue_size=8)
+    monkeypatch.setattr(write_queue, "get_writer", lambda database: writer)
+    monkeypatch.setitem(app.config, "WRITE_QUEUE", True)
+    monkeypatch.setitem(app.config, "WRITE_QUEUE_TIMEOUT", 0.1)
+
+    # el writer queda esperando la unica conexion del pool
+    conn = pool.acquire()
+    with app.app_context():
+        with pytest.raises(write_queue.WriteQueueBusy):
+            write_queue.insert(1, "INSERT INTO t (x) VALUES (1)", ())
+    pool.release(conn)
+    writer.close()
+
+    assert _rows(pool) == []
+
+
+def test_running_insert_is_awaited(app, monkeypatch):
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    class Running:
+        def submit(self, sql, params):
+            return future
+
+    monkeypatch.setattr(write_queue, "get_writer", lambda database: Running())
+    monkeypatch.setitem(app.config, "WRITE_QUEUE", True)
+    monkeypatch.setitem(app.config, "WRITE_QUEUE_TIMEOUT", 0.01)
+    with app.app_context():
+        future.set_result(42)
+        assert write_queue.insert(1, "INSERT INTO t (x) VALUES (1)", ()) == 42
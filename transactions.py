@@ -0,0 +1,213 @@
+import base64
+import binascii
+from datetime import date
+
+import analytics
+import category_cache
+import money
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class ListingError(ValueError):
+    """Filtros o cursor invalidos (se responde 400)."""
+
+
+class InvalidTransaction(ValueError):
+    """Datos de una transaccion que no pasan la validacion."""
+
+
+def validate_input(tx, exponent=money.DEFAULT_EXPONENT):
+    """Completa un schemas.TransactionIn ya decodificado.
+
+    msgspec valida tipos y el formato de fecha al decodificar; aca quedan
+    las reglas que dependen del valor. Devuelve
+    (amount_minor, type, description, category_name, date_str).
+    """
+    try:
+        amount_minor = money.parse_amount(tx.amount, exponent)
+    except money.InvalidAmount as e:
+        raise InvalidTransaction(str(e))
+
+    category_name = tx.category.strip()
+    if not category_name:
+        raise InvalidTransaction("Categoría requerida")
+
+    date_str = (tx.date or date.today()).isoformat()
+    return amount_minor, tx.type, tx.description or "", category_name, date_str
+
+
+def encode_cursor(date_str, tx_id):
+    raw = f"{date_str}|{tx_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, tx_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return date_str, int(tx_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ListingError("Cursor inválido")
+
+
+def parse_filters(args, db, user_id):
+    """Valida los filtros de query string comunes a listado y totales."""
+    type_ = args.get("type")
+    if type_ and type_ not in ("income", "expense"):
+        raise ListingError("Tipo debe ser 'income' o 'expense'")
+
+    category_id = args.get("category_id")
+    category_name = (args.get("category") or "").strip()
+    if category_id:
+        try:
+            category_id = int(category_id)
+        except ValueError:
+            raise ListingError("category_id inválido")
+    elif category_name:
+        category_id = category_cache.id_for_name(db, user_id, category_name)
+        # categoria inexistente: filtro que no matchea nada
+        if category_id is None:
+            category_id = -1
+    else:
+        category_id = None
+
+    try:
+        _, start, end = analytics.resolve_range(
+            "all", args.get("start"), args.get("end")
+        )
+    except analytics.AnalyticsError as e:
+        raise ListingError(str(e))
+
+    return {"type": type_, "category_id": category_id, "start": start, "end": end}
+
+
+def parse_limit(raw, max_size=MAX_PAGE_SIZE):
+    if raw in (None, ""):
+        return min(DEFAULT_PAGE_SIZE, max_size)
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ListingError("limit inválido")
+    if limit < 1:
+        raise ListingError("limit debe ser mayor a 0")
+    return min(limit, max_size)
+
+
+def fetch_page(db, user_id, filters, cursor=None, limit=DEFAULT_PAGE_SIZE,
+               exponent=money.DEFAULT_EXPONENT):
+    """Pagina por keyset sobre (date, id) DESC usando el indice (user_id, date, id).
+
+    El cursor baja el limite superior de fecha, asi que paginas profundas
+    cuestan lo mismo que la primera (a diferencia de OFFSET).
+    Devuelve (filas, next_cursor | None).
+    """
+    upper = filters["end"].isoformat()
+    where = ["t.user_id = ?", "t.date >= ?"]
+    params = [user_id, filters["start"].isoformat()]
+
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        upper = min(upper, cursor_date)
+        where.append("(t.date < ? OR t.id < ?)")
+        params.extend([cursor_date, cursor_id])
+
+    where.append("t.date <= ?")
+    params.append(upper)
+
+    if filters["type"]:
+        where.append("t.type = ?")
+        params.append(filters["type"])
+    if filters["category_id"] is not None:
+        where.append("t.category_id = ?")
+        params.append(filters["category_id"])
+
+    rows = db.execute(
+        f"""
+        SELECT t.id,
+               t.amount_minor / ? AS amount,
+               t.type,
+               t.description,
+               t.date,
+               c.name AS category
+        FROM transactions t
+        JOIN categories c ON t.category_id = c.id
+        WHERE {" AND ".join(where)}
+        ORDER BY t.date DESC, t.id DESC
+        LIMIT ?
+        """,
+        [money.divisor(exponent)] + params + [limit + 1],
+    ).fetchall()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(last["date"], last["id"])
+    return rows, None
+
+
+def totals(db, user_id, filters, exponent=money.DEFAULT_EXPONENT):
+    """Totales de todo el filtro (no de la pagina), via monthly_rollups + bordes.
+
+    Se suman enteros (unidades minimas) y se convierten al final.
+    """
+    rows = analytics.aggregate(
+        db,
+        user_id,
+        filters["start"],
+        filters["end"],
+        group_by="type",
+        category_id=filters["category_id"],
+    )
+    income = sum(r["income"] for r in rows)
+    expense = sum(r["expense"] for r in rows)
+    count = sum(r["count"] for r in rows)
+
+    if filters["type"] == "income":
+        expense = 0
+        count = sum(r["count"] for r in rows if r["key"] == "income")
+    elif filters["type"] == "expense":
+        income = 0
+        count = sum(r["count"] for r in rows if r["key"] == "expense")
+
+    return {
+        "income": money.to_major(income, exponent),
+        "expense": money.to_major(expense, exponent),
+        "balance": money.to_major(income - expense, exponent),
+        "count": count,
+    }
+
+
+EXPORT_FIELDS = ("id", "date", "type", "amount", "category", "description")
+
+
+def iter_export(db, user_id, start, end, batch_size=1000, exponent=money.DEFAULT_EXPONENT):
+    """Recorre las transacciones del rango en orden cronologico, de a lotes.
+
+    Usa fetchmany para que la memoria no dependa de la cantidad de filas.
+    """
+    cursor = db.execute(
+        """
+        SELECT t.id,
+               t.date,
+               t.type,
+               t.amount_minor / ? AS amount,
+               c.name AS category,
+               t.description
+        FROM transactions t
+        JOIN categories c ON t.category_id = c.id
+        WHERE t.user_id = ?
+          AND t.date BETWEEN ? AND ?
+        ORDER BY t.date, t.id
+        """,
+        (money.divisor(exponent), user_id, start.isoformat(), end.isoformat()),
+    )
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
@@ -1,27 +1,176 @@
-from flask import Blueprint, render_template, request, redirect, session,url_for
-from datetime import datetime
-from db import get_db
+from flask import Blueprint, Response, current_app, render_template, request, redirect, session, stream_template, url_for
+from datetime import date, datetime, timedelta
+from db import get_db, get_read_db
+import budgets
+import category_cache
+import columnar
+import money
+import recurring
+import rollups
+import search
+import transactions
+import write_queue
 
 views_bp = Blueprint("views", __name__)
 
+DEFAULTS = {
+    "INDEX_FETCH_SIZE": 200,       # filas por fetchmany al transmitir el mes
+    "INDEX_FLUSH_BYTES": 16384,    # HTML acumulado antes de mandar un bloque
+    "INDEX_PAGE_SIZE": 0,          # >0: primeras N filas y boton "Cargar mas"
+}
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULTS[key])
+
+
+def _form_date(value):
+    """Fecha del formulario como YYYY-MM-DD, o None si no es valida.
+
+    Se valida antes de escribir: rollups, rangos por mes y columnar leen
+    la fecha como texto ISO.
+    """
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        return None
+
 
 
 @views_bp.route("/")
 def index():
-    db = get_db()
     user_id = session.get("user_id")
     if not user_id:
         return redirect("/login")
-    from datetime import datetime
+    db = get_read_db(user_id)
+    try:
+        year, month, month_start, next_month = _parse_month(request.args)
+    except ValueError:
+        return "Mes inválido", 400
+
+    exponent = money.get_exponent(user_id)
+    total_income, total_expense = rollups.type_totals(
+        db, user_id, month_start.strftime("%Y-%m")
+    )
+    # ocurrencias de reglas recurrentes del mes (tambien de meses futuros)
+    month_end = next_month - timedelta(days=1)
+    schedule = recurring.load(db, user_id, month_start, month_end)
+    rule_income, rule_expense, rule_count = schedule.totals(month_start, month_end)
+    total_income += rule_income
+    total_expense += rule_expense
+    balance = total_income - total_expense
+
+    page_size = _config("INDEX_PAGE_SIZE")
+    if page_size:
+        try:
+            rows, next_cursor = _month_page(
+                db, user_id, month_start, next_month, request.args.get("cursor"),
+                page_size, schedule,
+            )
+        except transactions.ListingError as e:
+            return str(e), 400
+        has_rows = bool(rows)
+    else:
+        # el mes completo, de a INDEX_FETCH_SIZE filas: el encabezado con los
+        # totales sale antes de leer el resto y la memoria no crece con el mes
+        cursor = _month_cursor(db, user_id, month_start, next_month)
+        first = cursor.fetchmany(_config("INDEX_FETCH_SIZE"))
+        rows = _iter_rows(first, cursor, _config("INDEX_FETCH_SIZE"))
+        if schedule:
+            rows = recurring.merge(
+                rows, schedule.expand(month_start, month_end, reverse=True), reverse=True
+            )
+        has_rows = bool(first) or rule_count > 0
+        next_cursor = None
+
+    stream = stream_template(
+        "index.html",
+        rows=rows,
+        has_rows=has_rows,
+        next_cursor=next_cursor,
+        total_income=total_income,
+        total_expense=total_expense,
+        balance=balance,
+        year=year,
+        month=month,
+        exponent=exponent,
+        budgets=budgets.status(db, user_id, month_start.strftime("%Y-%m")),
+    )
+    return Response(_buffered(stream, _config("INDEX_FLUSH_BYTES")), mimetype="text/html")
+
+
+@views_bp.route("/transactions/rows")
+def transaction_rows():
+    """Filas siguientes del mes para el boton "Cargar mas" (INDEX_PAGE_SIZE > 0)."""
+    user_id = session.get("user_id")
+    if not user_id:
+        return redirect("/login")
+    db = get_read_db(user_id)
+    try:
+        _, _, month_start, next_month = _parse_month(request.args)
+        schedule = recurring.load(db, user_id, month_start, next_month - timedelta(days=1))
+        rows, next_cursor = _month_page(
+            db, user_id, month_start, next_month, request.args.get("cursor"),
+            _config("INDEX_PAGE_SIZE") or transactions.DEFAULT_PAGE_SIZE,
+            schedule,
+        )
+    except transactions.ListingError as e:
+        return str(e), 400
+    except ValueError:
+        return "Mes inválido", 400
+
+    response = current_app.make_response(render_template(
+        "transaction_rows.html", rows=rows, exponent=money.get_exponent(user_id)
+    ))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+@views_bp.route("/search")
+def search_transactions():
+    user_id = session.get("user_id")
+    if not user_id:
+        return redirect("/login")
+    db = get_read_db(user_id)
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return redirect(url_for("views.index"))
+
+    try:
+        filters = transactions.parse_filters(request.args, db, user_id)
+        rows, next_cursor = search.search(
+            db, user_id, query, filters, request.args.get("cursor"),
+            transactions.DEFAULT_PAGE_SIZE,
+            current_app.config.get("SEARCH_RANK_WINDOW", search.RANK_WINDOW),
+        )
+    except transactions.ListingError as e:
+        return str(e), 400
+
+    return render_template(
+        "search.html",
+        query=query,
+        rows=rows,
+        next_cursor=next_cursor,
+        exponent=money.get_exponent(user_id),
+    )
+
+
+def _parse_month(args):
+    """(year, month, inicio de mes, inicio del mes siguiente); ValueError si no es valido."""
     today = datetime.today()
-    year = int(request.args.get("year") or today.year)
-    month = int(request.args.get("month") or today.month)
+    year = int(args.get("year") or today.year)
+    month = int(args.get("month") or today.month)
+    if not 1 <= month <= 12:
+        raise ValueError("Mes inválido")
+    # rango [inicio de mes, inicio del mes siguiente) para usar el indice (user_id, date)
+    return year, month, date(year, month, 1), date(year + month // 12, month % 12 + 1, 1)
 
-    rows = db.execute(
-    """
+
+_MONTH_ROWS = """
     SELECT
         t.id,
-        t.amount,
+        t.amount_minor,
         t.type,
         t.description,
         t.date,
@@ -30,35 +179,87 @@ def index():
     JOIN categories c
       ON t.category_id = c.id
     WHERE t.user_id = ?
-      AND strftime('%Y', t.date) = ?
-      AND strftime('%m', t.date) = ?
+      AND t.date >= ?
+      AND t.date < ?
+      {keyset}
     ORDER BY t.date DESC, t.id DESC
-    """,
-    (user_id, f"{year:04d}", f"{month:02d}"),
-).fetchall()
+    {limit}
+"""
 
 
-    total_income = sum(r["amount"] for r in rows if r["type"] == "income")
-    total_expense = sum(r["amount"] for r in rows if r["type"] == "expense")
-    balance = total_income - total_expense
+def _month_cursor(db, user_id, month_start, next_month):
+    return db.execute(
+        _MONTH_ROWS.format(keyset="", limit=""),
+        (user_id, month_start.isoformat(), next_month.isoformat()),
+    )
 
-    return render_template(
-        "index.html",
-        rows=rows,
-        total_income=total_income,
-        total_expense=total_expense,
-        balance=balance,
-        year=year,
-        month=month,
+
+def _month_page(db, user_id, month_start, next_month, cursor, limit, schedule):
+    """Hasta `limit` filas del mes despues de `cursor` (keyset sobre date, id).
+
+    El cursor solo avanza sobre transacciones reales. Cada ocurrencia de
+    `schedule` va en la pagina de la ultima fila real con fecha >= la suya
+    (las mas nuevas que todas, en la primera).
+    """
+    params = [user_id, month_start.isoformat(), next_month.isoformat()]
+    keyset = ""
+    if cursor:
+        cursor_date, cursor_id = transactions.decode_cursor(cursor)
+        keyset = "AND (t.date < ? OR (t.date = ? AND t.id < ?))"
+        params.extend([cursor_date, cursor_date, cursor_id])
+
+    rows = db.execute(
+        _MONTH_ROWS.format(keyset=keyset, limit="LIMIT ?"), params + [limit + 1]
+    ).fetchall()
+    following = rows[limit]["date"] if len(rows) > limit else None
+    rows = rows[:limit]
+    next_cursor = (
+        transactions.encode_cursor(rows[-1]["date"], rows[-1]["id"]) if following else None
     )
 
+    if schedule and (rows or not cursor):
+        upper = rows[0]["date"] if cursor else None
+        start = date.fromisoformat(following[:10]) if following else month_start
+        end = date.fromisoformat(upper[:10]) if upper else next_month - timedelta(days=1)
+        projected = [
+            o for o in schedule.expand(start, end, reverse=True)
+            if (upper is None or o["date"] <= upper)
+            and (following is None or o["date"] > following)
+        ]
+        rows = list(recurring.merge(rows, projected, reverse=True))
+    return rows, next_cursor
+
+
+def _iter_rows(first, cursor, size):
+    yield from first
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def _buffered(chunks, size):
+    """Junta los fragmentos de Jinja (uno por expresion) en bloques de ~`size` bytes."""
+    buf = []
+    buffered = 0
+    for chunk in chunks:
+        buf.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield "".join(buf)
+            buf = []
+            buffered = 0
+    if buf:
+        yield "".join(buf)
+
 @views_bp.route("/add", methods=["GET", "POST"])
 def add():
     user_id = session.get("user_id")
     if not user_id:
         return redirect("/login")
 
-    db = get_db()
+    db = get_read_db(user_id)
 
     if request.method == "POST":
         type_ = request.form.get("type")         
@@ -72,48 +273,45 @@ def add():
             return "Tipo inválido", 400
 
         try:
-            amount = float(amount_raw)
-            if amount <= 0:
-                raise ValueError
-        except (TypeError, ValueError):
-            return "Monto inválido", 400
+            amount_minor = money.parse_amount(amount_raw, money.get_exponent(user_id))
+        except money.InvalidAmount as e:
+            return str(e), 400
 
         if not date_str:
             return "Fecha requerida", 400
+        date_str = _form_date(date_str)
+        if date_str is None:
+            return "Fecha inválida, use YYYY-MM-DD", 400
 
         if not category_id:
             return "Categoría requerida", 400
 
         
-        cat = db.execute(
-            "SELECT id FROM categories WHERE id = ? AND user_id = ?",
-            (category_id, user_id),
-        ).fetchone()
-        if not cat:
+        if not category_cache.owns(db, user_id, category_id):
             return "Categoría inválida", 400
 
-        db.execute(
+        transaction_id = write_queue.insert(
+            user_id,
             """
-            INSERT INTO transactions (user_id, category_id, amount, type, description, date)
+            INSERT INTO transactions (user_id, category_id, amount_minor, type, description, date)
             VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (user_id, category_id, amount, type_, description, date_str),
+            (user_id, category_id, amount_minor, type_, description, date_str),
         )
-        db.commit()
+        columnar.record(user_id, transaction_id, category_id, amount_minor, type_, date_str)
 
         return redirect("/")
 
     
-    categories = db.execute(
-        "SELECT id, name FROM categories WHERE user_id = ? ORDER BY name",
-        (user_id,),
-    ).fetchall()
+    categories = category_cache.get_categories(db, user_id).sorted
 
     if not categories:
        
         return redirect("/categories")
 
-    return render_template("add.html", categories=categories)
+    return render_template(
+        "add.html", categories=categories, exponent=money.get_exponent(user_id)
+    )
 
 
 @views_bp.route("/transactions/<int:tx_id>/delete", methods=["POST"])
@@ -122,7 +320,7 @@ def delete_transaction(tx_id):
     if not user_id:
         return redirect(url_for("auth.login"))
 
-    db = get_db()
+    db = get_db(user_id)
 
     # me aseguro de que la transacción es del usuario logueado
     tx = db.execute(
@@ -138,6 +336,7 @@ def delete_transaction(tx_id):
         (tx_id, user_id),
     )
     db.commit()
+    columnar.forget(user_id, tx_id)
 
     return redirect(url_for("views.index"))
 
@@ -148,12 +347,12 @@ def edit_transaction(tx_id):
     if not user_id:
         return redirect(url_for("auth.login"))
 
-    db = get_db()
+    db = get_db(user_id)
 
     # traigo la transaccion, verifico que sea del usuario
     tx = db.execute(
         """
-        SELECT id, user_id, category_id, amount, type, description, date
+        SELECT id, user_id, category_id, amount_minor, type, description, date
         FROM transactions
         WHERE id = ? AND user_id = ?
         """,
@@ -165,10 +364,7 @@ def edit_transaction(tx_id):
         return redirect(url_for("views.index"))
 
     
-    categories = db.execute(
-        "SELECT id, name FROM categories WHERE user_id = ? ORDER BY name",
-        (user_id,),
-    ).fetchall()
+    categories = category_cache.get_categories(db, user_id).sorted
 
     if request.method == "POST":
         type_ = request.form.get("type")
@@ -181,40 +377,131 @@ def edit_transaction(tx_id):
             return "Tipo inválido", 400
 
         try:
-            amount = float(amount_raw)
-            if amount <= 0:
-                raise ValueError
-        except (TypeError, ValueError):
-            return "Monto inválido", 400
+            amount_minor = money.parse_amount(amount_raw, money.get_exponent(user_id))
+        except money.InvalidAmount as e:
+            return str(e), 400
 
         if not date_str:
             return "Fecha requerida", 400
+        date_str = _form_date(date_str)
+        if date_str is None:
+            return "Fecha inválida, use YYYY-MM-DD", 400
 
         if not category_id:
             return "Categoría requerida", 400
 
         # chequear que la categoría sea del usuario
-        cat = db.execute(
-            "SELECT id FROM categories WHERE id = ? AND user_id = ?",
-            (category_id, user_id),
-        ).fetchone()
-        if not cat:
+        if not category_cache.owns(db, user_id, category_id):
             return "Categoría inválida", 400
 
         db.execute(
             """
             UPDATE transactions
-            SET category_id = ?, amount = ?, type = ?, description = ?, date = ?
+            SET category_id = ?, amount_minor = ?, type = ?, description = ?, date = ?
             WHERE id = ? AND user_id = ?
             """,
-            (category_id, amount, type_, description, date_str, tx_id, user_id),
+            (category_id, amount_minor, type_, description, date_str, tx_id, user_id),
         )
         db.commit()
+        columnar.record(user_id, tx_id, category_id, amount_minor, type_, date_str)
 
         return redirect(url_for("views.index"))
 
     
-    return render_template("edit.html", tx=tx, categories=categories)
+    return render_template(
+        "edit.html", tx=tx, categories=categories, exponent=money.get_exponent(user_id)
+    )
+
+@views_bp.route("/recurring/<int:rule_id>/<day>/edit", methods=["GET", "POST"])
+def edit_occurrence(rule_id, day):
+    """Editar una ocurrencia de una regla la guarda como transaccion real."""
+    user_id = session.get("user_id")
+    if not user_id:
+        return redirect(url_for("auth.login"))
+
+    db = get_db(user_id)
+
+    rule = recurring.get_rule(db, user_id, rule_id)
+    if not rule:
+        return redirect(url_for("views.index"))
+
+    try:
+        occurrence = recurring.parse_occurrence(rule, day)
+    except recurring.RecurringError as e:
+        return str(e), 400
+
+    categories = category_cache.get_categories(db, user_id).sorted
+
+    if request.method == "POST":
+        type_ = request.form.get("type")
+        amount_raw = request.form.get("amount")
+        description = request.form.get("description") or ""
+        date_str = request.form.get("date")
+        category_id = request.form.get("category_id")
+
+        if type_ not in ("income", "expense"):
+            return "Tipo inválido", 400
+
+        try:
+            amount_minor = money.parse_amount(amount_raw, money.get_exponent(user_id))
+        except money.InvalidAmount as e:
+            return str(e), 400
+
+        if not date_str:
+            return "Fecha requerida", 400
+        date_str = _form_date(date_str)
+        if date_str is None:
+            return "Fecha inválida, use YYYY-MM-DD", 400
+
+        if not category_id:
+            return "Categoría requerida", 400
+
+        if not category_cache.owns(db, user_id, category_id):
+            return "Categoría inválida", 400
+
+        try:
+            recurring.materialize(
+                db, user_id, rule_id, occurrence,
+                category_id, amount_minor, type_, description, date_str,
+            )
+        except recurring.RecurringError as e:
+            return str(e), 400
+
+        return redirect(url_for("views.index", year=occurrence.year, month=occurrence.month))
+
+    # el formulario arranca con los datos de la regla y la fecha de la ocurrencia
+    tx = {
+        "amount_minor": rule["amount_minor"],
+        "date": occurrence.isoformat(),
+        "category_id": rule["category_id"],
+        "description": rule["description"],
+        "type": rule["type"],
+    }
+    return render_template(
+        "edit.html", tx=tx, categories=categories, exponent=money.get_exponent(user_id)
+    )
+
+
+@views_bp.route("/recurring/<int:rule_id>/<day>/delete", methods=["POST"])
+def delete_occurrence(rule_id, day):
+    user_id = session.get("user_id")
+    if not user_id:
+        return redirect(url_for("auth.login"))
+
+    db = get_db(user_id)
+
+    rule = recurring.get_rule(db, user_id, rule_id)
+    if not rule:
+        return redirect(url_for("views.index"))
+
+    try:
+        occurrence = recurring.parse_occurrence(rule, day)
+    except recurring.RecurringError as e:
+        return str(e), 400
+
+    recurring.skip(db, user_id, rule_id, occurrence)
+
+    return redirect(url_for("views.index", year=occurrence.year, month=occurrence.month))
 
 @views_bp.route("/categories", methods=["GET", "POST"])
 def categories():
@@ -222,7 +509,7 @@ def categories():
     if not user_id:
         return redirect("/login")
 
-    db = get_db()
+    db = get_db(user_id)
 
     if request.method == "POST":
         action = request.form.get("action")
@@ -234,11 +521,7 @@ def categories():
                 return "Nombre de categoría requerido", 400
 
             # evitar duplicados por usuario
-            existing = db.execute(
-                "SELECT id FROM categories WHERE user_id = ? AND name = ?",
-                (user_id, name),
-            ).fetchone()
-            if existing:
+            if category_cache.id_for_name(db, user_id, name) is not None:
                 return "La categoría ya existe", 400
 
             db.execute(
@@ -246,6 +529,7 @@ def categories():
                 (user_id, name),
             )
             db.commit()
+            category_cache.invalidate(user_id)
             return redirect("/categories")
 
         # eliminar categoría
@@ -259,13 +543,11 @@ def categories():
                 (cat_id, user_id),
             )
             db.commit()
+            category_cache.invalidate(user_id)
             return redirect("/categories")
 
     # GET: listar categorias
-    rows = db.execute(
-        "SELECT id, name FROM categories WHERE user_id = ? ORDER BY name",
-        (user_id,),
-    ).fetchall()
+    rows = category_cache.get_categories(db, user_id).sorted
 
     return render_template("categories.html", categories=rows)
 
@@ -275,25 +557,16 @@ def summary():
     if not user_id:
         return redirect("/login")
 
-    db = get_db()
+    db = get_read_db(user_id)
 
-    income = db.execute(
-        """
-        SELECT SUM(amount) as total_income
-        FROM transactions
-        WHERE user_id = ? AND type = 'income'
-        """,
-        (user_id,),
-    ).fetchone()["total_income"] or 0
-
-    expense = db.execute(
-        """
-        SELECT SUM(amount) as total_expense
-        FROM transactions
-        WHERE user_id = ? AND type = 'expense'
-        """,
-        (user_id,),
-    ).fetchone()["total_expense"] or 0
+    income, expense = rollups.type_totals(db, user_id)
+    # como /api/summary: de las reglas recurrentes, lo ocurrido hasta hoy
+    today = date.today()
+    rule_income, rule_expense, _ = recurring.load(db, user_id, date.min, today).totals(
+        date.min, today
+    )
+    income += rule_income
+    expense += rule_expense
 
     balance = income - expense
 
@@ -302,4 +575,5 @@ def summary():
         income=income,
         expense=expense,
         balance=balance,
+        exponent=money.get_exponent(user_id),
     )
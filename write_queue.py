@@ -0,0 +1,220 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from time import perf_counter
+
+from flask import current_app
+
+from db import get_db, get_pool, user_database
+
+DEFAULTS = {
+    "WRITE_QUEUE": False,             # True: los INSERT de transacciones van por el writer
+    "WRITE_QUEUE_MAX_BATCH": 256,     # inserts por commit
+    "WRITE_QUEUE_MAX_DELAY_MS": 2.0,  # espera maxima para juntar un grupo
+    "WRITE_QUEUE_SIZE": 4096,         # pendientes antes de rechazar (503)
+    "WRITE_QUEUE_TIMEOUT": 10.0,      # segundos esperando el commit del grupo
+}
+
+_LATENCY_SAMPLES = 1024
+
+
+class WriteQueueBusy(RuntimeError):
+    """Cola de escritura llena o commit demorado (se responde 503)."""
+
+
+def _config(key):
+    return current_app.config.get(key, DEFAULTS[key])
+
+
+class GroupWriter:
+    """Un thread que escribe en un archivo SQLite juntando inserts en un solo commit.
+
+    Las requests encolan (sql, params) y esperan un Future que se resuelve
+    con el lastrowid cuando el commit de su grupo termino. El grupo se cierra
+    al llegar a max_batch o a max_delay desde el primer pedido, asi que con
+    poca carga cada insert espera a lo sumo unos milisegundos.
+    """
+
+    def __init__(self, pool, max_batch, max_delay, queue_size):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._commit_ms = deque(maxlen=_LATENCY_SAMPLES)
+        self._batches = 0
+        self._items = 0
+        self._failed = 0
+        self._rejected = 0
+        self._max_batch_seen = 0
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql, params):
+        future = Future()
+        try:
+            self._queue.put_nowait((sql, params, future))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise WriteQueueBusy("Demasiadas escrituras pendientes, intente de nuevo")
+        return future
+
+    def _collect(self):
+        """(grupo, cerrar): cerrar es True si llego el None de close()."""
+        item = self._queue.get()
+        if item is None:
+            return [], True
+        batch = [item]
+        deadline = perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - perf_counter()
+            try:
+                if remaining > 0:
+                    item = self._queue.get(timeout=remaining)
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, closing = self._collect()
+            if batch:
+                self._write(batch)
+            if closing:
+                return
+
+    def _write(self, batch):
+        try:
+            conn = self.pool.acquire()
+        except Exception as e:
+            for _, _, future in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        done = []
+        try:
+            for sql, params, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # un error de constraint deshace solo esta sentencia, no el grupo
+                    done.append((future, conn.execute(sql, params).lastrowid))
+                except Exception as e:
+                    future.set_exception(e)
+                    if done and not conn.in_transaction:
+                        # FULL, IOERR, BUSY...: SQLite deshizo toda la transaccion,
+                        # los anteriores del grupo ya no estan y no hay que confirmarlos
+                        with self._lock:
+                            self._failed += len(done)
+                        for lost, _ in done:
+                            lost.set_exception(e)
+                        done = []
+
+            started = perf_counter()
+            conn.commit()
+            commit_ms = (perf_counter() - started) * 1000
+        except Exception as e:
+            try:
+                conn.rollback()
+            finally:
+                self.pool.release(conn)
+            with self._lock:
+                self._failed += len(done)
+            for future, _ in done:
+                future.set_exception(e)
+            return
+
+        self.pool.release(conn)
+        with self._lock:
+            self._batches += 1
+            self._items += len(done)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._commit_ms.append(commit_ms)
+        for future, rowid in done:
+            future.set_result(rowid)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._commit_ms)
+            return {
+                "database": self.pool.database,
+                "pending": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_batch": self._max_batch_seen,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "commit_p50_ms": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                "commit_max_ms": round(latencies[-1], 3) if latencies else 0.0,
+            }
+
+    def close(self):
+        """Termina de escribir lo encolado y para el thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(database):
+    writer = _writers.get(database)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(database)
+            if writer is None:
+                writer = GroupWriter(
+                    get_pool(readonly=False, database=database),
+                    _config("WRITE_QUEUE_MAX_BATCH"),
+                    _config("WRITE_QUEUE_MAX_DELAY_MS") / 1000,
+                    _config("WRITE_QUEUE_SIZE"),
+                )
+                _writers[database] = writer
+    return writer
+
+
+def insert(user_id, sql, params):
+    """INSERT y commit; devuelve el lastrowid.
+
+    Con WRITE_QUEUE va por el writer del archivo del usuario y comparte el
+    commit con otras requests (sin tomar una conexion de escritura del pool
+    mientras espera); sin el, se ejecuta en get_db(user_id) como siempre.
+    """
+    if not _config("WRITE_QUEUE"):
+        db = get_db(user_id)
+        cursor = db.execute(sql, params)
+        db.commit()
+        return cursor.lastrowid
+
+    future = get_writer(user_database(user_id)).submit(sql, params)
+    try:
+        return future.result(timeout=_config("WRITE_QUEUE_TIMEOUT"))
+    except FutureTimeout:
+        # cancelado no se escribe nunca, asi que reintentar no duplica la fila
+        if future.cancel():
+            raise WriteQueueBusy("Timeout esperando la escritura, intente de nuevo")
+    # el writer ya lo tomo: su grupo termina (commit o error) en a lo sumo
+    # DB_BUSY_TIMEOUT, y responder 503 ahora invitaria a un reintento duplicado
+    return future.result()
+
+
+def close_all():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+def stats():
+    return [w.stats() for w in list(_writers.values())]